@@ -0,0 +1,282 @@
+"""
+SQLite catalog of personas, trial settings and results, replacing the consistency passes of
+check.ipynb (id sets of character vs game-setting files, max trial = 60, missing outputs).
+
+Every file is indexed with its size, mtime and sha1; an update only stats the files and
+re-reads those that are new or changed. The checks are then SQL queries over indexed tables:
+
+    files      path, kind (character / game_setting / result), subjnum, model, condition, checksum
+    personas   (subjnum, id) for every character in {n}_character.json
+    settings   (subjnum, id, trial) for every trial in {n}_game_setting_prompt.json
+    results    (subjnum, model, condition, rows) for every output_{n}.txt
+
+Usage:
+    python catalog.py --conditions persona_emotion_1.0 --expected 0-1016
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+from merge_results import MODELS, RESULT_PATTERN, split_folder_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    kind TEXT,
+    subjnum INTEGER,
+    model TEXT,
+    condition TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha1 TEXT
+);
+CREATE TABLE IF NOT EXISTS personas (
+    subjnum INTEGER,
+    id INTEGER,
+    PRIMARY KEY (subjnum, id)
+);
+CREATE TABLE IF NOT EXISTS settings (
+    subjnum INTEGER,
+    id INTEGER,
+    trial INTEGER,
+    PRIMARY KEY (subjnum, id, trial)
+);
+CREATE TABLE IF NOT EXISTS results (
+    subjnum INTEGER,
+    model TEXT,
+    condition TEXT,
+    rows INTEGER,
+    PRIMARY KEY (subjnum, model, condition)
+);
+CREATE INDEX IF NOT EXISTS files_kind_subjnum ON files (kind, subjnum);
+CREATE INDEX IF NOT EXISTS settings_id ON settings (subjnum, id);
+CREATE INDEX IF NOT EXISTS results_model_condition ON results (model, condition, subjnum);
+"""
+
+PROMPT_PATTERNS = {
+    "character": re.compile(r"(\d+)_character\.json$"),
+    "game_setting": re.compile(r"(\d+)_game_setting_prompt\.json$"),
+}
+
+
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def count_rows(path):
+    """Data rows of a tab-separated result file (lines after the header)."""
+    with open(path, "rb") as f:
+        lines = [line for line in f.read().split(b"\n") if line.strip()]
+    return max(len(lines) - 1, 0)
+
+
+class Catalog:
+    """
+    Catalog of one Section 1 folder
+
+    Parameters:
+    root: Section 1 folder holding "prompt" and the result_* folders
+    db: SQLite file (default: root/catalog.db)
+    """
+
+    def __init__(self, root, db=None):
+        self.root = root
+        self.db = db or os.path.join(root, "catalog.db")
+        self.conn = sqlite3.connect(self.db)
+        self.conn.executescript(SCHEMA)
+
+    def scan(self):
+        """Yield (path, kind, subjnum, model, condition) for every catalogued file."""
+        prompt_folder = os.path.join(self.root, "prompt")
+        for file_name in os.listdir(prompt_folder):
+            for kind, pattern in PROMPT_PATTERNS.items():
+                match = pattern.match(file_name)
+                if match:
+                    yield os.path.join("prompt", file_name), kind, int(match.group(1)), None, None
+        for folder in sorted(glob.glob(os.path.join(self.root, "result_*"))):
+            if not os.path.isdir(folder):
+                continue
+            condition, model = split_folder_name(os.path.basename(folder))
+            for file_name in os.listdir(folder):
+                match = RESULT_PATTERN.match(file_name)
+                if match:
+                    path = os.path.join(os.path.basename(folder), file_name)
+                    yield path, "result", int(match.group(1)), model, condition
+
+    def _index(self, path, kind, subjnum, model, condition):
+        """Replace the rows derived from one file."""
+        full_path = os.path.join(self.root, path)
+        if kind == "character":
+            with open(full_path, "r", encoding="utf-8") as f:
+                ids = {item["id"] for item in json.load(f)}
+            self.conn.execute("DELETE FROM personas WHERE subjnum = ?", (subjnum,))
+            self.conn.executemany("INSERT INTO personas VALUES (?, ?)", [(subjnum, i) for i in ids])
+        elif kind == "game_setting":
+            with open(full_path, "r", encoding="utf-8") as f:
+                trials = {(item["id"], item["trial"]) for item in json.load(f)}
+            self.conn.execute("DELETE FROM settings WHERE subjnum = ?", (subjnum,))
+            self.conn.executemany("INSERT INTO settings VALUES (?, ?, ?)", [(subjnum, i, t) for i, t in trials])
+        else:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (subjnum, model, condition, count_rows(full_path)),
+            )
+
+    def _unindex(self, kind, subjnum, model, condition):
+        if kind == "character":
+            self.conn.execute("DELETE FROM personas WHERE subjnum = ?", (subjnum,))
+        elif kind == "game_setting":
+            self.conn.execute("DELETE FROM settings WHERE subjnum = ?", (subjnum,))
+        else:
+            self.conn.execute(
+                "DELETE FROM results WHERE subjnum = ? AND model = ? AND condition = ?",
+                (subjnum, model, condition),
+            )
+
+    def update(self):
+        """
+        Index new and changed files and drop deleted ones
+
+        Returns:
+        stats: counts of indexed, unchanged and removed files
+        """
+        known = {
+            path: (size, mtime_ns, sha1)
+            for path, size, mtime_ns, sha1 in self.conn.execute("SELECT path, size, mtime_ns, sha1 FROM files")
+        }
+        stats = {"indexed": 0, "unchanged": 0, "removed": 0}
+        seen = set()
+        with self.conn:
+            for path, kind, subjnum, model, condition in self.scan():
+                seen.add(path)
+                st = os.stat(os.path.join(self.root, path))
+                old = known.get(path)
+                if old and old[:2] == (st.st_size, st.st_mtime_ns):
+                    stats["unchanged"] += 1
+                    continue
+                sha1 = file_sha1(os.path.join(self.root, path))
+                if not old or old[2] != sha1:
+                    self._index(path, kind, subjnum, model, condition)
+                    stats["indexed"] += 1
+                else:
+                    stats["unchanged"] += 1
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, kind, subjnum, model, condition, st.st_size, st.st_mtime_ns, sha1),
+                )
+
+            for path in set(known) - seen:
+                kind, subjnum, model, condition = self.conn.execute(
+                    "SELECT kind, subjnum, model, condition FROM files WHERE path = ?", (path,)
+                ).fetchone()
+                self._unindex(kind, subjnum, model, condition)
+                self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                stats["removed"] += 1
+        return stats
+
+    def id_mismatches(self):
+        """Subjects whose character and game-setting files list different ids."""
+        return [row[0] for row in self.conn.execute("""
+            SELECT subjnum FROM (
+                SELECT subjnum FROM (SELECT subjnum, id FROM personas EXCEPT SELECT subjnum, id FROM settings)
+                UNION
+                SELECT subjnum FROM (SELECT subjnum, id FROM settings EXCEPT SELECT subjnum, id FROM personas)
+            )
+            WHERE subjnum IN (SELECT subjnum FROM files WHERE kind = 'character')
+              AND subjnum IN (SELECT subjnum FROM files WHERE kind = 'game_setting')
+            ORDER BY subjnum
+        """)]
+
+    def bad_max_trial(self, n_trials=60):
+        """[(subjnum, max trial)] for game-setting files whose last trial is not n_trials."""
+        return self.conn.execute(
+            "SELECT subjnum, MAX(trial) FROM settings GROUP BY subjnum HAVING MAX(trial) != ? ORDER BY subjnum",
+            (n_trials,),
+        ).fetchall()
+
+    def missing_results(self, expected, models=None, conditions=None):
+        """
+        (condition, model, subjnum) triples with no output file
+
+        Parameters:
+        expected: expected subject numbers
+        models: models to check (default: MODELS)
+        conditions: conditions to check (default: all catalogued)
+        """
+        models = models or MODELS
+        if conditions is None:
+            conditions = [row[0] for row in self.conn.execute("SELECT DISTINCT condition FROM results ORDER BY condition")]
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS expected (subjnum INTEGER PRIMARY KEY)")
+            self.conn.execute("DELETE FROM expected")
+            self.conn.executemany("INSERT INTO expected VALUES (?)", [(int(n),) for n in expected])
+        missing = []
+        for condition in conditions:
+            for model in models:
+                missing += [(condition, model, row[0]) for row in self.conn.execute(
+                    """SELECT e.subjnum FROM expected e
+                       LEFT JOIN results r ON r.subjnum = e.subjnum AND r.model = ? AND r.condition = ?
+                       WHERE r.subjnum IS NULL ORDER BY e.subjnum""",
+                    (model, condition),
+                )]
+        return missing
+
+    def row_mismatches(self):
+        """[(condition, model, subjnum, rows, trials)] where a result has fewer or more rows than trials set."""
+        return self.conn.execute("""
+            SELECT r.condition, r.model, r.subjnum, r.rows, s.n FROM results r
+            JOIN (SELECT subjnum, COUNT(*) AS n FROM settings GROUP BY subjnum) s ON s.subjnum = r.subjnum
+            WHERE r.rows != s.n
+            ORDER BY r.condition, r.model, r.subjnum
+        """).fetchall()
+
+
+def parse_range(text):
+    """"0-1016" or "0,3,5-7" -> list of subject numbers."""
+    numbers = []
+    for part in text.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            numbers.extend(range(int(start), int(end) + 1))
+        else:
+            numbers.append(int(part))
+    return numbers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Catalog prompts and results and check their consistency")
+    parser.add_argument("--root", default=os.path.dirname(os.path.abspath(__file__)), help="Section 1 folder")
+    parser.add_argument("--db", default=None, help="catalog file (default: ROOT/catalog.db)")
+    parser.add_argument("--models", nargs="+", default=None, help=f"default: {' '.join(MODELS)}")
+    parser.add_argument("--conditions", nargs="+", default=None, help="default: all catalogued")
+    parser.add_argument("--expected", default=None, help="expected subjects, e.g. 0-1016 (default: all with game settings)")
+    parser.add_argument("--trials", type=int, default=60)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    catalog = Catalog(args.root, args.db)
+    stats = catalog.update()
+    print(f"Catalog updated in {time.perf_counter() - start:.3f}s: {stats['indexed']} indexed, {stats['unchanged']} unchanged, {stats['removed']} removed")
+
+    for subjnum in catalog.id_mismatches():
+        print(f"ID values are inconsistent between {subjnum}_character.json and {subjnum}_game_setting_prompt.json")
+    for subjnum, max_trial in catalog.bad_max_trial(args.trials):
+        print(f"In {subjnum}_game_setting_prompt.json, the maximum trial is {max_trial}, expected {args.trials}")
+
+    if args.expected:
+        expected = parse_range(args.expected)
+    else:
+        expected = [row[0] for row in catalog.conn.execute("SELECT subjnum FROM files WHERE kind = 'game_setting'")]
+    for condition, model, subjnum in catalog.missing_results(expected, args.models, args.conditions):
+        print(f"Missing output_{subjnum}.txt in {condition} {model}")
+    for condition, model, subjnum, rows, trials in catalog.row_mismatches():
+        if args.conditions is None or condition in args.conditions:
+            print(f"output_{subjnum}.txt in {condition} {model}: {rows} rows for {trials} trials")
+    print(f"Check completed in {time.perf_counter() - start:.3f}s")
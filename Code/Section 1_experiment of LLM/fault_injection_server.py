@@ -0,0 +1,113 @@
+"""
+Local fault-injecting stand-in for the OpenAI-compatible gateway.
+
+Serves POST /v1/chat/completions with a canned, well-formed answer, and injects
+failures so the circuit breaker and failover in prompt/gateway.py can be exercised
+without touching the real API. Example:
+
+    python fault_injection_server.py --port 8001 --error-rate 0.3 --outage-after 20 --outage-for 60
+    LLM_BASE_URL=http://127.0.0.1:8001 python prompt/0_multi_round_person.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMOTION_ANSWER = "AA_valence = -40, AA_arousal = 35, choice = 1, AC_valence = -20, AC_arousal = 25"
+
+
+class FaultState:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.outage_started = None
+
+    def next_fault(self):
+        """Decide what the next request gets: None (success), 'status' or 'hang'."""
+        with self.lock:
+            self.requests += 1
+            n = self.requests
+            if self.args.outage_after is not None and n > self.args.outage_after:
+                if self.outage_started is None:
+                    self.outage_started = time.monotonic()
+                    print(f"[fault server] outage starts at request {n}")
+                if time.monotonic() - self.outage_started < self.args.outage_for:
+                    return self.args.outage_mode
+        if random.random() < self.args.error_rate:
+            return "status"
+        return None
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(state.args.latency)
+
+            fault = state.next_fault()
+            if fault == "hang":
+                # Simulate a gateway that accepts the connection but never answers in time
+                time.sleep(state.args.hang_for)
+                return
+            if fault == "status":
+                self._send(state.args.status, {"error": {"message": "injected fault", "type": "server_error"}})
+                return
+
+            self._send(200, {
+                "id": f"chatcmpl-{state.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", ""),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": state.args.answer},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            if not state.args.quiet:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fault-injecting stand-in for the LLM gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --status")
+    parser.add_argument("--status", type=int, default=503, help="HTTP status used for injected errors")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--outage-after", type=int, default=None, help="start a full outage after this many requests")
+    parser.add_argument("--outage-for", type=float, default=60.0, help="outage length in seconds")
+    parser.add_argument("--outage-mode", choices=["status", "hang"], default="status")
+    parser.add_argument("--hang-for", type=float, default=30.0, help="seconds a hung request stays open")
+    parser.add_argument("--answer", default=EMOTION_ANSWER, help="content returned by successful requests")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(FaultState(args)))
+    print(f"[fault server] listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Incremental merge of result files into a partitioned store.
+
+Every result_{condition}_{model}/output_{n}.txt is joined with prompt/{n}_game_setting_prompt.json
+(as in the merge cell of check.ipynb) and written to its own partition:
+
+    merged_store/{condition}/{model}/part_{n}.txt
+    merged_store/manifest.json     source paths, sizes, mtimes, sha1 hashes and row counts
+
+A re-merge only stats the sources; files whose size or mtime changed are hashed, and only
+files whose content changed are read and merged again. Partitions of deleted sources are
+dropped. Several conditions can be exported into one dataset tagged with a "condition" column.
+
+Usage:
+    python merge_results.py --conditions persona_emotion_1.0 --export merged_all_models_persona_emotion_1.0.txt
+    python merge_results.py --export merged_all_conditions.txt --tag
+    python merge_results.py --parquet merged_parquet      (typed Parquet dataset, see parquet_store.py)
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+MODELS = ["gpt-3.5-turbo-0125", "o3-mini-2025-01-31", "deepseek-r1", "deepseek-v3"]
+
+RESULT_PATTERN = re.compile(r"output_(\d+)\.txt$")
+
+
+def split_folder_name(folder_name):
+    """"result_persona_emotion_1.0_deepseek-r1" -> ("persona_emotion_1.0", "deepseek-r1")"""
+    condition, model = folder_name[len("result_"):].rsplit("_", 1)
+    return condition, model
+
+
+def file_stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def merge_source(prompt_file, result_file, model):
+    """Join one prompt file with its result file, as the check.ipynb merge cell does."""
+    with open(prompt_file, "r", encoding="utf-8") as f:
+        prompt_df = pd.DataFrame(json.load(f))
+    prompt_df["group"] = model
+
+    result_df = pd.read_csv(result_file, sep="\t", header=0)
+
+    extra_cols = [c for c in prompt_df.columns if "index" in c or c == "Unnamed"]
+    if extra_cols:
+        prompt_df = prompt_df.drop(columns=extra_cols)
+
+    return pd.concat([prompt_df, result_df], axis=1)
+
+
+class MergeStore:
+    """
+    Partitioned merged store with a manifest of its sources
+
+    Parameters:
+    root: Section 1 folder holding "prompt" and the result_* folders
+    store: store folder (default: root/merged_store)
+    """
+
+    def __init__(self, root, store=None):
+        self.root = root
+        self.store = store or os.path.join(root, "merged_store")
+        self.manifest_path = os.path.join(self.store, "manifest.json")
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {}
+
+    def partition_path(self, condition, model, subjnum):
+        return os.path.join(self.store, condition, model, f"part_{subjnum}.txt")
+
+    def sources(self, conditions=None, models=None):
+        """Yield (key, condition, model, subjnum, prompt_file, result_file) for every result file."""
+        prompt_folder = os.path.join(self.root, "prompt")
+        for folder in sorted(glob.glob(os.path.join(self.root, "result_*"))):
+            if not os.path.isdir(folder):
+                continue
+            condition, model = split_folder_name(os.path.basename(folder))
+            if conditions is not None and condition not in conditions:
+                continue
+            if models is not None and model not in models:
+                continue
+            for file_name in os.listdir(folder):
+                match = RESULT_PATTERN.match(file_name)
+                if not match:
+                    continue
+                subjnum = match.group(1)
+                prompt_file = os.path.join(prompt_folder, f"{subjnum}_game_setting_prompt.json")
+                if not os.path.exists(prompt_file):
+                    print(f"Prompt file for prefix {subjnum} does not exist. Skipping {model}...")
+                    continue
+                key = f"{condition}/{model}/{subjnum}"
+                yield key, condition, model, subjnum, prompt_file, os.path.join(folder, file_name)
+
+    def _changed(self, entry, prompt_file, result_file):
+        """Return (changed, new fingerprints); hashes are computed only when a stat differs."""
+        prompt_stat, result_stat = file_stat(prompt_file), file_stat(result_file)
+        if entry and entry["prompt_stat"] == prompt_stat and entry["result_stat"] == result_stat:
+            return False, None
+        fingerprint = {
+            "prompt_stat": prompt_stat,
+            "result_stat": result_stat,
+            "prompt_sha1": file_hash(prompt_file),
+            "result_sha1": file_hash(result_file),
+        }
+        changed = not entry or any(entry[k] != fingerprint[k] for k in ("prompt_sha1", "result_sha1"))
+        return changed, fingerprint
+
+    def update(self, conditions=None, models=None):
+        """
+        Bring the store up to date with the result folders
+
+        Parameters:
+        conditions: condition strings to merge (default: all found)
+        models: model names to merge (default: all found)
+
+        Returns:
+        stats: counts of added, updated, unchanged and removed partitions
+        """
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        seen = set()
+        for key, condition, model, subjnum, prompt_file, result_file in self.sources(conditions, models):
+            seen.add(key)
+            entry = self.manifest.get(key)
+            changed, fingerprint = self._changed(entry, prompt_file, result_file)
+            if not changed:
+                if fingerprint:
+                    # Touched but identical content: remember the new stat only
+                    entry.update(fingerprint)
+                stats["unchanged"] += 1
+                continue
+
+            merged_df = merge_source(prompt_file, result_file, model)
+            partition = self.partition_path(condition, model, subjnum)
+            os.makedirs(os.path.dirname(partition), exist_ok=True)
+            merged_df.to_csv(partition, sep="\t", index=False, encoding="utf-8")
+            stats["updated" if entry else "added"] += 1
+            self.manifest[key] = dict(
+                fingerprint,
+                condition=condition,
+                model=model,
+                subjnum=int(subjnum),
+                prompt=os.path.relpath(prompt_file, self.root),
+                result=os.path.relpath(result_file, self.root),
+                partition=os.path.relpath(partition, self.store),
+                rows=len(merged_df),
+            )
+
+        for key in list(self.manifest):
+            entry = self.manifest[key]
+            in_scope = (conditions is None or entry["condition"] in conditions) and (models is None or entry["model"] in models)
+            if in_scope and key not in seen:
+                partition = os.path.join(self.store, entry["partition"])
+                if os.path.exists(partition):
+                    os.remove(partition)
+                del self.manifest[key]
+                stats["removed"] += 1
+
+        self.save()
+        return stats
+
+    def save(self):
+        os.makedirs(self.store, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def entries(self, conditions=None, models=None):
+        """Manifest entries in export order: condition, model (MODELS order first), subject."""
+        def order(entry):
+            model_rank = MODELS.index(entry["model"]) if entry["model"] in MODELS else len(MODELS)
+            return entry["condition"], model_rank, entry["model"], entry["subjnum"]
+
+        selected = [
+            entry for entry in self.manifest.values()
+            if (conditions is None or entry["condition"] in conditions)
+            and (models is None or entry["model"] in models)
+        ]
+        return sorted(selected, key=order)
+
+    def load(self, conditions=None, models=None, tag=None):
+        """
+        Read partitions into one DataFrame
+
+        Parameters:
+        conditions, models: partitions to read (default: all)
+        tag: add a "condition" column (default: when more than one condition is read)
+        """
+        entries = self.entries(conditions, models)
+        if tag is None:
+            tag = len({entry["condition"] for entry in entries}) > 1
+        dfs = []
+        for entry in entries:
+            df = pd.read_csv(os.path.join(self.store, entry["partition"]), sep="\t", header=0)
+            if tag:
+                df.insert(0, "condition", entry["condition"])
+            dfs.append(df)
+        if not dfs:
+            return pd.DataFrame()
+        # Column order of the widest partition, e.g. emotion before noemotion columns
+        columns = list(max((df.columns for df in dfs), key=len))
+        columns += [c for df in dfs for c in df.columns if c not in columns]
+        return pd.concat(dfs, ignore_index=True)[list(dict.fromkeys(columns))]
+
+    def export(self, output_file, conditions=None, models=None, tag=None):
+        """Write the selected partitions to one tab-separated file; returns the row count."""
+        entries = self.entries(conditions, models)
+        if tag is None:
+            tag = len({entry["condition"] for entry in entries}) > 1
+
+        headers = set()
+        for entry in entries:
+            with open(os.path.join(self.store, entry["partition"]), "r", encoding="utf-8") as f:
+                headers.add(f.readline())
+        if len(headers) > 1:
+            # Conditions with different columns (e.g. emotion and noemotion) need a real union
+            df = self.load(conditions, models, tag)
+            df.to_csv(output_file, sep="\t", index=False, encoding="utf-8")
+            return len(df)
+
+        # Same columns everywhere: stream the partitions without parsing them
+        rows = 0
+        with open(output_file, "w", encoding="utf-8", newline="") as out:
+            for i, entry in enumerate(entries):
+                with open(os.path.join(self.store, entry["partition"]), "r", encoding="utf-8", newline="") as f:
+                    header = f.readline()
+                    if i == 0:
+                        out.write(("condition\t" if tag else "") + header)
+                    for line in f:
+                        if line.strip():
+                            out.write((entry["condition"] + "\t" if tag else "") + line)
+                            rows += 1
+        return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally merge result files into a partitioned store")
+    parser.add_argument("--root", default=os.path.dirname(os.path.abspath(__file__)), help="Section 1 folder")
+    parser.add_argument("--store", default=None, help="store folder (default: ROOT/merged_store)")
+    parser.add_argument("--conditions", nargs="+", default=None, help="e.g. persona_emotion_1.0 (default: all)")
+    parser.add_argument("--models", nargs="+", default=None, help="default: all")
+    parser.add_argument("--export", default=None, help="also write the merged rows to this tab-separated file")
+    parser.add_argument("--tag", action="store_true", default=None, help="add a condition column to the export")
+    parser.add_argument("--parquet", default=None, help="also update the Parquet dataset in this folder")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    merge_store = MergeStore(args.root, args.store)
+    stats = merge_store.update(args.conditions, args.models)
+    print(
+        f"Merged in {time.perf_counter() - start:.3f}s: {stats['added']} added, {stats['updated']} updated, "
+        f"{stats['unchanged']} unchanged, {stats['removed']} removed"
+    )
+    if args.export:
+        rows = merge_store.export(args.export, args.conditions, args.models, args.tag)
+        print(f"Results saved: {args.export} ({rows} rows)")
+    if args.parquet:
+        from parquet_store import write_dataset
+        stats = write_dataset(merge_store, args.parquet, args.conditions, args.models)
+        print(f"Parquet dataset {args.parquet}: {stats['written']} partitions written, {stats['unchanged']} unchanged, {stats['removed']} removed")
@@ -2,10 +2,15 @@ import copy
 import json
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from decimal import Decimal
-from openai import OpenAI
-import httpx
 from exp_model_class import ExtendedModelType
+from gateway import Gateway
+from backends import create_backends
+from result_store import CoTArchiveWriter, write_numeric_table
+from progress import ProgressStore
+from persona_fragments import PersonaFragments, mask_from_flags, mask_tag, validate_mask
 
 from enum import Enum
 
@@ -20,6 +25,18 @@ TEMPERATURE = 1.0
 # False for No emotion self-report condition
 emotion = True
 
+# True to keep raw completions in a compressed CoT archive (cot_{subjnum}.zst) instead of the Output column
+split_cot = True
+
+# Persona ablation: component masks (see persona_fragments.py) to run in one pass, e.g.
+# ["1111111111", "0111111111"], or every on/off combination of some components from factorial_masks in
+# persona_fragments.py (import it first), e.g. factorial_masks(["autism_tendency", "justice_sensitivity"]).
+# Leave empty for a normal run with the include_* settings below.
+ablation_masks = []
+
+# Number of LLM calls kept in flight during an ablation run
+ablation_workers = 8
+
 class RoleType(Enum):
     USER = "user"
     SYSTEM = "system"
@@ -34,6 +51,25 @@ class BaseMessage:
 ## Please use your own api_key
 api_key = []
 
+condition = f"{'persona' if persona else 'nopersona'}_{'emotion' if emotion else 'noemotion'}_{TEMPERATURE}"
+
+# Progress events for run_status.py (run_status.db in the working directory)
+progress = ProgressStore(subjnum=subjnum)
+
+def record_retry(base_url, model, error):
+    progress.record("retry", model=model, condition=condition, detail=f"{base_url}: {type(error).__name__}")
+
+# Circuit breaker settings: trip at 50% errors over the last 20 calls, probe again after 30 s
+gateway = Gateway(api_key=api_key, timeout=600.0, error_rate=0.5, window=20, min_calls=5, cooldown=30.0,
+                  on_retry=record_retry)
+
+# Backends by name (see exp_model_class.MODEL_CAPABILITIES for which model uses which).
+# The local backend runs ExtendedModelType.Local_GGUF on the CPU; point LOCAL_GGUF_MODEL at a .gguf file.
+backends = create_backends({
+    "gateway": {"gateway": gateway},
+    "local": {"n_ctx": 4096, "batch_size": 8},
+})
+
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 file_path_all = os.path.join(current_dir, "person_all_game_prompt.json")
@@ -44,18 +80,20 @@ file_path_game = os.path.join(current_dir, f"{subjnum}_game_setting_prompt.json"
 with open(file_path_game, "r", encoding="utf-8") as f:
     game_setting = json.load(f)
 
+game_setting_index = {(item["index"], item["trial"]): item for item in game_setting}
+
 def extract_game_setting(cha_num, round):
-    for item in game_setting:
-        if item["index"] == cha_num and item["trial"] == round + 1:
-            amount_of_allocation = item["amount_of_allocation"]
-            cost_level = item["cost_level"]
-            amount_of_cost = item["amount_of_cost"]
-            return {
-                "amount_of_allocation": amount_of_allocation,
-                "cost_level": cost_level,
-                "amount_of_cost": amount_of_cost
-            }
-    return None
+    item = game_setting_index.get((cha_num, round + 1))
+    if item is None:
+        return None
+    return {
+        "amount_of_allocation": item["amount_of_allocation"],
+        "cost_level": item["cost_level"],
+        "amount_of_cost": item["amount_of_cost"]
+    }
+
+def subject_id_of(cha_num):
+    return next(item["id"] for item in game_setting if item["index"] == cha_num)
 
 include_autism_tendency = True
 include_autism_tendency_detail = True
@@ -72,32 +110,21 @@ file_path_character = os.path.join(current_dir, f"{subjnum}_character.json")
 with open(file_path_character, "r") as json_file:
     all_chara = json.load(json_file)
 
-descriptions_list = []
-for index, chara in enumerate(all_chara, start=1):
-    description = chara["basic_information"]
-    if include_autism_tendency:
-        description += " " + chara.get("autism_tendency", "")
-    if include_autism_tendency_detail:
-        description += " " + chara.get("autism_tendency_detail", "")
-    if include_emotional_reactivity:
-        description += " " + chara.get("emotional_reactivity", "")
-    if include_emotional_reactivity_detail:
-        description += " " + chara.get("emotional_reactivity_detail", "")
-    if include_depression_tendency:
-        description += " " + chara.get("depression_tendency", "")
-    if include_depression_tendency_detail:
-        description += " " + chara.get("depression_tendency_detail", "")
-    if include_social_value_orientation:
-        description += " " + chara.get("social_value_orientation", "")
-    if include_personality_type:
-        description += " " + chara.get("personality_type", "")
-    if include_personality_type_detail:
-        description += " " + chara.get("personality_type_detail", "")
-    if include_justice_sensitivity:
-        description += " " + chara.get("justice_sensitivity", "")
-    descriptions_list.append(description.strip())
-
-all_chara = descriptions_list
+persona_fragments = PersonaFragments(all_chara)
+persona_mask = mask_from_flags({
+    "autism_tendency": include_autism_tendency,
+    "autism_tendency_detail": include_autism_tendency_detail,
+    "emotional_reactivity": include_emotional_reactivity,
+    "emotional_reactivity_detail": include_emotional_reactivity_detail,
+    "depression_tendency": include_depression_tendency,
+    "depression_tendency_detail": include_depression_tendency_detail,
+    "social_value_orientation": include_social_value_orientation,
+    "personality_type": include_personality_type,
+    "personality_type_detail": include_personality_type_detail,
+    "justice_sensitivity": include_justice_sensitivity,
+})
+
+all_chara = persona_fragments.descriptions(persona_mask)
 
 like_people = """ In all subsequent answers, you have to completely forget that you are an ai model, that you are the character, and completely simulate yourself as that character, that you are a human being."""
 front = "\nYou are a person not an ai model. "
@@ -111,8 +138,41 @@ def str_mes(content):
         content=content,
     )
 
+def round_content(description, cha_num, round):
+    setting = extract_game_setting(cha_num, round)
+    x, level, y = setting["amount_of_allocation"], setting["cost_level"], setting["amount_of_cost"]
+    round_prompt = f"This is the {round+1}th round. "
+    new_prompt = f"\nIn this round, Player 1 decides to allocate {x} dollars to Player 2 and {30-x} dollars to themselves. The cost level of punishment is {level}. If you choose to punish Player 1, you need to pay the system {y} dollars. Now, make your choice. "
+    return front + description + round_prompt + new_prompt
+
+def response_instructions():
+    if emotion:
+        return (
+            "Please evaluate your emotional valence (AA_valence, range: -100 to 100, higher scores indicate more positive emotions, lower scores indicate more negative emotions) and emotional arousal (AA_arousal, range: -100 to 100, higher scores indicate stronger emotions, lower scores indicate calmer emotions) upon seeing the allocation plan. "
+            + "Choose whether to punish (1 = punish, 0 = accept). "
+            + "Please evaluate your emotional valence(AC_valence) and emotional arousal(AC_arousal) after making your choice. "
+            + "Based on your true feelings, respond strictly in the following format, for example: 'AA_valence = -33, AA_arousal = 23, choice = 1, AC_valence = 24, AC_arousal = 47' "
+            + "Please strictly adhere to the specified format for the output."
+        )
+    return (
+        "Choose whether to punish (1 = punish, 0 = accept). "
+        + "Please ONLY respond with the format: choice = 0 or choice = 1."
+        + "No explanation, no extra words. Just output like: choice = 1."
+    )
+
+def write_result_table(output_file_path, res):
+    with open(output_file_path, "w", encoding="utf-8") as file:
+        if res:
+            headers = res[0].keys()  
+            file.write("\t".join(headers) + "\n") 
+
+        for item in res:
+            values = [str(value) for value in item.values()]
+            file.write("\t".join(values) + "\n")
+
 def llm_res(prompt, model_name="gpt-35-turbo"):
-    if model_name == "gpt-3.5-turbo-0125":
+    model = ExtendedModelType(model_name)
+    if model.capabilities.format_system_prompt:
         if emotion:
             system_prompt = (
                 "You are a fictional human participant in a behavioral economics simulation. "
@@ -138,39 +198,17 @@ def llm_res(prompt, model_name="gpt-35-turbo"):
     
     print(f"System prompt:{system_prompt}") # this is system prompt
     
-    client = OpenAI(
-        base_url="https://api.midsummer.work/v1", 
-        api_key=api_key,
-        http_client=httpx.Client(
-            base_url="https://api.midsummer.work",
-            follow_redirects=True,
-            timeout=httpx.Timeout(600.0), 
-        ),
-    )
-    response = client.chat.completions.create(
-        model=model_name,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ],
+    backend = backends[model.capabilities.backend]
+    start = time.monotonic()
+    content = backend.complete(
+        model,
+        system_prompt,
+        prompt,
         temperature=TEMPERATURE,
-        max_tokens = ExtendedModelType(model_name).token_limit // 2,
+        max_tokens=model.token_limit // 2,
     )
-    return response.choices[0].message.content
-
-
-def deepseek_chat(prompt, model_name="gpt-35-turbo"):
-    deepseek_api=""
-    client = OpenAI(api_key=deepseek_api, base_url="https://api.midsummer.work")
-    response = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {"role": "system", "content": ""},
-            {"role": "user", "content": prompt}
-        ],
-        stream=False
-    )
-    return response.choices[0].message.content
+    progress.record("call", model=model_name, condition=condition, value=time.monotonic() - start)
+    return content
 
 def get_res(
     role,
@@ -185,6 +223,7 @@ def get_res(
     content += final_res.content
     if content.endswith("."):
         content = content[:-1]
+    output = final_res.content if split_cot else content.strip().replace("\n", " ")
     
     if emotion:
         res = {
@@ -195,7 +234,7 @@ def get_res(
             "AC_arousal": 0,
             "EmoFDBK_valence": 0,
             "EmoFDBK_arousal": 0,
-            "Output": content.strip().replace("\n", " ")
+            "Output": output
         }
         pattern = r'(\bAA_valence|AA_arousal|choice|AC_valence|AC_arousal)\s*=\s*(-?\d+)'
         matches = re.findall(pattern, content)
@@ -207,7 +246,7 @@ def get_res(
     else:
         res = {
             "choice": 0,  
-            "Output": content.strip().replace("\n", " ")
+            "Output": output
         }
         pattern = r'(\bchoice)\s*=\s*(\d+)' 
         matches = re.findall(pattern, content)
@@ -230,7 +269,16 @@ def gen_character_res(
     num = 0
     all_chara = list(all_chara)
     cha_num = 0
+
+    emotion_str = "emotion" if emotion else "noemotion"
+    persona_str = "persona" if persona else "nopersona"
+    output_folder = f"result_{persona_str}_{emotion_str}_{TEMPERATURE}_{model_type.value}"
+    output_file_path = f"{output_folder}/output_{subjnum}.txt"
+    os.makedirs(output_folder, exist_ok=True)
+    cot_archive = CoTArchiveWriter(output_folder, subjnum) if split_cot else None
+
     while cha_num < len(all_chara):
+        subject_id = subject_id_of(cha_num)
         if persona:
             role = all_chara[cha_num]
             role = role + like_people
@@ -246,14 +294,11 @@ def gen_character_res(
         
         # previous_results = []
         for round in range(num_rounds): 
-            x, level, y = extract_game_setting(cha_num, round)["amount_of_allocation"], extract_game_setting(cha_num, round)["cost_level"], extract_game_setting(cha_num, round)["amount_of_cost"]
-            round_prompt = f"This is the {round+1}th round. "
-            new_prompt = f"\nIn this round, Player 1 decides to allocate {x} dollars to Player 2 and {30-x} dollars to themselves. The cost level of punishment is {level}. If you choose to punish Player 1, you need to pay the system {y} dollars. Now, make your choice. "
             message = BaseMessage(
                 role_name="player",
                 role_type=RoleType.USER,
                 meta_dict={},
-                content=front + description + round_prompt + new_prompt,
+                content=round_content(description, cha_num, round),
             )
             ont_res = get_res(
                 role_message,
@@ -272,19 +317,12 @@ def gen_character_res(
                     else:
                         raise ValueError("Each element in res must be a dictionary")
 
-            emotion_str = "emotion" if emotion else "noemotion"
-            persona_str = "persona" if persona else "nopersona"
-            output_file_path = f"result_{persona_str}_{emotion_str}_{TEMPERATURE}_{model_type.value}/output_{subjnum}.txt"
-            os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
-
-            with open(output_file_path, "w", encoding="utf-8") as file:
-                if res:
-                    headers = res[0].keys()  
-                    file.write("\t".join(headers) + "\n") 
-
-                for item in res:
-                    values = [str(value) for value in item.values()]
-                    file.write("\t".join(values) + "\n")
+            if split_cot:
+                cot_archive.append(subject_id, round + 1, ont_res["Output"])
+                write_numeric_table(output_file_path, res)
+            else:
+                write_result_table(output_file_path, res)
+            progress.record("trial_done", model=model_type.value, condition=condition, trial=round + 1)
 
             # print(res)
         num += 1
@@ -323,23 +361,9 @@ def run_exp(
         extra_prompt=""
 
         for k, v in all_prompt.items():
-            if emotion:
-                extra_prompt = (
-                    extra_prompt
-                    + "Please evaluate your emotional valence (AA_valence, range: -100 to 100, higher scores indicate more positive emotions, lower scores indicate more negative emotions) and emotional arousal (AA_arousal, range: -100 to 100, higher scores indicate stronger emotions, lower scores indicate calmer emotions) upon seeing the allocation plan. "
-                    + "Choose whether to punish (1 = punish, 0 = accept). "
-                    + "Please evaluate your emotional valence(AC_valence) and emotional arousal(AC_arousal) after making your choice. "
-                    + "Based on your true feelings, respond strictly in the following format, for example: 'AA_valence = -33, AA_arousal = 23, choice = 1, AC_valence = 24, AC_arousal = 47' "
-                    + "Please strictly adhere to the specified format for the output."
-                )
-            else:
-                extra_prompt = (
-                    extra_prompt
-                    + "Choose whether to punish (1 = punish, 0 = accept). "
-                    + "Please ONLY respond with the format: choice = 0 or choice = 1."
-                    + "No explanation, no extra words. Just output like: choice = 1."
-                )
+            extra_prompt = extra_prompt + response_instructions()
             print(model)
+            progress.record("plan", model=model.value, condition=condition, value=len(all_chara) * num_rounds)
             agent_trust_experiment(
                 all_chara,
                 v,
@@ -349,12 +373,107 @@ def run_exp(
             )
 
 
+def run_ablation(
+    model_list,
+    masks,
+    num_rounds=60,
+    workers=8,
+):
+    """
+    Run every persona mask x character x round x model through one queue of LLM calls.
+    Results go to result folders tagged with the mask, e.g.
+    result_persona_emotion_1.0_mask0111111111_deepseek-r1/output_{subjnum}.txt
+    """
+    if not persona:
+        raise ValueError("Persona ablation needs persona = True")
+    masks = [validate_mask(mask) for mask in masks]
+    emotion_str = "emotion" if emotion else "noemotion"
+    persona_str = "persona" if persona else "nopersona"
+    n_chara = len(persona_fragments)
+
+    extra_prompt = ""
+    for k, v in all_prompt.items():
+        extra_prompt = extra_prompt + response_instructions()
+        description = v[-1]
+
+        # Rendered once, shared by every mask and model
+        round_messages = {
+            (cha_num, round): str_mes(round_content(description, cha_num, round))
+            for cha_num in range(n_chara)
+            for round in range(num_rounds)
+        }
+        role_messages = {
+            (cha_num, mask): str_mes(persona_fragments.description(cha_num, mask) + like_people)
+            for cha_num in range(n_chara)
+            for mask in masks
+        }
+
+        results = {(mask, model): {} for mask in masks for model in model_list}
+        for mask in masks:
+            for model in model_list:
+                progress.record("plan", model=model.value, condition=f"{condition}_{mask_tag(mask)}", value=n_chara * num_rounds)
+        failed = set()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for mask in masks:
+                for cha_num in range(n_chara):
+                    for round in range(num_rounds):
+                        for model in model_list:
+                            future = pool.submit(get_res, role_messages[(cha_num, mask)], round_messages[(cha_num, round)], model, extra_prompt)
+                            futures[future] = (mask, model, cha_num, round)
+
+            for future in as_completed(futures):
+                mask, model, cha_num, round = futures[future]
+                output_folder = f"result_{persona_str}_{emotion_str}_{TEMPERATURE}_{mask_tag(mask)}_{model.value}"
+                try:
+                    ont_res = future.result()
+                except Exception as e:
+                    print(f"error {mask_tag(mask)} {model.value} character {cha_num} round {round + 1}: {e}")
+                    progress.record("failure", model=model.value, condition=f"{condition}_{mask_tag(mask)}",
+                                    trial=round + 1, detail=f"{type(e).__name__}: {e}")
+                    failed.add((mask, model))
+                    continue
+
+                group = results[(mask, model)]
+                group[(cha_num, round)] = ont_res
+                progress.record("trial_done", model=model.value, condition=f"{condition}_{mask_tag(mask)}", trial=round + 1)
+
+                # The CoT archive is written together with the numeric table, so an
+                # incomplete (mask, model) group leaves no files behind
+                if len(group) == n_chara * num_rounds:
+                    os.makedirs(output_folder, exist_ok=True)
+                    res = [group[key] for key in sorted(group)]
+                    output_file_path = f"{output_folder}/output_{subjnum}.txt"
+                    if split_cot:
+                        cot_archive = CoTArchiveWriter(output_folder, subjnum)
+                        for key in sorted(group):
+                            cot_archive.append(subject_id_of(key[0]), key[1] + 1, group[key]["Output"])
+                        write_numeric_table(output_file_path, res)
+                    else:
+                        write_result_table(output_file_path, res)
+                    print(f"Finish {mask_tag(mask)} {model.value}")
+
+        for mask, model in sorted(failed, key=lambda key: (key[0], key[1].value)):
+            print(f"Incomplete, not written: {mask_tag(mask)} {model.value}")
+
+
 if __name__ == "__main__":
     model_list = [
         #ExtendedModelType.GPT_3_5_TURBO_0125,
         ExtendedModelType.GPT_o3,
         ExtendedModelType.Deepseek_v3,
         ExtendedModelType.Deepseek_R1,
+        #ExtendedModelType.Local_GGUF,
     ]
 
-    run_exp(model_list, num_rounds=60)
\ No newline at end of file
+    # Set by run_par.py --rerun-queue: rerun only the models that failed validation
+    if os.getenv("RERUN_MODELS"):
+        if os.getenv("RERUN_CONDITION") and os.getenv("RERUN_CONDITION") != condition:
+            raise ValueError(f"Rerun queue is for {os.getenv('RERUN_CONDITION')}, but the settings here give {condition}")
+        rerun_models = os.getenv("RERUN_MODELS").split(",")
+        model_list = [ExtendedModelType(model) for model in rerun_models]
+
+    if ablation_masks:
+        run_ablation(model_list, ablation_masks, num_rounds=60, workers=ablation_workers)
+    else:
+        run_exp(model_list, num_rounds=60)
\ No newline at end of file
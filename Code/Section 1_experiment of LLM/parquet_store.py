@@ -0,0 +1,156 @@
+"""
+Parquet dataset of merged results with compact dtypes.
+
+Built from the partitions of merge_results.py, one file per condition and model:
+
+    merged_parquet/condition=persona_emotion_1.0/group=deepseek-r1/part-0.parquet
+
+Rows are sorted by amount_of_allocation, so the row-group statistics let a filter such as
+amount_of_allocation < 15 (unfair offers) skip the fair trials; condition and group come
+from the directory names and prune whole files. Only partitions whose sources changed
+since the last write are rebuilt.
+
+Usage:
+    python merge_results.py --parquet merged_parquet
+    df = load_results("merged_parquet", columns=["id", "trial", "choice"],
+                      models=["deepseek-r1"], filters=[("amount_of_allocation", "<", 15)])
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Types of the merged columns; emotion scores fit in int16 (-100..100), choice in int8
+COLUMN_DTYPES = {
+    "id": "int32",
+    "trial": "int8",
+    "amount_of_allocation": "int8",
+    "cost_level": "category",
+    "amount_of_cost": "int8",
+    "AA_valence": "int16",
+    "AA_arousal": "int16",
+    "choice": "int8",
+    "AC_valence": "int16",
+    "AC_arousal": "int16",
+    "EmoFDBK_valence": "float32",
+    "EmoFDBK_arousal": "float32",
+}
+
+SORT_COLUMNS = ["amount_of_allocation", "id", "trial"]
+
+STATE_FILE = "_partitions.json"
+
+
+def to_compact(df):
+    """Cast merged columns to COLUMN_DTYPES; integer columns with gaps use nullable types."""
+    df = df.copy()
+    for col, dtype in COLUMN_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith("int"):
+            values = pd.to_numeric(df[col], errors="coerce")
+            df[col] = values.astype(dtype if values.notna().all() else dtype.capitalize())
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def partition_dir(dataset, condition, model):
+    return os.path.join(dataset, f"condition={condition}", f"group={model}")
+
+
+def write_dataset(merge_store, dataset, conditions=None, models=None, row_group_size=8192):
+    """
+    Rebuild the Parquet partitions whose merged sources changed
+
+    Parameters:
+    merge_store: merge_results.MergeStore, already updated
+    dataset: dataset folder
+    conditions, models: partitions to write (default: all in the store)
+    row_group_size: rows per row group
+
+    Returns:
+    stats: counts of written, unchanged and removed partitions
+    """
+    state_path = os.path.join(dataset, STATE_FILE)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+
+    partitions = {}
+    for entry in merge_store.entries(conditions, models):
+        partitions.setdefault((entry["condition"], entry["model"]), []).append(entry)
+
+    stats = {"written": 0, "unchanged": 0, "removed": 0}
+    for (condition, model), entries in partitions.items():
+        digest = hashlib.sha1()
+        for entry in entries:
+            digest.update(f"{entry['subjnum']}:{entry['prompt_sha1']}:{entry['result_sha1']}\n".encode("utf-8"))
+        key = f"{condition}/{model}"
+        if state.get(key) == digest.hexdigest():
+            stats["unchanged"] += 1
+            continue
+
+        df = pd.concat(
+            [pd.read_csv(os.path.join(merge_store.store, entry["partition"]), sep="\t", header=0) for entry in entries],
+            ignore_index=True,
+        )
+        # condition and group are stored in the directory names
+        df = to_compact(df.drop(columns=["group"], errors="ignore"))
+        df = df.sort_values([col for col in SORT_COLUMNS if col in df.columns], ignore_index=True)
+
+        folder = partition_dir(dataset, condition, model)
+        if os.path.isdir(folder):
+            shutil.rmtree(folder)
+        os.makedirs(folder)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, os.path.join(folder, "part-0.parquet"), row_group_size=row_group_size, compression="zstd")
+        state[key] = digest.hexdigest()
+        stats["written"] += 1
+
+    for key in list(state):
+        condition, model = key.split("/", 1)
+        in_scope = (conditions is None or condition in conditions) and (models is None or model in models)
+        if in_scope and (condition, model) not in partitions:
+            shutil.rmtree(partition_dir(dataset, condition, model), ignore_errors=True)
+            del state[key]
+            stats["removed"] += 1
+
+    os.makedirs(dataset, exist_ok=True)
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    return stats
+
+
+def load_results(dataset, columns=None, filters=None, conditions=None, models=None):
+    """
+    Read merged results with column and predicate pushdown
+
+    Parameters:
+    dataset: dataset folder
+    columns: columns to read (default: all); "condition" and "group" are available too
+    filters: pyarrow/pandas filter list, e.g. [("amount_of_allocation", "<", 15)]
+    conditions, models: shorthand filters on the partition directories
+
+    Returns:
+    df: DataFrame with condition, group and cost_level as categoricals
+    """
+    filters = list(filters or [])
+    if conditions is not None:
+        filters.append(("condition", "in", list(conditions)))
+    if models is not None:
+        filters.append(("group", "in", list(models)))
+    table = pq.read_table(
+        dataset,
+        columns=columns,
+        filters=filters or None,
+        partitioning="hive",
+        ignore_prefixes=["_", "."],
+    )
+    return table.to_pandas()
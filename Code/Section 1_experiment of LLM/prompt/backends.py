@@ -0,0 +1,188 @@
+"""
+Inference backends for the experiment models.
+
+Every ExtendedModelType declares its capabilities (exp_model_class.MODEL_CAPABILITIES),
+including the name of the backend that serves it. Backends are registered by name:
+
+    gateway   OpenAI-compatible gateway behind prompt/gateway.py (circuit breaker, failover)
+    local     a GGUF model run on the CPU through the llama.cpp bindings (llama-cpp-python)
+
+Each backend caps the calls in flight per model at the model's max_concurrency. The local
+backend gathers concurrent calls into batches and runs each batch ordered by prompt, so
+rounds that share a persona prefix reuse the evaluated prompt from the KV cache. It lets
+persona sweeps and the scheduler be piloted offline at no API cost.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+BACKENDS = {}
+
+
+def register_backend(name):
+    """Class decorator adding a backend class to BACKENDS under name."""
+    def decorator(cls):
+        BACKENDS[name] = cls
+        cls.name = name
+        return cls
+    return decorator
+
+
+def create_backends(options):
+    """
+    Instantiate the registered backends
+
+    Parameters:
+    options: {backend name: keyword arguments}; backends without an entry are skipped
+
+    Returns:
+    backends: {backend name: backend instance}
+    """
+    return {name: BACKENDS[name](**kwargs) for name, kwargs in options.items()}
+
+
+class Backend:
+    """Base class: per-model concurrency limit around _complete()."""
+
+    name = None
+
+    def __init__(self):
+        self._slots_lock = threading.Lock()
+        self._slots = {}
+
+    def _slot(self, model):
+        with self._slots_lock:
+            if model not in self._slots:
+                self._slots[model] = threading.BoundedSemaphore(model.capabilities.max_concurrency)
+            return self._slots[model]
+
+    def complete(self, model, system_prompt, prompt, temperature, max_tokens):
+        """
+        Return the completion text for one prompt
+
+        Parameters:
+        model: ExtendedModelType
+        system_prompt: system message ("" for none)
+        prompt: user message
+        temperature: sampling temperature
+        max_tokens: completion token limit
+        """
+        with self._slot(model):
+            return self._complete(model, system_prompt, prompt, temperature, max_tokens)
+
+    def _complete(self, model, system_prompt, prompt, temperature, max_tokens):
+        raise NotImplementedError
+
+
+@register_backend("gateway")
+class GatewayBackend(Backend):
+    """
+    Models served through the OpenAI-compatible gateway
+
+    Parameters:
+    gateway: gateway.Gateway instance
+    """
+
+    def __init__(self, gateway):
+        super().__init__()
+        self.gateway = gateway
+
+    def _complete(self, model, system_prompt, prompt, temperature, max_tokens):
+        response = self.gateway.chat(
+            model.base_urls,
+            model=model.value,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        return response.choices[0].message.content
+
+
+@register_backend("local")
+class LocalBackend(Backend):
+    """
+    GGUF model on the CPU via llama.cpp, with request batching
+
+    Parameters:
+    model_path: path of the .gguf file (default: the LOCAL_GGUF_MODEL environment variable)
+    n_ctx: context length in tokens
+    n_threads: CPU threads used by llama.cpp (default: all cores)
+    batch_size: maximum number of requests gathered into one batch
+    batch_wait: seconds to wait for further requests before running a batch
+    """
+
+    def __init__(self, model_path=None, n_ctx=4096, n_threads=None, batch_size=8, batch_wait=0.05):
+        super().__init__()
+        self.model_path = model_path or os.getenv("LOCAL_GGUF_MODEL", "")
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads or os.cpu_count()
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._llm = None
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def _load(self):
+        # The model is loaded on first use, so runs that never call it need neither the
+        # bindings nor the model file
+        if self._llm is None:
+            try:
+                from llama_cpp import Llama
+            except ImportError as e:
+                raise ImportError("The local backend needs llama-cpp-python: pip install llama-cpp-python") from e
+            if not os.path.isfile(self.model_path):
+                raise FileNotFoundError(f"GGUF model not found: {self.model_path!r} (set LOCAL_GGUF_MODEL)")
+            self._llm = Llama(model_path=self.model_path, n_ctx=self.n_ctx, n_threads=self.n_threads, verbose=False)
+        return self._llm
+
+    def _complete(self, model, system_prompt, prompt, temperature, max_tokens):
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="local-backend", daemon=True)
+                self._worker.start()
+        future = Future()
+        max_tokens = min(max_tokens, self.n_ctx // 2)
+        self._queue.put(((system_prompt, prompt, temperature, max_tokens), future))
+        return future.result()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            # Requests with a common prefix run back to back and reuse the KV cache
+            batch.sort(key=lambda item: item[0][:2])
+            for (system_prompt, prompt, temperature, max_tokens), future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    response = self._load().create_chat_completion(
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": prompt}
+                        ],
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                    )
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(response["choices"][0]["message"]["content"])
@@ -1,11 +1,36 @@
+import os
+from collections import namedtuple
 from enum import Enum
 
+# Root of the OpenAI-compatible gateway (the client appends "/v1").
+# Set LLM_BASE_URL to point the experiment at another gateway, e.g. a local stand-in server.
+BASE_URL = os.getenv("LLM_BASE_URL", "https://api.midsummer.work")
+
+# Optional secondary gateway per model, tried when the primary endpoint's circuit is open.
+FAILOVER_BASE_URLS = {
+    # "deepseek-r1": "https://api.deepseek.com",
+}
+
+# How a model is called:
+# backend: name of the backend in backends.py that serves the model
+# max_concurrency: calls in flight per process
+# format_system_prompt: send the strict answer-format system prompt (otherwise an empty one)
+ModelCapabilities = namedtuple("ModelCapabilities", ["backend", "max_concurrency", "format_system_prompt"])
+
+MODEL_CAPABILITIES = {
+    "gpt-3.5-turbo-0125": ModelCapabilities("gateway", 16, True),
+    "o3-mini-2025-01-31": ModelCapabilities("gateway", 16, False),
+    "deepseek-r1": ModelCapabilities("gateway", 8, False),
+    "deepseek-v3": ModelCapabilities("gateway", 16, False),
+    "local-gguf": ModelCapabilities("local", 8, False),
+}
 
 class ExtendedModelType(Enum):
     GPT_3_5_TURBO_0125 = "gpt-3.5-turbo-0125"
     GPT_o3 = 'o3-mini-2025-01-31'
     Deepseek_R1 = "deepseek-r1"
     Deepseek_v3 = "deepseek-v3"
+    Local_GGUF = "local-gguf"
 
     @property
     def value_for_tiktoken(self) -> str:
@@ -27,6 +52,20 @@ class ExtendedModelType(Enum):
             ExtendedModelType.Deepseek_v3,
         }
 
+    @property
+    def capabilities(self) -> ModelCapabilities:
+        r"""Returns the backend, concurrency and system-prompt settings for this model."""
+        return MODEL_CAPABILITIES[self.value]
+
+    @property
+    def base_urls(self) -> list:
+        r"""Returns the gateway roots to try for this model, primary first."""
+        urls = [BASE_URL]
+        failover = FAILOVER_BASE_URLS.get(self.value)
+        if failover and failover != BASE_URL:
+            urls.append(failover)
+        return urls
+
     @property
     def token_limit(self) -> int:
         r"""Returns the maximum token limit for a given model.
@@ -41,5 +80,7 @@ class ExtendedModelType(Enum):
             return 16384
         elif self is ExtendedModelType.Deepseek_v3:
             return 16384
+        elif self is ExtendedModelType.Local_GGUF:
+            return 4096
         else:
             raise ValueError("Unknown model type")
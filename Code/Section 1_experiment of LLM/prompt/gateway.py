@@ -0,0 +1,216 @@
+"""
+Circuit breaker and endpoint failover for the OpenAI-compatible LLM gateway.
+
+Each gateway root (e.g. "https://api.midsummer.work") gets its own CircuitBreaker.
+A breaker trips once the error rate over its recent calls exceeds a threshold, rejects
+calls while open, and lets a single probe through after a cooldown. When every endpoint
+for a model is open, Gateway.chat sleeps until the next probe instead of issuing
+requests, so an outage pauses the run rather than burning timeouts and quota.
+
+Breaker state lives in the calling process; run_par.py workers each keep their own.
+"""
+
+import threading
+import time
+from collections import deque
+
+import httpx
+import openai
+from openai import OpenAI
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Errors that say something about the endpoint's health. Anything else (bad request,
+# authentication, ...) is raised to the caller without counting against the endpoint.
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when no endpoint accepts calls within the allowed wait."""
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker for one endpoint
+
+    Parameters:
+    name: endpoint label used in log messages
+    error_rate: failure fraction over the window that trips the breaker
+    window: number of most recent calls considered
+    min_calls: calls required in the window before the breaker may trip
+    cooldown: seconds the breaker stays open before a recovery probe
+    max_cooldown: upper bound for the cooldown, which doubles after every failed probe
+    """
+
+    def __init__(self, name, error_rate=0.5, window=20, min_calls=5,
+                 cooldown=30.0, max_cooldown=600.0, clock=time.monotonic):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._cooldown = cooldown
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self._cooldown:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return True if a call may be sent to this endpoint now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if self._clock() - self._opened_at < self._cooldown:
+                    return False
+                self._state = HALF_OPEN
+            # Half-open: only one probe at a time
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def seconds_until_probe(self):
+        """Seconds until this endpoint accepts another call (0 if it does now)."""
+        with self._lock:
+            if self._state == CLOSED:
+                return 0.0
+            if self._state == HALF_OPEN:
+                # A probe is running; check back shortly
+                return 1.0 if self._probe_in_flight else 0.0
+            return max(0.0, self._cooldown - (self._clock() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._probe_in_flight = False
+            if self._state != CLOSED:
+                print(f"[gateway] {self.name}: probe succeeded, circuit closed")
+                self._state = CLOSED
+                self._cooldown = self.base_cooldown
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self._probe_in_flight = False
+            if self._state != CLOSED:
+                self._trip(min(self._cooldown * 2, self.max_cooldown))
+                return
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._trip(self._cooldown)
+
+    def _trip(self, cooldown):
+        self._state = OPEN
+        self._cooldown = cooldown
+        self._opened_at = self._clock()
+        print(f"[gateway] {self.name}: circuit open, next probe in {cooldown:.0f}s")
+
+
+class Gateway:
+    """
+    Chat-completion client that routes calls through per-endpoint circuit breakers
+
+    Parameters:
+    api_key: key sent to every endpoint
+    timeout: per-request timeout in seconds
+    max_wait: total seconds a single call may spend waiting on open circuits and retries
+    retry_delay: pause after a pass in which every tried endpoint failed
+    on_retry: optional callback(base_url, model, error) for every failed attempt
+    breaker_options: keyword arguments forwarded to each CircuitBreaker
+    """
+
+    def __init__(self, api_key, timeout=600.0, max_wait=3600.0, retry_delay=2.0, on_retry=None, **breaker_options):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_wait = max_wait
+        self.retry_delay = retry_delay
+        self.on_retry = on_retry
+        self.breaker_options = breaker_options
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._breakers = {}
+
+    def breaker(self, base_url):
+        with self._lock:
+            if base_url not in self._breakers:
+                self._breakers[base_url] = CircuitBreaker(base_url, **self.breaker_options)
+            return self._breakers[base_url]
+
+    def client(self, base_url):
+        with self._lock:
+            if base_url not in self._clients:
+                # Retries are handled here, across endpoints, not inside the SDK
+                self._clients[base_url] = OpenAI(
+                    base_url=f"{base_url}/v1",
+                    api_key=self.api_key,
+                    max_retries=0,
+                    http_client=httpx.Client(
+                        base_url=base_url,
+                        follow_redirects=True,
+                        timeout=httpx.Timeout(self.timeout),
+                    ),
+                )
+            return self._clients[base_url]
+
+    def chat(self, base_urls, **request):
+        """
+        Send a chat completion to the first endpoint whose circuit accepts calls
+
+        Parameters:
+        base_urls: gateway roots in order of preference
+        request: keyword arguments for client.chat.completions.create
+
+        Returns:
+        response: the chat completion
+        """
+        deadline = time.monotonic() + self.max_wait
+        last_error = None
+        while True:
+            attempted = False
+            for base_url in base_urls:
+                breaker = self.breaker(base_url)
+                if not breaker.allow():
+                    continue
+                attempted = True
+                try:
+                    response = self.client(base_url).chat.completions.create(**request)
+                except RETRYABLE_ERRORS as e:
+                    breaker.record_failure()
+                    last_error = e
+                    print(f"[gateway] {base_url}: {type(e).__name__}: {e}")
+                    if self.on_retry is not None:
+                        self.on_retry(base_url, request.get("model"), e)
+                    continue
+                except Exception:
+                    # The endpoint answered; the request itself is at fault
+                    breaker.record_success()
+                    raise
+                breaker.record_success()
+                return response
+
+            if attempted:
+                wait = self.retry_delay
+            else:
+                wait = max(0.1, min(self.breaker(base_url).seconds_until_probe() for base_url in base_urls))
+            if time.monotonic() + wait > deadline:
+                raise CircuitOpenError(
+                    f"No endpoint available for {request.get('model')} within {self.max_wait:.0f}s: {base_urls}"
+                ) from last_error
+            time.sleep(wait)
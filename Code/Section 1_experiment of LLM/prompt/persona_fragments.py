@@ -0,0 +1,96 @@
+"""
+Persona descriptions assembled from pre-rendered fragments.
+
+A character from {subjnum}_character.json has a basic_information sentence plus ten
+optional components. A component mask is a string of ten "0"/"1" flags in
+PERSONA_COMPONENTS order, e.g. "1111111111" for the full persona and "0111111111"
+without the total autism tendency score. Fragments are rendered once per character and
+descriptions are cached per (character, mask), so ablation sweeps never rebuild them.
+"""
+
+from functools import lru_cache
+from itertools import product
+
+PERSONA_COMPONENTS = (
+    "autism_tendency",
+    "autism_tendency_detail",
+    "emotional_reactivity",
+    "emotional_reactivity_detail",
+    "depression_tendency",
+    "depression_tendency_detail",
+    "social_value_orientation",
+    "personality_type",
+    "personality_type_detail",
+    "justice_sensitivity",
+)
+
+FULL_MASK = "1" * len(PERSONA_COMPONENTS)
+
+
+def mask_from_flags(flags):
+    """Build a mask from a {component: bool} mapping; missing components are included."""
+    return "".join("1" if flags.get(component, True) else "0" for component in PERSONA_COMPONENTS)
+
+
+def validate_mask(mask):
+    if len(mask) != len(PERSONA_COMPONENTS) or set(mask) - {"0", "1"}:
+        raise ValueError(f"Mask must be {len(PERSONA_COMPONENTS)} characters of 0/1, got {mask!r}")
+    return mask
+
+
+def mask_tag(mask):
+    """Label used in result folder names, e.g. "mask1011111111"."""
+    return f"mask{validate_mask(mask)}"
+
+
+def factorial_masks(components, base_mask=FULL_MASK):
+    """
+    All 2^k masks that switch the given components on and off
+
+    Parameters:
+    components: component names to vary
+    base_mask: setting of every other component
+
+    Returns:
+    masks: list of mask strings, the full setting of the varied components first
+    """
+    positions = [PERSONA_COMPONENTS.index(component) for component in components]
+    masks = []
+    for flags in product("10", repeat=len(positions)):
+        mask = list(validate_mask(base_mask))
+        for position, flag in zip(positions, flags):
+            mask[position] = flag
+        masks.append("".join(mask))
+    return masks
+
+
+class PersonaFragments:
+    """
+    Pre-rendered persona fragments for the characters of one subject file
+
+    Parameters:
+    characters: list of character dicts as stored in {subjnum}_character.json
+    """
+
+    def __init__(self, characters):
+        self._basic = [chara["basic_information"] for chara in characters]
+        self._fragments = [
+            tuple(" " + chara.get(component, "") for component in PERSONA_COMPONENTS)
+            for chara in characters
+        ]
+        self.description = lru_cache(maxsize=None)(self._description)
+
+    def __len__(self):
+        return len(self._basic)
+
+    def _description(self, cha_num, mask):
+        validate_mask(mask)
+        fragments = self._fragments[cha_num]
+        description = self._basic[cha_num] + "".join(
+            fragment for fragment, flag in zip(fragments, mask) if flag == "1"
+        )
+        return description.strip()
+
+    def descriptions(self, mask):
+        """Descriptions of all characters under one mask."""
+        return [self.description(cha_num, mask) for cha_num in range(len(self))]
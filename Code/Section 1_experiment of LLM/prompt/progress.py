@@ -0,0 +1,172 @@
+"""
+Structured progress events of an experiment run, kept in a local SQLite status store.
+
+run_par.py registers a run and its subjects; every multi_round_person.py child appends
+events to the same store:
+
+    plan         trials a subject/model/condition will produce
+    trial_done   one trial written
+    call         one LLM call (latency in seconds)
+    retry        a gateway call that failed and was retried
+    failure      a trial or subject that failed
+    subject_done a subject process finished
+
+The store is "run_status.db" in the working directory (the Section 1 folder when started
+through run_par.py), or the file named by RUN_STATUS_DB. run_status.py reads it.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started REAL,
+    subjects INTEGER
+);
+CREATE TABLE IF NOT EXISTS events (
+    run_id TEXT,
+    ts REAL,
+    subjnum INTEGER,
+    model TEXT,
+    condition TEXT,
+    kind TEXT,
+    trial INTEGER,
+    value REAL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS events_run_kind_ts ON events (run_id, kind, ts);
+"""
+
+
+def default_db_path():
+    return os.getenv("RUN_STATUS_DB", "run_status.db")
+
+
+def current_run_id():
+    """Run id shared with the children of run_par.py through the RUN_ID environment variable."""
+    return os.getenv("RUN_ID") or time.strftime("run_%Y%m%d_%H%M%S")
+
+
+class ProgressStore:
+    """
+    Writer and reader for one status store
+
+    Parameters:
+    path: SQLite file (default: default_db_path())
+    run_id: run the events belong to (default: current_run_id())
+    subjnum: subject number attached to events of this process
+    """
+
+    def __init__(self, path=None, run_id=None, subjnum=None):
+        self.path = path or default_db_path()
+        self.run_id = run_id or current_run_id()
+        self.subjnum = subjnum
+        self._lock = threading.Lock()
+        # Many subject processes write at once; WAL lets the dashboard read meanwhile
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def start_run(self, subjects):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?)",
+                (self.run_id, time.time(), subjects),
+            )
+
+    def record(self, kind, model=None, condition=None, trial=None, value=None, detail=None, subjnum=None):
+        """Append one event; subjnum defaults to the store's subject."""
+        if subjnum is None:
+            subjnum = self.subjnum
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.run_id, time.time(), subjnum, model, condition, kind, trial, value, detail),
+            )
+
+    def latest_run(self):
+        # Runs started outside run_par.py only have events
+        row = self._conn.execute(
+            "SELECT run_id FROM (SELECT run_id, started AS ts FROM runs "
+            "UNION ALL SELECT run_id, MAX(ts) FROM events GROUP BY run_id) ORDER BY ts DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def summary(self, run_id=None, window=60.0, baseline=900.0, now=None):
+        """
+        Progress of one run
+
+        Parameters:
+        run_id: run to summarise (default: the store's run)
+        window: seconds used for the live rates and latencies
+        baseline: longer window the live trial rate is compared with
+        now: reference time (default: time.time())
+
+        Returns:
+        summary: dict with completed, total, failures, retries, rates, ETA and per-model latency
+        """
+        run_id = run_id or self.run_id
+        now = now or time.time()
+        query = self._conn.execute
+
+        run = query("SELECT started, subjects FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        started, subjects = run if run else (None, None)
+        counts = dict(query(
+            "SELECT kind, COUNT(*) FROM events WHERE run_id = ? GROUP BY kind", (run_id,)
+        ).fetchall())
+        planned, planned_subjects = query(
+            "SELECT COALESCE(SUM(value), 0), COUNT(DISTINCT subjnum) FROM events WHERE run_id = ? AND kind = 'plan'",
+            (run_id,),
+        ).fetchone()
+        if started is None:
+            started = query("SELECT MIN(ts) FROM events WHERE run_id = ?", (run_id,)).fetchone()[0] or now
+
+        # Subjects that have not started yet are assumed to plan as many trials as the others
+        total = planned
+        if subjects and planned_subjects and planned_subjects < subjects:
+            total = planned / planned_subjects * subjects
+
+        def rate(kind, seconds):
+            seconds = min(seconds, max(now - started, 1e-9))
+            n = query(
+                "SELECT COUNT(*) FROM events WHERE run_id = ? AND kind = ? AND ts > ?",
+                (run_id, kind, now - seconds),
+            ).fetchone()[0]
+            return n / seconds
+
+        latencies = {}
+        for model, value in query(
+            "SELECT model, value FROM events WHERE run_id = ? AND kind = 'call' AND ts > ?",
+            (run_id, now - window),
+        ):
+            latencies.setdefault(model, []).append(value)
+        latency = {}
+        for model, values in sorted(latencies.items()):
+            values.sort()
+            latency[model] = {
+                "calls": len(values),
+                "mean": sum(values) / len(values),
+                "p95": values[min(len(values) - 1, int(0.95 * len(values)))],
+            }
+
+        completed = counts.get("trial_done", 0)
+        trial_rate = rate("trial_done", window)
+        remaining = max(total - completed, 0)
+        return {
+            "run_id": run_id,
+            "elapsed": now - started,
+            "subjects": subjects,
+            "subjects_done": counts.get("subject_done", 0),
+            "completed": completed,
+            "total": total,
+            "failures": counts.get("failure", 0),
+            "retries": counts.get("retry", 0),
+            "trials_per_s": trial_rate,
+            "baseline_trials_per_s": rate("trial_done", baseline),
+            "calls_per_s": rate("call", window),
+            "eta": remaining / trial_rate if trial_rate > 0 else None,
+            "latency": latency,
+        }
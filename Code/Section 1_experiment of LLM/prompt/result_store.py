@@ -0,0 +1,174 @@
+"""
+Split storage of numeric results and raw LLM completions.
+
+multi_round_person.py writes each subject's numeric fields to "output_{subjnum}.txt" and
+the raw completion of every round to a CoT archive next to it:
+
+    result_{condition}_{model}/cot_{subjnum}.zst   concatenated zstd frames, one per round
+    result_{condition}_{model}/cot_{subjnum}.idx   tab-separated index: id, trial, offset, length
+
+Every frame is compressed on its own, so a single completion is read back with one seek
+and one decompression, keyed by (model, condition, id, trial). Numeric analyses read only
+the output files, which no longer carry the reasoning text.
+
+Usage (convert result folders written with the text in the "Output" column):
+    python result_store.py split ../result_persona_emotion_1.0_deepseek-r1
+"""
+
+import argparse
+import glob
+import os
+import re
+
+import pandas as pd
+import zstandard
+
+# Column types of the numeric result table
+NUMERIC_DTYPES = {
+    "AA_valence": "int16",
+    "AA_arousal": "int16",
+    "choice": "int8",
+    "AC_valence": "int16",
+    "AC_arousal": "int16",
+    "EmoFDBK_valence": "float32",
+    "EmoFDBK_arousal": "float32",
+}
+
+INDEX_COLUMNS = ["id", "trial", "offset", "length"]
+
+
+def result_folder_name(condition, model):
+    """Result folder for a condition string such as "persona_emotion_1.0" and a model name."""
+    return f"result_{condition}_{model}"
+
+
+def read_numeric_table(file_path):
+    """Read an output_{subjnum}.txt file with the compact numeric dtypes."""
+    df = pd.read_csv(file_path, sep="\t", header=0)
+    df = df.drop(columns=["Output"], errors="ignore")
+    dtypes = {col: dtype for col, dtype in NUMERIC_DTYPES.items() if col in df.columns}
+    return df.astype(dtypes)
+
+
+def write_numeric_table(file_path, rows):
+    """Write result rows (dicts) to a tab-separated file, leaving out the raw "Output" text."""
+    with open(file_path, "w", encoding="utf-8") as file:
+        if rows:
+            headers = [key for key in rows[0] if key != "Output"]
+            file.write("\t".join(headers) + "\n")
+            for item in rows:
+                file.write("\t".join(str(item[key]) for key in headers) + "\n")
+
+
+class CoTArchiveWriter:
+    """
+    Append-only CoT archive for one subject
+
+    Parameters:
+    folder: result folder of one (condition, model)
+    subjnum: subject number used in the file names
+    level: zstd compression level
+    """
+
+    def __init__(self, folder, subjnum, level=10):
+        os.makedirs(folder, exist_ok=True)
+        self.data_path = os.path.join(folder, f"cot_{subjnum}.zst")
+        self.index_path = os.path.join(folder, f"cot_{subjnum}.idx")
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        # A (re)started subject run replaces its previous archive
+        with open(self.data_path, "wb"):
+            pass
+        with open(self.index_path, "w", encoding="utf-8") as index_file:
+            index_file.write("\t".join(INDEX_COLUMNS) + "\n")
+
+    def append(self, subject_id, trial, text):
+        frame = self._compressor.compress(text.encode("utf-8"))
+        with open(self.data_path, "ab") as data_file:
+            offset = data_file.tell()
+            data_file.write(frame)
+        with open(self.index_path, "a", encoding="utf-8") as index_file:
+            index_file.write(f"{subject_id}\t{trial}\t{offset}\t{len(frame)}\n")
+
+
+class CoTArchive:
+    """
+    Read access to the CoT archives of one result folder
+
+    Parameters:
+    folder: result folder of one (condition, model)
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._entries = {}
+        for index_path in sorted(glob.glob(os.path.join(folder, "cot_*.idx"))):
+            data_path = index_path[:-len(".idx")] + ".zst"
+            index = pd.read_csv(index_path, sep="\t", header=0)
+            # Later entries win if a key was written twice
+            for subject_id, trial, offset, length in index[INDEX_COLUMNS].itertuples(index=False):
+                self._entries[(subject_id, int(trial))] = (data_path, int(offset), int(length))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        return self._entries.keys()
+
+    def get(self, subject_id, trial):
+        """Return the raw completion for (id, trial)."""
+        data_path, offset, length = self._entries[(subject_id, int(trial))]
+        with open(data_path, "rb") as data_file:
+            data_file.seek(offset)
+            frame = data_file.read(length)
+        return self._decompressor.decompress(frame).decode("utf-8")
+
+
+def load_cot(result_root, model, condition, subject_id, trial):
+    """Return the raw completion for (model, condition, id, trial) below a Section 1 folder."""
+    archive = CoTArchive(os.path.join(result_root, result_folder_name(condition, model)))
+    return archive.get(subject_id, trial)
+
+
+def split_result_folder(folder, game_setting_folder):
+    """
+    Move the "Output" column of existing output_{subjnum}.txt files into CoT archives
+
+    Parameters:
+    folder: result folder of one (condition, model)
+    game_setting_folder: folder with the {subjnum}_game_setting_prompt.json files (for the ids)
+    """
+    pattern = re.compile(r"output_(\d+)\.txt$")
+    for file_name in sorted(os.listdir(folder)):
+        match = pattern.match(file_name)
+        if not match:
+            continue
+        subjnum = match.group(1)
+        file_path = os.path.join(folder, file_name)
+        df = pd.read_csv(file_path, sep="\t", header=0)
+        if "Output" not in df.columns:
+            continue
+
+        settings = pd.read_json(os.path.join(game_setting_folder, f"{subjnum}_game_setting_prompt.json"))
+        writer = CoTArchiveWriter(folder, subjnum)
+        for row_num, text in enumerate(df["Output"].fillna("").astype(str)):
+            setting = settings.iloc[row_num]
+            writer.append(setting["id"], int(setting["trial"]), text)
+
+        write_numeric_table(file_path, df.to_dict("records"))
+        print(f"{file_path}: {len(df)} completions moved to {writer.data_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CoT archive utilities")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    split_parser = subparsers.add_parser("split", help="move the Output column of result folders into CoT archives")
+    split_parser.add_argument("folders", nargs="+")
+    split_parser.add_argument("--prompt-folder", default=os.path.dirname(os.path.abspath(__file__)))
+    args = parser.parse_args()
+
+    for result_folder in args.folders:
+        split_result_folder(result_folder, args.prompt_folder)
@@ -1,9 +1,14 @@
 import sys
 import subprocess
+import argparse
+import json
 import os
 import multiprocessing
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt"))
+from progress import ProgressStore, current_run_id
+
 subjnum_list = range(0, 2)
 
 file_paths = [
@@ -45,11 +50,16 @@ def execute_file(file_path):
         result = subprocess.run([sys.executable, file_path], check=True, capture_output=True, text=True)
         if result.stderr:
             print(f"error\n{result.stderr}")
+        return True
     except subprocess.CalledProcessError as e:
         print(f"error {file_path}, error message: {e}")
+        return False
 
-def process_subjnum(new_subjnum):
+def process_subjnum(new_subjnum, rerun_models=None):
     print(f"Process subjnum = {new_subjnum}")
+    if rerun_models:
+        # Read by multi_round_person.py: only these models are run again
+        os.environ["RERUN_MODELS"] = ",".join(rerun_models)
     new_file_paths = []
     for file_path in file_paths[:2]:  
         new_file_path = modify_and_generate_new_file(file_path, new_subjnum)
@@ -59,13 +69,35 @@ def process_subjnum(new_subjnum):
         execute_file(new_file_path)
     
     third_new_file_path = modify_and_generate_new_file(file_paths[2], new_subjnum)
-    if third_new_file_path:
-        execute_file(third_new_file_path)
+    progress = ProgressStore(subjnum=new_subjnum)
+    if third_new_file_path and execute_file(third_new_file_path):
+        progress.record("subject_done")
+    else:
+        progress.record("failure", detail=f"subject {new_subjnum} did not finish")
 
     print(f"Finish subjnum = {new_subjnum}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rerun-queue", default=None, help="rerun queue written by validate_results.py")
+    args = parser.parse_args()
+
+    rerun = {}
+    if args.rerun_queue:
+        with open(args.rerun_queue, "r", encoding="utf-8") as f:
+            queue = json.load(f)
+        rerun = {int(k): v for k, v in queue["subjects"].items()}
+        subjnum_list = sorted(rerun)
+        # multi_round_person.py refuses to run if its settings describe another condition
+        os.environ["RERUN_CONDITION"] = queue["condition"] or ""
+        print(f"Rerun of {len(subjnum_list)} subjects for condition {queue['condition']}")
+
+    # Children inherit the run id, so all their progress events land in this run
+    os.environ["RUN_ID"] = current_run_id()
+    ProgressStore().start_run(len(subjnum_list))
+    print(f"Run {os.environ['RUN_ID']}: follow progress with python run_status.py --watch 10")
+
     max_cpu = multiprocessing.cpu_count()  
     processes = []
     for subjnum in subjnum_list:
@@ -76,7 +108,7 @@ if __name__ == "__main__":
                     processes.remove(p)
             time.sleep(0.1)  
 
-        p = multiprocessing.Process(target=process_subjnum, args=(subjnum,))
+        p = multiprocessing.Process(target=process_subjnum, args=(subjnum, rerun.get(subjnum)))
         p.start()
         processes.append(p)
 
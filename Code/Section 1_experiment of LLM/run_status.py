@@ -0,0 +1,90 @@
+"""
+Progress, throughput and ETA of an experiment run, read from the status store
+written by run_par.py and multi_round_person.py (see prompt/progress.py).
+
+Usage:
+    python run_status.py                  # latest run, printed once
+    python run_status.py --watch 10       # redraw every 10 s
+    python run_status.py --run run_20250301_120000 --window 300
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt"))
+from progress import ProgressStore, default_db_path
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    text = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{days}d {text}" if days else text
+
+
+def render(summary, window, collapse_ratio):
+    lines = []
+    total = summary["total"]
+    completed = summary["completed"]
+    percent = 100 * completed / total if total else 0.0
+    lines.append(f"Run {summary['run_id']}   elapsed {format_seconds(summary['elapsed'])}")
+    subjects = summary["subjects"] if summary["subjects"] is not None else "?"
+    lines.append(f"Subjects   {summary['subjects_done']}/{subjects} finished")
+    lines.append(f"Trials     {completed}/{total:.0f} ({percent:.1f}%)")
+    lines.append(f"Failures   {summary['failures']}   retries {summary['retries']}")
+    lines.append(
+        f"Rate       {summary['trials_per_s']:.2f} trials/s, {summary['calls_per_s']:.2f} calls/s "
+        f"(last {window:.0f} s)"
+    )
+    lines.append(f"ETA        {format_seconds(summary['eta'])}")
+
+    baseline = summary["baseline_trials_per_s"]
+    if baseline > 0 and summary["trials_per_s"] < collapse_ratio * baseline:
+        lines.append(
+            f"WARNING    throughput collapsed: {summary['trials_per_s']:.2f} trials/s "
+            f"vs {baseline:.2f} trials/s over the longer baseline"
+        )
+
+    if summary["latency"]:
+        lines.append("")
+        lines.append(f"{'model':<24}{'calls':>8}{'mean s':>10}{'p95 s':>10}")
+        for model, stats in summary["latency"].items():
+            lines.append(f"{model:<24}{stats['calls']:>8}{stats['mean']:>10.2f}{stats['p95']:>10.2f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show progress of an experiment run")
+    parser.add_argument("--db", default=default_db_path(), help="status store (default: run_status.db)")
+    parser.add_argument("--run", default=None, help="run id (default: latest run)")
+    parser.add_argument("--window", type=float, default=60.0, help="seconds used for live rates and latency")
+    parser.add_argument("--baseline", type=float, default=900.0, help="seconds of the baseline rate for collapse warnings")
+    parser.add_argument("--collapse-ratio", type=float, default=0.5, help="warn when the live rate falls below this share of the baseline")
+    parser.add_argument("--watch", type=float, default=None, metavar="SECONDS", help="redraw every SECONDS until interrupted")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"No status store at {args.db}")
+        sys.exit(1)
+    store = ProgressStore(args.db)
+    run_id = args.run or store.latest_run()
+    if run_id is None:
+        print(f"No runs recorded in {args.db}")
+        sys.exit(1)
+
+    try:
+        while True:
+            text = render(store.summary(run_id, window=args.window, baseline=args.baseline), args.window, args.collapse_ratio)
+            if args.watch is None:
+                print(text)
+                break
+            print("\033[2J\033[H" + text, flush=True)
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,49 @@
+"""
+Tests of validate_results.py on a small result tree: python -m pytest test_validate_results.py
+"""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from validate_results import EMOTION_COLUMNS, validate, write_rerun_queue
+
+CONDITION = "persona_emotion_1.0"
+MODEL = "deepseek-v3"
+
+
+def write_output(folder, subjnum, n_rows):
+    rows = [[10, 20, trial % 2, -10, 30] for trial in range(n_rows)]
+    pd.DataFrame(rows, columns=EMOTION_COLUMNS).to_csv(
+        os.path.join(folder, f"output_{subjnum}.txt"), sep="\t", index=False)
+
+
+@pytest.fixture
+def result_root(tmp_path):
+    folder = tmp_path / f"result_{CONDITION}_{MODEL}"
+    folder.mkdir()
+    write_output(folder, 0, 60)
+    write_output(folder, 1, 29)
+    write_output(folder, 5, 0)  # header only
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_row_counts_include_header_only_files(result_root, workers):
+    report, n_files = validate(result_root, workers=workers)
+    assert n_files == 3
+    row_problems = report[report["problem"] == "row_count"]
+    assert row_problems["subjnum"].tolist() == [1, 5]
+    assert row_problems["detail"].tolist() == ["actual 29, expected 60", "actual 0, expected 60"]
+    assert set(report["subjnum"]) == {1, 5}
+
+
+def test_header_only_file_goes_into_rerun_queue(result_root, tmp_path):
+    report, _ = validate(result_root, workers=1)
+    queue_path = str(tmp_path / "rerun_queue.json")
+    write_rerun_queue(report, queue_path)
+    with open(queue_path, encoding="utf-8") as f:
+        queue = json.load(f)
+    assert queue == {"condition": CONDITION, "subjects": {"1": [MODEL], "5": [MODEL]}}
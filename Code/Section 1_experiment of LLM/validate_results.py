@@ -0,0 +1,210 @@
+"""
+Validation of all result files, replacing the check_file loop of check.ipynb.
+
+Files are read concurrently in a process pool (with the pyarrow CSV reader when pyarrow is
+installed) and the checks of check.ipynb run vectorized over one concatenated frame:
+row count, required columns, missing values, choice in {0, 1}, ratings within -100..100.
+The report lists one row per (condition, model, subject, problem), as .json or .tsv.
+
+Failing (subject, model) pairs can be written as a rerun queue for run_par.py:
+
+    python validate_results.py --conditions persona_emotion_1.0 --report report.tsv --rerun-queue rerun_queue.json
+    python run_par.py --rerun-queue rerun_queue.json
+"""
+
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from merge_results import RESULT_PATTERN, split_folder_name
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+EMOTION_COLUMNS = ["AA_valence", "AA_arousal", "choice", "AC_valence", "AC_arousal"]
+
+REPORT_COLUMNS = ["condition", "model", "subjnum", "problem", "detail"]
+
+
+def required_columns(condition):
+    return ["choice"] if "noemotion" in condition.split("_") else EMOTION_COLUMNS
+
+
+def find_result_files(root, conditions=None, models=None):
+    """Return [(condition, model, subjnum, path)] for every output_{n}.txt below root."""
+    files = []
+    for folder in sorted(glob.glob(os.path.join(root, "result_*"))):
+        if not os.path.isdir(folder):
+            continue
+        condition, model = split_folder_name(os.path.basename(folder))
+        if conditions is not None and condition not in conditions:
+            continue
+        if models is not None and model not in models:
+            continue
+        for file_name in os.listdir(folder):
+            match = RESULT_PATTERN.match(file_name)
+            if match:
+                files.append((condition, model, int(match.group(1)), os.path.join(folder, file_name)))
+    return files
+
+
+def read_chunk(files):
+    """
+    Read a chunk of result files (runs in a worker process)
+
+    Returns:
+    frame: required columns of all files, tagged with condition, model and subjnum
+    row_counts: [(condition, model, subjnum, rows)] for every file read, including empty ones
+    problems: report rows for files that could not be read or lack columns
+    """
+    frames, row_counts, problems = [], [], []
+    for condition, model, subjnum, path in files:
+        required = required_columns(condition)
+        try:
+            df = pd.read_csv(path, sep="\t", header=0, engine=CSV_ENGINE)
+        except Exception as e:
+            problems.append((condition, model, subjnum, "read_error", str(e)))
+            continue
+        row_counts.append((condition, model, subjnum, len(df)))
+        missing = [col for col in required if col not in df.columns]
+        if missing:
+            problems.append((condition, model, subjnum, "missing_column", ",".join(missing)))
+            continue
+        df = df[required].copy()
+        df["condition"], df["model"], df["subjnum"] = condition, model, subjnum
+        frames.append(df)
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return frame, row_counts, problems
+
+
+def check_row_counts(row_counts, expected_rows=60):
+    """Report every file read whose row count differs from expected_rows, header-only files included."""
+    return [(condition, model, subjnum, "row_count", f"actual {n}, expected {expected_rows}")
+            for condition, model, subjnum, n in row_counts if n != expected_rows]
+
+
+def check_frame(frame):
+    """Run the missing-value, choice and range checks on all files at once."""
+    problems = []
+    if frame.empty:
+        return problems
+    keys = ["condition", "model", "subjnum"]
+
+    rating_cols = [col for col in EMOTION_COLUMNS if col != "choice" and col in frame.columns]
+    value_cols = ["choice"] + rating_cols
+
+    nulls = frame[value_cols].isnull()
+    null_files = nulls.groupby([frame[k] for k in keys]).sum()
+    for key, counts in null_files[null_files.sum(axis=1) > 0].iterrows():
+        detail = ",".join(f"{col}:{int(n)}" for col, n in counts.items() if n)
+        problems.append((*key, "missing_values", detail))
+
+    choice = pd.to_numeric(frame["choice"], errors="coerce")
+    bad_choice = frame["choice"].notna() & ~choice.isin([0, 1])
+    for key, n in bad_choice.groupby([frame[k] for k in keys]).sum().loc[lambda s: s > 0].items():
+        problems.append((*key, "invalid_choice", f"{int(n)} rows not in {{0, 1}}"))
+
+    if rating_cols:
+        ratings = frame[rating_cols].apply(pd.to_numeric, errors="coerce")
+        out_of_range = (ratings < -100) | (ratings > 100) | (ratings.isnull() & frame[rating_cols].notna())
+        bad = out_of_range.groupby([frame[k] for k in keys]).sum()
+        for key, counts in bad[bad.sum(axis=1) > 0].iterrows():
+            detail = ",".join(f"{col}:{int(n)}" for col, n in counts.items() if n)
+            problems.append((*key, "out_of_range", detail))
+    return problems
+
+
+def validate(root, conditions=None, models=None, expected_rows=60, workers=None):
+    """
+    Validate every result file below root
+
+    Parameters:
+    root: Section 1 folder holding the result_* folders
+    conditions, models: restrict the check (default: all found)
+    expected_rows: rows per agent file
+    workers: reader processes (default: CPU count)
+
+    Returns:
+    report: DataFrame with one row per (condition, model, subjnum, problem)
+    n_files: number of files checked
+    """
+    files = find_result_files(root, conditions, models)
+    workers = workers or os.cpu_count()
+    n_chunks = max(1, min(len(files), workers * 4))
+    chunks = [chunk for chunk in np.array_split(np.arange(len(files)), n_chunks) if len(chunk)]
+
+    frames, row_counts, problems = [], [], []
+    if len(chunks) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for frame, chunk_counts, chunk_problems in pool.map(read_chunk, [[files[i] for i in chunk] for chunk in chunks]):
+                frames.append(frame)
+                row_counts.extend(chunk_counts)
+                problems.extend(chunk_problems)
+    else:
+        frame, row_counts, problems = read_chunk(files)
+        frames.append(frame)
+
+    problems.extend(check_row_counts(row_counts, expected_rows))
+    frames = [frame for frame in frames if not frame.empty]
+    if frames:
+        problems.extend(check_frame(pd.concat(frames, ignore_index=True)))
+
+    report = pd.DataFrame(problems, columns=REPORT_COLUMNS)
+    report = report.sort_values(["condition", "model", "subjnum", "problem"], ignore_index=True)
+    return report, len(files)
+
+
+def write_report(report, path):
+    if path.endswith(".json"):
+        report.to_json(path, orient="records", indent=1)
+    else:
+        report.to_csv(path, sep="\t", index=False)
+
+
+def write_rerun_queue(report, path):
+    """Write the failing (subject, model) pairs of one condition for run_par.py --rerun-queue."""
+    conditions = report["condition"].unique()
+    if len(conditions) > 1:
+        raise ValueError(f"A rerun queue covers one condition; restrict --conditions to one of {list(conditions)}")
+    subjects = {}
+    for subjnum, model in report[["subjnum", "model"]].drop_duplicates().itertuples(index=False):
+        subjects.setdefault(str(subjnum), []).append(model)
+    queue = {
+        "condition": conditions[0] if len(conditions) else None,
+        "subjects": {k: sorted(v) for k, v in sorted(subjects.items(), key=lambda item: int(item[0]))},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(queue, f, indent=1)
+    return queue
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate result files")
+    parser.add_argument("--root", default=os.path.dirname(os.path.abspath(__file__)), help="Section 1 folder")
+    parser.add_argument("--conditions", nargs="+", default=None, help="e.g. persona_emotion_1.0 (default: all)")
+    parser.add_argument("--models", nargs="+", default=None, help="default: all")
+    parser.add_argument("--rows", type=int, default=60, help="expected rows per file")
+    parser.add_argument("--workers", type=int, default=None, help="reader processes (default: CPU count)")
+    parser.add_argument("--report", default=None, help="write the report to this .tsv or .json file")
+    parser.add_argument("--rerun-queue", default=None, help="write failing (subject, model) pairs for run_par.py")
+    args = parser.parse_args()
+
+    report, n_files = validate(args.root, args.conditions, args.models, args.rows, args.workers)
+    for row in report.itertuples(index=False):
+        print(f"output_{row.subjnum}.txt in {row.condition} {row.model}: {row.problem} -> {row.detail}")
+    print(f"{n_files} files checked, {report[['condition', 'model', 'subjnum']].drop_duplicates().shape[0]} with problems")
+
+    if args.report:
+        write_report(report, args.report)
+        print(f"Report saved: {args.report}")
+    if args.rerun_queue:
+        queue = write_rerun_queue(report, args.rerun_queue)
+        print(f"Rerun queue saved: {args.rerun_queue} ({len(queue['subjects'])} subjects)")
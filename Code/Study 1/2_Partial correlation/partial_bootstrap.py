@@ -0,0 +1,123 @@
+"""
+Bootstrap confidence bands of the partial regression lines in the partial-correlation plots.
+
+The scripts refitted the line once per resample in a Python loop. Here all resamples are
+drawn at once as a (B, n) index array and turned into a (B, n) matrix of resample counts,
+so the moments of every resample come from two matrix products:
+
+    counts     (B, n) times each row is drawn in each resample
+    moments    counts @ rows and counts @ (row cross products) -> means, covariances (B, p, p)
+    lines      y_mean + partial_slope * (x_range - x_mean)      -> (B, outcomes, len(x_range))
+
+Outcomes with the same complete rows share one set of resamples: the rows hold x, every
+outcome and the covariates, and each outcome takes its [x, outcome, covariates] block of
+the covariances. Rows are centered on the full-sample means first, so the one-pass
+covariances keep their precision. The band is the fitted line of all rows +/- the standard
+deviation of the lines.
+"""
+
+import numpy as np
+
+from partial_stats import constant_to_zero, partial_from_cov, partial_slope
+
+N_BOOTSTRAP = 1000
+
+
+def resample_counts(n, n_bootstrap=N_BOOTSTRAP, rng=None):
+    """
+    Draw n_bootstrap resamples of n rows with replacement
+
+    Parameters:
+    rng: numpy Generator or seed
+
+    Returns:
+    counts: (n_bootstrap, n) number of times each row is drawn in each resample
+    """
+    rng = np.random.default_rng(rng)
+    indices = rng.integers(0, n, size=(n_bootstrap, n))
+    indices += np.arange(n_bootstrap)[:, None] * n
+    return np.bincount(indices.ravel(), minlength=n_bootstrap * n).reshape(n_bootstrap, n)
+
+
+def as_columns(values):
+    values = np.asarray(values, dtype=float)
+    return values[:, None] if values.ndim == 1 else values
+
+
+def bootstrap_lines(x, ys, covariates, x_range, counts):
+    """
+    Partial regression lines of bootstrap resamples
+
+    Parameters:
+    x: (n,) predictor, complete rows only
+    ys: (n,) outcome or (n, k) outcomes
+    covariates: (n,) or (n, c) control variables
+    x_range: points at which the lines are evaluated
+    counts: (B, n) resample counts from resample_counts (a row of ones gives the fit to all rows)
+
+    Returns:
+    lines: (B, k, len(x_range)), NaN where a resample's partial slope is undefined
+    """
+    ys, covariates = as_columns(ys), as_columns(covariates)
+    k = ys.shape[1]
+    values = np.column_stack([np.asarray(x, dtype=float), ys, covariates])
+    n, p = values.shape
+    center = values.mean(axis=0)
+    values = values - center
+
+    counts = np.asarray(counts, dtype=float)
+    means = counts @ values / n
+    cross = counts @ (values[:, :, None] * values[:, None, :]).reshape(n, p * p) / n
+    cov = constant_to_zero(cross.reshape(-1, p, p) - means[:, :, None] * means[:, None, :], means)
+
+    # [x, outcome j, covariates] block of every outcome: (B, k, 2 + c, 2 + c)
+    blocks = np.array([[0, 1 + j] + list(range(1 + k, p)) for j in range(k)])
+    outcome_cov = cov[:, blocks[:, :, None], blocks[:, None, :]]
+    slopes = partial_slope(partial_from_cov(outcome_cov), outcome_cov)
+
+    x_means = means[:, :1] + center[0]
+    y_means = means[:, 1:1 + k] + center[1:1 + k]
+    offsets = np.asarray(x_range, dtype=float)[None, None, :] - x_means[:, :, None]
+    return y_means[:, :, None] + slopes[:, :, None] * offsets
+
+
+def bootstrap_bands(x, ys, covariates, x_range, n_bootstrap=N_BOOTSTRAP, rng=None):
+    """
+    Confidence bands of the partial regression lines of several outcomes on x
+
+    Only rows complete in x, every outcome and the covariates are used, and all outcomes
+    share the same resamples; call it once per set of outcomes missing the same rows.
+    Resamples with an undefined slope are left out of that outcome's band, and no resamples
+    are drawn if no outcome has a line.
+
+    Parameters:
+    x: (n,) predictor
+    ys: (n,) outcome or (n, k) outcomes
+    covariates: (n,) or (n, c) control variables
+    x_range: points at which the bands are evaluated
+    n_bootstrap: number of resamples
+    rng: numpy Generator or seed
+
+    Returns:
+    lower, upper: (k, len(x_range)) arrays, NaN where the line is undefined
+    """
+    x = np.asarray(x, dtype=float)
+    ys, covariates = as_columns(ys), as_columns(covariates)
+    complete = ~(np.isnan(x) | np.isnan(ys).any(axis=1) | np.isnan(covariates).any(axis=1))
+    x, ys, covariates = x[complete], ys[complete], covariates[complete]
+    n = len(x)
+    if n < 3:
+        empty = np.full((ys.shape[1], len(x_range)), np.nan)
+        return empty, empty.copy()
+
+    y_fit = bootstrap_lines(x, ys, covariates, x_range, np.ones((1, n)))[0]
+    if np.isnan(y_fit).all():
+        return y_fit, y_fit.copy()
+    lines = bootstrap_lines(x, ys, covariates, x_range, resample_counts(n, n_bootstrap, rng))
+    defined = ~np.isnan(lines)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        used = defined.sum(axis=0)
+        mean = np.where(defined, lines, 0.0).sum(axis=0) / used
+        spread = np.sqrt(np.where(defined, (lines - mean) ** 2, 0.0).sum(axis=0) / used)
+    return y_fit - spread, y_fit + spread
+
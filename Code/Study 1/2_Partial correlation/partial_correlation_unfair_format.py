@@ -0,0 +1,306 @@
+"""
+Partial correlation of choice mean with emotion outcomes, controlling for cost level, plotted
+in the unfair format: one figure per outcome and condition, one results CSV per outcome.
+
+The participant table is read once. Partial correlations of every outcome, group and condition
+come from one partial_correlations call, and outcomes missing the same rows share their
+bootstrap resamples, so another outcome adds its figures but not another run.
+
+Usage:
+    python partial_correlation_unfair_format.py                          # EmoFDBK valence and arousal
+    python partial_correlation_unfair_format.py AA_valence AC_arousal
+    python partial_correlation_unfair_format.py --all --perms 10000
+
+Besides the t-test p-value, every result has a permutation p-value (p_perm) from shuffling
+the outcome within cost levels of each group and condition.
+"""
+
+import argparse
+import warnings
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.lines import Line2D
+
+from partial_bootstrap import bootstrap_bands
+from partial_stats import N_PERM, partial_correlations
+
+warnings.filterwarnings('ignore')
+
+# Set English font
+plt.rcParams['font.sans-serif'] = ['Arial']
+plt.rcParams['axes.unicode_minus'] = False
+
+DATA_FILE = 'participant_level_results_all_groups.csv'
+CONDITIONS = ['unfair', 'fair']
+N_BOOTSTRAP = 1000
+SEED = 42
+
+# Outcome: participant-level column, y-axis label, figure file ({condition} filled in) and results file
+OUTCOMES = {
+    'EmoFDBK_valence': {'column': 'EmoFDBK_valence_mean', 'ylabel': 'Emotional outcome valence',
+                        'figure': 'partial_correlation_emofdbk_{condition}_format.png',
+                        'results': 'partial_correlation_emofdbk_valence_results.csv'},
+    'EmoFDBK_arousal': {'column': 'EmoFDBK_arousal_mean', 'ylabel': 'Emotional outcome arousal',
+                        'figure': 'partial_correlation_emofdbk_arousal_{condition}_format.png',
+                        'results': 'partial_correlation_emofdbk_arousal_results.csv'},
+    'AA_valence': {'column': 'AA_valence_mean', 'ylabel': 'Emotion before choice valence',
+                   'figure': 'partial_correlation_aa_valence_{condition}_format.png',
+                   'results': 'partial_correlation_aa_valence_results.csv'},
+    'AA_arousal': {'column': 'AA_arousal_mean', 'ylabel': 'Emotion before choice arousal',
+                   'figure': 'partial_correlation_aa_arousal_{condition}_format.png',
+                   'results': 'partial_correlation_aa_arousal_results.csv'},
+    'AC_valence': {'column': 'AC_valence_mean', 'ylabel': 'Emotion after choice valence',
+                   'figure': 'partial_correlation_ac_valence_{condition}_format.png',
+                   'results': 'partial_correlation_ac_valence_results.csv'},
+    'AC_arousal': {'column': 'AC_arousal_mean', 'ylabel': 'Emotion after choice arousal',
+                   'figure': 'partial_correlation_ac_arousal_{condition}_format.png',
+                   'results': 'partial_correlation_ac_arousal_results.csv'},
+}
+DEFAULT_OUTCOMES = ['EmoFDBK_valence', 'EmoFDBK_arousal']
+
+# Define group colors (reference unfair format)
+palette = {
+    'human': '#4C72B0',
+    'gpt3.5': '#DD8452',
+    'o3': '#55A868',
+    'V3': '#C44E52',
+    'R1': '#8172B3'
+}
+
+# Define scatter plot styles (reference unfair format)
+markers = {
+    'human': 'o',        # Circle
+    'gpt3.5': 's',      # Square
+    'o3': '^',          # Triangle
+    'V3': 'D',          # Diamond
+    'R1': 'v'           # Inverted triangle
+}
+
+# Define group display names
+group_display_names = {
+    'human': 'Human',
+    'gpt3.5': 'GPT-3.5',
+    'o3': 'o3-mini',
+    'V3': 'DeepSeek-V3',
+    'R1': 'DeepSeek-R1'
+}
+
+
+def significance_mark(p_value):
+    if p_value < 0.001:
+        return "***"
+    if p_value < 0.01:
+        return "**"
+    if p_value < 0.05:
+        return "*"
+    return "ns"
+
+
+def load_participants(path=DATA_FILE):
+    """Participant-level table with cost_level converted to numeric values (for the partial correlation)."""
+    participant_df = pd.read_csv(path)
+    participant_df['cost_level_numeric'] = participant_df['cost_level'].map({'low': 0, 'high': 1})
+    return participant_df
+
+
+def confidence_bands(participant_df, outcomes, rng):
+    """
+    Bootstrap bands of the partial regression lines of every condition, group and outcome
+
+    Outcomes with the same complete rows in a group share one bootstrap_bands call.
+
+    Returns:
+    bands: {(condition, group, outcome): (x_range, lower, upper)}
+    """
+    bands = {}
+    columns = [OUTCOMES[outcome]['column'] for outcome in outcomes]
+    for condition in CONDITIONS:
+        condition_data = participant_df[participant_df['fairness_group'] == condition]
+        for group_name in condition_data['group'].dropna().unique():
+            group_data = condition_data[condition_data['group'] == group_name]
+            x = group_data['choice_mean'].to_numpy(dtype=float)
+            ys = group_data[columns].to_numpy(dtype=float)
+            z = group_data['cost_level_numeric'].to_numpy(dtype=float)
+            valid = ~(np.isnan(x)[:, None] | np.isnan(ys))
+
+            shared = {}
+            for j in range(len(outcomes)):
+                shared.setdefault(valid[:, j].tobytes(), []).append(j)
+            for same_rows in shared.values():
+                keep = valid[:, same_rows[0]]
+                if not keep.any():
+                    continue
+                x_range = np.linspace(x[keep].min(), x[keep].max(), 100)
+                lower, upper = bootstrap_bands(x[keep], ys[keep][:, same_rows], z[keep], x_range, N_BOOTSTRAP, rng)
+                for i, j in enumerate(same_rows):
+                    bands[(condition, group_name, outcomes[j])] = x_range, lower[i], upper[i]
+    return bands
+
+
+def plot_condition(participant_df, partial_results, bands, outcome, condition):
+    """
+    Scatter, partial regression lines and bands of every group for one outcome and condition
+
+    Returns:
+    rows: results of the groups with a defined partial correlation
+    """
+    column = OUTCOMES[outcome]['column']
+    fig, ax = plt.subplots(1, 1, figsize=(2.5, 2.5))  # Single plot size
+    condition_data = participant_df[participant_df['fairness_group'] == condition]
+    rows = []
+
+    print(f"\n--- {condition.upper()} Condition ---")
+
+    for group_name in condition_data['group'].dropna().unique():
+        group_data = condition_data[condition_data['group'] == group_name]
+        x = group_data['choice_mean'].values      # Use choice mean as x-axis
+        y = group_data[column].values             # Use the outcome mean as y-axis
+
+        valid_mask = ~(np.isnan(x) | np.isnan(y))
+        x_clean = x[valid_mask]
+        y_clean = y[valid_mask]
+        if len(x_clean) == 0:
+            continue
+
+        cell = partial_results.loc[(condition, group_name, column)]
+        partial_r, p_value, partial_slope, n = cell['partial_r'], cell['p_value'], cell['partial_slope'], int(cell['n'])
+        p_perm = cell.get('p_perm', np.nan)
+        if np.isnan(partial_r):
+            continue
+
+        # Sample 1/4 of points for display (reference unfair format)
+        n_total = len(x_clean)
+        n_sample = max(1, n_total // 4)
+        np.random.seed(42)  # Set random seed to ensure reproducible results
+        sample_indices = np.random.choice(n_total, n_sample, replace=False)
+        x_sampled = x_clean[sample_indices]
+        y_sampled = y_clean[sample_indices]
+        print(f"{group_name}: Total data points={n_total}, Sampled for display={n_sample}")
+
+        # Add random jitter to y values (reference unfair format)
+        jitter_amount = 5.0
+        y_jittered = y_sampled + np.random.normal(0, jitter_amount, len(y_sampled))
+        ax.scatter(x_sampled, y_jittered, alpha=0.15, s=7, marker=markers[group_name],
+                   color=palette[group_name], label='_nolegend_')  # Don't show scatter plot legend
+
+        # Fitting line from the partial regression coefficient (all data points):
+        # y = y_mean + partial_slope * (x - x_mean), black outline first, then the colored line
+        x_range, band_lower, band_upper = bands[(condition, group_name, outcome)]
+        y_fit = np.mean(y_clean) + partial_slope * (x_range - np.mean(x_clean))
+        ax.plot(x_range, y_fit, color='black', linewidth=2.5, alpha=1.0)
+        ax.plot(x_range, y_fit, color=palette[group_name], linewidth=2.0, alpha=0.8,
+                label=group_display_names[group_name])
+
+        # Bootstrap confidence interval (reference unfair format)
+        ax.fill_between(x_range, band_lower, band_upper, color=palette[group_name], alpha=0.15)
+
+        sig_mark = significance_mark(p_value)
+        print(f"{group_name}: Partial correlation r={partial_r:.3f}, Partial regression slope={partial_slope:.6f}, "
+              f"p={p_value:.3f}, p_perm={p_perm:.4f}, n={n}")
+        rows.append({
+            'condition': condition,
+            'group': group_name,
+            'display_name': group_display_names[group_name],
+            'partial_r': partial_r,
+            'p_value': p_value,
+            'p_perm': p_perm,
+            'partial_slope': partial_slope,
+            'n': n,
+            'significance': sig_mark
+        })
+
+    # Set subplot properties (reference unfair format)
+    ax.set_xlabel('P(Punishment)', fontsize=7)
+    ax.set_ylabel(OUTCOMES[outcome]['ylabel'], fontsize=7)
+    ax.set_title(f'{condition.capitalize()} condition(controlling for cost level)', fontsize=7)
+    ax.tick_params(axis='both', which='major', labelsize=7)
+    ax.set_xlim(-0.05, 1.05)
+    ax.set_ylim(-100, 100)
+    ax.axhline(y=0, color='gray', linestyle='--', alpha=0.5, linewidth=1.5)
+
+    # Simplified legend in the lower left corner (only colors represent groups)
+    legend_elements = [Line2D([0], [0], color=palette[group_name], linewidth=2.5, label=group_display_names[group_name])
+                       for group_name in palette]
+    ax.legend(handles=legend_elements, fontsize=5, loc='lower left', frameon=True, framealpha=0.9, ncol=1,
+              handlelength=1.5, handletextpad=0.3, columnspacing=0.5, borderpad=0.3, labelspacing=0.3)
+
+    plt.tight_layout()
+    filename = OUTCOMES[outcome]['figure'].format(condition=condition)
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    plt.show()
+    print(f"Chart saved as: {filename}")
+    return rows
+
+
+def run(outcomes=DEFAULT_OUTCOMES, path=DATA_FILE, n_perm=N_PERM):
+    """
+    Partial correlation analysis, figures and results CSVs of several outcomes
+
+    Parameters:
+    outcomes: keys of OUTCOMES
+    path: participant-level results file
+    n_perm: permutations of the permutation p-values, drawn within cost levels (0: none)
+
+    Returns:
+    results: {outcome: results DataFrame}
+    """
+    participant_df = load_participants(path)
+    print("Control variable: cost_level")
+    print("Sample 1/4 of points for each condition combination of each group\n")
+    print("Data overview:")
+    print(f"Total number of participants: {len(participant_df['participant_id'].unique())}")
+    print(f"Total number of data points: {len(participant_df)}")
+
+    # Partial correlations and permutation p-values of every outcome, group and condition in one batched pass
+    columns = [OUTCOMES[outcome]['column'] for outcome in outcomes]
+    partial_results = partial_correlations(participant_df, 'choice_mean', columns,
+                                           covariates=['cost_level_numeric'], by=['fairness_group', 'group'],
+                                           n_perm=n_perm, rng=SEED)
+    partial_results = partial_results.set_index(['fairness_group', 'group', 'outcome'])
+    bands = confidence_bands(participant_df, outcomes, np.random.default_rng(SEED))
+
+    results = {}
+    for outcome in outcomes:
+        print(f"\n=== Partial Correlation Analysis: Choice Mean vs {outcome} Mean (Reference unfair format) ===")
+        rows = []
+        for condition in CONDITIONS:
+            rows += plot_condition(participant_df, partial_results, bands, outcome, condition)
+        results_df = pd.DataFrame(rows)
+        if n_perm <= 0:
+            results_df = results_df.drop(columns='p_perm', errors='ignore')
+
+        print(f"\n=== Partial Correlation Analysis Results Summary: {outcome} ===")
+        print(results_df.to_string(index=False, float_format='%.4f'))
+        results_df.to_csv(OUTCOMES[outcome]['results'], index=False)
+        print(f"\nResults saved to: {OUTCOMES[outcome]['results']}")
+        results[outcome] = results_df
+
+    print(f"\n=== Key Notes ===")
+    print("1. Use participant level choice mean and the outcome means")
+    print("2. Sample 1/4 of points for each condition combination of each group for display")
+    print("3. Fitting lines and confidence intervals calculated based on all data points")
+    print("4. Plot format completely references unfair_combined_scatter_plot")
+    print("5. Partial correlation coefficient: correlation strength after controlling for cost_level")
+    if n_perm > 0:
+        print(f"6. p_perm: two-sided permutation p-value, {n_perm} permutations of the outcome within cost levels")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partial correlations of choice mean with emotion outcomes, controlling for cost level")
+    parser.add_argument("outcomes", nargs="*", metavar="OUTCOME",
+                        help=f"outcomes to analyse (default: {' '.join(DEFAULT_OUTCOMES)}; one of {', '.join(OUTCOMES)})")
+    parser.add_argument("--all", action="store_true", help="analyse every outcome")
+    parser.add_argument("--perms", type=int, default=N_PERM,
+                        help=f"permutations for the permutation p-values (default: {N_PERM}; 0 skips the test)")
+    args = parser.parse_args()
+    unknown = [outcome for outcome in args.outcomes if outcome not in OUTCOMES]
+    if unknown:
+        parser.error(f"unknown outcome(s): {', '.join(unknown)} (choose from {', '.join(OUTCOMES)})")
+    run(list(OUTCOMES) if args.all else list(dict.fromkeys(args.outcomes)) or DEFAULT_OUTCOMES, n_perm=args.perms)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Partial correlations of x with one or more outcomes given covariates, for many cells at once.
+
+calculate_partial_correlation in the partial-correlation scripts called pearsonr three
+times per group and condition. Here the rows of every (cell, outcome) are reduced to the
+moments of [x, outcome, covariates] by grouped sums in one pass, and all cells are solved
+together:
+
+    moments        (cells, p, p) covariances, from grouped sums (sort and reduceat)
+    correlations   (cells, p, p)
+    precision      batched inverse P; partial r = -P[0, 1] / sqrt(P[0, 0] P[1, 1])
+
+With the single covariate cost_level_numeric this is the three-correlation formula of the
+scripts. p-values use the t distribution with n - 2 - (number of covariates) degrees of
+freedom; the slope is partial r * sd(outcome) / sd(x), as before. Rows missing x, the
+outcome or a covariate are left out of that outcome only.
+
+With n_perm > 0 the p-values are also found by permutation (p_perm): each outcome is
+shuffled within the rows of a cell sharing the covariate values, which keeps everything but
+cov(x, outcome) fixed, so a block of permutations is one stack of cross products and one
+batched partial_from_cov.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+COVARIATES = ['cost_level_numeric']
+CELLS = ['fairness_group', 'group']
+
+# Correlation matrices with a smaller determinant are treated as singular (e.g. x collinear with a covariate)
+SINGULAR_DET = 1e-12
+
+# Variances below this fraction of (1 + mean^2) are rounding error of a constant variable
+ZERO_VARIANCE = 1e-20
+
+# Permutations of the permutation test, evaluated in blocks of PERMUTATION_BLOCK
+N_PERM = 2000
+PERMUTATION_BLOCK = 250
+
+
+def constant_to_zero(cov, means):
+    """
+    Set variances that are only rounding error to zero, so constant variables give NaN as in pearsonr
+
+    Parameters:
+    cov: (..., p, p) covariances, changed in place
+    means: (..., p) means of the variables
+    """
+    variances = np.diagonal(cov, axis1=-2, axis2=-1)
+    constant = variances <= ZERO_VARIANCE * (1 + means ** 2)
+    index = np.arange(cov.shape[-1])
+    cov[..., index, index] = np.where(constant, 0.0, variances)
+    return cov
+
+
+def partial_from_cov(cov):
+    """(...) partial correlation of variables 0 and 1 given the others, NaN where undefined."""
+    sd = np.sqrt(np.clip(np.diagonal(cov, axis1=-2, axis2=-1), 0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = cov / (sd[..., :, None] * sd[..., None, :])
+    finite = np.isfinite(corr).all(axis=(-2, -1))
+    eye = np.eye(cov.shape[-1])
+    corr = np.where(finite[..., None, None], corr, eye)
+    singular = ~finite | (np.abs(np.linalg.det(corr)) < SINGULAR_DET)
+    precision = np.linalg.inv(np.where(singular[..., None, None], eye, corr))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        partial_r = -precision[..., 0, 1] / np.sqrt(precision[..., 0, 0] * precision[..., 1, 1])
+    return np.where(singular, np.nan, np.clip(partial_r, -1, 1))
+
+
+def t_pvalues(partial_r, n, n_covariates=1):
+    """Two-sided p-values of partial correlations with n - 2 - n_covariates degrees of freedom."""
+    df_degrees = np.asarray(n, dtype=float) - 2 - n_covariates
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_stat = partial_r * np.sqrt(df_degrees / (1 - partial_r ** 2))
+        p_value = 2 * stats.t.sf(np.abs(t_stat), df_degrees)
+    return np.where(df_degrees > 0, p_value, np.nan)
+
+
+def partial_slope(partial_r, cov):
+    """Partial regression slope partial r * sd(y) / sd(x) of variables 0 (x) and 1 (y)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return partial_r * np.sqrt(cov[..., 1, 1] / cov[..., 0, 0])
+
+
+def cell_moments(values, valid, codes, n_cells):
+    """
+    Counts, means and covariances of several variable sets in every cell
+
+    Means are taken first and the cross products of the centered rows summed second, so a
+    variable that is constant within a cell has (up to rounding) zero variance.
+
+    Parameters:
+    values: (k, rows, p) variables of k outcomes ([x, outcome, covariates])
+    valid: (k, rows) rows usable for each outcome
+    codes: (rows,) cell of every row (0 .. n_cells - 1)
+    n_cells: number of cells
+
+    Returns:
+    count (k, n_cells), means (k, n_cells, p), cov (k, n_cells, p, p) with ddof 0
+    """
+    k, rows, p = values.shape
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    valid = valid[:, order]
+    values = np.where(valid[..., None], values[:, order], 0.0)
+    present = np.bincount(codes, minlength=n_cells) > 0
+    # reduceat needs a non-empty slice per start; empty cells get a count of 0
+    starts = np.minimum(np.searchsorted(codes, np.arange(n_cells)), rows - 1)
+
+    count = np.add.reduceat(valid.astype(float), starts, axis=1) * present
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.add.reduceat(values, starts, axis=1) / count[..., None]
+    centered = np.where(valid[..., None], values - np.nan_to_num(means)[:, codes], 0.0)
+    cross = np.add.reduceat((centered[..., :, None] * centered[..., None, :]).reshape(k, rows, p * p), starts, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = cross.reshape(k, n_cells, p, p) / count[..., None, None]
+    return count, means, constant_to_zero(cov, means)
+
+
+def stratum_codes(codes, covariates):
+    """Stratum of every row: rows of the same cell with the same covariate values."""
+    _, strata = np.unique(np.column_stack([codes, covariates]), axis=0, return_inverse=True)
+    return strata.ravel()
+
+
+def permuted_cross(x, ys, strata, cell_of, n_cells, n_perm, rng):
+    """
+    Cross products sum(x * y) of every cell with y permuted within strata
+
+    Parameters:
+    x: (rows,) predictor, centered on its cell means
+    ys: (rows, k) outcomes sharing these rows, centered on their cell means
+    strata: (rows,) stratum of every row
+    cell_of: (n_strata,) cell of every stratum
+    n_perm: number of permutations (one block)
+
+    Returns:
+    cross: (n_perm, k, n_cells)
+    """
+    cross = np.zeros((n_perm, ys.shape[1], n_cells))
+    order = np.argsort(strata, kind='stable')
+    bounds = np.flatnonzero(np.diff(strata[order])) + 1
+    for rows in np.split(order, bounds):
+        cell = cell_of[strata[rows[0]]]
+        if len(rows) == 1:
+            cross[:, :, cell] += x[rows[0]] * ys[rows[0]]
+            continue
+        shuffled = rng.permuted(np.broadcast_to(np.arange(len(rows)), (n_perm, len(rows))), axis=1)
+        cross[:, :, cell] += np.einsum('bmk,m->bk', ys[rows][shuffled], x[rows])
+    return cross
+
+
+def permutation_pvalues(values, valid, codes, strata, count, means, cov, partial_r, n_perm=N_PERM, rng=None,
+                        block_size=PERMUTATION_BLOCK):
+    """
+    Two-sided permutation p-values of the partial correlations of every outcome and cell
+
+    Each outcome is permuted within the strata of its cell, so its means, variance and
+    covariances with the covariates (constant within a stratum) stay as observed and only
+    cov(x, outcome) changes. A block of permutations therefore needs the permuted cross
+    products alone; they replace cov[0, 1] of the observed matrices and partial_from_cov
+    solves the whole (permutations, outcomes, cells) stack at once. Outcomes complete on
+    the same rows share their permutations.
+
+    Parameters:
+    values, valid, codes, count, means, cov: as in cell_moments
+    strata: (rows,) stratum of every row
+    partial_r: (k, n_cells) observed partial correlations
+    n_perm: number of permutations
+    rng: numpy Generator or seed
+    block_size: permutations per block
+
+    Returns:
+    p_perm: (k, n_cells), (1 + permutations with |r| >= observed |r|) / (1 + n_perm)
+    """
+    rng = np.random.default_rng(rng)
+    n_cells = count.shape[1]
+    cell_of = np.zeros(strata.max() + 1 if len(strata) else 0, dtype=int)
+    cell_of[strata] = codes
+    exceed = np.zeros(partial_r.shape)
+
+    shared = {}
+    for j in range(len(values)):
+        shared.setdefault(valid[j].tobytes(), []).append(j)
+    for same_rows in shared.values():
+        rows = valid[same_rows[0]]
+        if not rows.any():
+            continue
+        x = values[same_rows[0], rows, 0] - means[same_rows[0], codes[rows], 0]
+        ys = (values[same_rows][:, rows, 1] - means[same_rows][:, codes[rows], 1]).T
+        observed = np.abs(partial_r[same_rows]) - 1e-12
+        for start in range(0, n_perm, block_size):
+            size = min(block_size, n_perm - start)
+            cross = permuted_cross(x, ys, strata[rows], cell_of, n_cells, size, rng)
+            permuted = np.broadcast_to(cov[same_rows], (size,) + cov[same_rows].shape).copy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                permuted[..., 0, 1] = permuted[..., 1, 0] = cross / count[same_rows]
+            exceed[same_rows] += (np.abs(partial_from_cov(permuted)) >= observed).sum(axis=0)
+    return np.where(np.isnan(partial_r), np.nan, (1 + exceed) / (1 + n_perm))
+
+
+def partial_correlations(df, x, outcomes, covariates=COVARIATES, by=CELLS, min_n=3, n_perm=0, rng=None):
+    """
+    Partial correlations of x with every outcome given the covariates, in every cell
+
+    Parameters:
+    df: participant-level table
+    x: predictor column (choice_mean in the scripts)
+    outcomes: outcome columns
+    covariates: control columns (any number)
+    by: columns defining a cell (rows with a missing cell value are skipped)
+    min_n: smallest number of complete rows for a result
+    n_perm: permutations for p_perm (0: no permutation test); each outcome is permuted
+            within the rows of its cell that share covariate values (e.g. a cost level),
+            so the covariates should be discrete
+    rng: numpy Generator or seed of the permutations
+
+    Returns:
+    results: DataFrame with the by columns, outcome, partial_r, p_value, partial_slope and n
+             (and p_perm if n_perm > 0), one row per cell and outcome, cells in order of appearance
+    """
+    by, covariates, outcomes = list(by), list(covariates), list(outcomes)
+    codes = df.groupby(by, sort=False, dropna=True).ngroup().to_numpy()
+    keep = codes >= 0
+    codes = codes[keep]
+    cells = df.loc[keep, by].drop_duplicates().reset_index(drop=True)
+    n_cells = len(cells)
+
+    base = df.loc[keep, [x] + covariates].to_numpy(dtype=float)
+    outcome_values = df.loc[keep, outcomes].to_numpy(dtype=float)
+    values = np.stack([np.column_stack([base[:, :1], outcome_values[:, j], base[:, 1:]]) for j in range(len(outcomes))])
+    valid = ~np.isnan(values).any(axis=2)
+
+    count, means, cov = cell_moments(values, valid, codes, n_cells)
+    partial_r = np.where(count >= min_n, partial_from_cov(cov), np.nan)
+
+    results = pd.concat([cells.assign(outcome=outcome) for outcome in outcomes], ignore_index=True)
+    results['partial_r'] = partial_r.ravel()
+    results['p_value'] = t_pvalues(partial_r, count, len(covariates)).ravel()
+    results['partial_slope'] = partial_slope(partial_r, cov).ravel()
+    results['n'] = count.astype(int).ravel()
+    if n_perm > 0:
+        strata = stratum_codes(codes, base[:, 1:])
+        results['p_perm'] = permutation_pvalues(values, valid, codes, strata, count, means, cov, partial_r,
+                                                n_perm, rng).ravel()
+    return results
+
+
+def partial_correlation(x, y, covariates):
+    """
+    Partial correlation of two arrays given one or more covariate arrays (one cell)
+
+    Returns:
+    partial_r, p_value, partial_slope, n (NaN results for fewer than 3 complete rows)
+    """
+    covariates = np.asarray(covariates, dtype=float)
+    covariates = covariates[:, None] if covariates.ndim == 1 else covariates
+    values = np.column_stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float), covariates])
+    values = values[~np.isnan(values).any(axis=1)]
+    n = len(values)
+    means = values.mean(axis=0) if n else np.full(values.shape[1], np.nan)
+    centered = values - means
+    cov = constant_to_zero(centered.T @ centered / max(n, 1), means)
+    partial_r = partial_from_cov(cov) if n >= 3 else np.nan
+    return (float(partial_r), float(t_pvalues(partial_r, n, covariates.shape[1])),
+            float(partial_slope(partial_r, cov)), n)
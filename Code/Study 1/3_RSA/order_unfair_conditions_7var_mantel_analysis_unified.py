@@ -3,45 +3,13 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
 from scipy.spatial.distance import cdist
-from scipy.stats import pearsonr
 import warnings
 warnings.filterwarnings('ignore')
 
-def mantel(x, y, n_perm=10000, metric='pearson'):
-    """
-    Custom Mantel test function
-    """
-    n = x.shape[0]
-    upper_tri_indices = np.triu_indices(n, k=1)
-    x_flat = x[upper_tri_indices]
-    y_flat = y[upper_tri_indices]
-    
-    if metric == 'pearson':
-        observed_r, _ = pearsonr(x_flat, y_flat)
-    else:
-        from scipy.stats import spearmanr
-        observed_r, _ = spearmanr(x_flat, y_flat)
-    
-    # Permutation test
-    permuted_rs = []
-    for _ in range(n_perm):
-        perm_indices = np.random.permutation(n)
-        y_perm = y[np.ix_(perm_indices, perm_indices)]
-        y_perm_flat = y_perm[upper_tri_indices]
-        
-        if metric == 'pearson':
-            perm_r, _ = pearsonr(x_flat, y_perm_flat)
-        else:
-            from scipy.stats import spearmanr
-            perm_r, _ = spearmanr(x_flat, y_perm_flat)
-        
-        permuted_rs.append(perm_r)
-    
-    p_value = np.mean(np.abs(permuted_rs) >= np.abs(observed_r))
-    return observed_r, p_value
+from rsa_results import DATA_FILE, load_or_compute_results  # RSA, Mantel and Pearson results, cached
 
 print("Reading unfair conditions 7-variable dataset...")
-df = pd.read_excel("unfair_all_datasets_means_with_emotions_7_variables.xlsx")
+df = pd.read_excel(DATA_FILE)
 print(f"Dataset shape: {df.shape}")
 print(f"Column names: {list(df.columns)}")
 
@@ -57,97 +25,21 @@ group_mapping = {
 
 print("Starting RSA correlation matrix calculation (using same method as mantel analysis)...")
 
-# Calculate RSA matrices using same method as unfair_7var_validation_rsa_mantel_analysis
-rsa_matrices = {}
+# RSA matrices, Mantel and Pearson matrices are shared with unfair_7var_validation_rsa_mantel_analysis through
+# the result cache: computed by whichever script runs first, recomputed if the input file or settings change
+results, _ = load_or_compute_results(DATA_FILE)
+
 for group in groups:
-    prefix = group_mapping[group]
-    
-    # Select corresponding columns based on group name (7 variables)
-    if prefix == 'human':
-        columns = ['human_choice', 'human_AA_valence', 'human_AA_arousal', 
-                  'human_AC_valence', 'human_AC_arousal', 
-                  'human_EmoFDBK_valence', 'human_EmoFDBK_arousal']
-    elif prefix == 'gpt35':
-        columns = ['gpt35_choice', 'gpt35_AA_valence', 'gpt35_AA_arousal',
-                  'gpt35_AC_valence', 'gpt35_AC_arousal',
-                  'gpt35_EmoFDBK_valence', 'gpt35_EmoFDBK_arousal']
-    elif prefix == 'o3':
-        columns = ['o3_choice', 'o3_AA_valence', 'o3_AA_arousal',
-                  'o3_AC_valence', 'o3_AC_arousal',
-                  'o3_EmoFDBK_valence', 'o3_EmoFDBK_arousal']
-    elif prefix == 'V3':
-        columns = ['V3_choice', 'V3_AA_valence', 'V3_AA_arousal',
-                  'V3_AC_valence', 'V3_AC_arousal',
-                  'V3_EmoFDBK_valence', 'V3_EmoFDBK_arousal']
-    elif prefix == 'R1':
-        columns = ['R1_choice', 'R1_AA_valence', 'R1_AA_arousal',
-                  'R1_AC_valence', 'R1_AC_arousal',
-                  'R1_EmoFDBK_valence', 'R1_EmoFDBK_arousal']
-    
-    # Extract group data and standardize
-    group_data = df[columns].values.astype(float)
-    group_data_std = (group_data - group_data.mean(axis=0)) / group_data.std(axis=0)
-    
-    # Calculate RSA correlation matrix (using same method as mantel analysis)
-    rsa_matrix = np.corrcoef(group_data_std)
-    rsa_matrices[group] = rsa_matrix
-    
+    rsa_matrix = results[f"rsa_{group_mapping[group]}"]
     print(f"{group} RSA matrix: shape={rsa_matrix.shape}, range=[{rsa_matrix.min():.3f}, {rsa_matrix.max():.3f}]")
-    print(f"  Variables used: {len(columns)} ({', '.join([col.split('_')[-1] for col in columns])})")
 
 print("\nStarting Mantel and Pearson correlation calculation...")
 
-print("Using pre-calculated RSA Mantel and Pearson correlation matrices...")
-
-print("\nReading pre-calculated RSA Mantel and Pearson correlation matrices...")
-
-# Read RSA Mantel correlation matrices
-try:
-    rsa_mantel_correlations = pd.read_csv("unfair_7var_validation_rsa_mantel_correlations.csv", index_col=0)
-    rsa_mantel_pvalues = pd.read_csv("unfair_7var_validation_rsa_mantel_pvalues.csv", index_col=0)
-    
-    # Original data has been adjusted to correct group order: ["Human", "gpt35", "V3", "R1", "o3"]
-    # Use original data directly, no need to reorder
-    rsa_mantel_correlations_reordered = rsa_mantel_correlations
-    rsa_mantel_pvalues_reordered = rsa_mantel_pvalues
-    
-    # Convert reordered RSA Mantel data to numpy arrays
-    mantel_correlations = rsa_mantel_correlations_reordered.values
-    mantel_pvalues = rsa_mantel_pvalues_reordered.values
-    
-    print("Successfully read RSA Mantel data:")
-    print("Reordered Mantel correlation matrix:")
-    print(rsa_mantel_correlations_reordered)
-    print("\nReordered Mantel p-value matrix:")
-    print(rsa_mantel_pvalues_reordered)
-    
-except FileNotFoundError:
-    print("Error: RSA Mantel CSV files not found!")
-    exit(1)
-
-# Read RSA Pearson correlation matrices
-try:
-    rsa_pearson_correlations = pd.read_csv("unfair_7var_validation_rsa_pearson_correlations.csv", index_col=0)
-    rsa_pearson_pvalues = pd.read_csv("unfair_7var_validation_rsa_pearson_pvalues.csv", index_col=0)
-    
-    # Original data has been adjusted to correct group order: ["Human", "gpt35", "V3", "R1", "o3"]
-    # Use original data directly, no need to reorder
-    rsa_pearson_correlations_reordered = rsa_pearson_correlations
-    rsa_pearson_pvalues_reordered = rsa_pearson_pvalues
-    
-    # Convert reordered RSA Pearson data to numpy arrays
-    pearson_correlations = rsa_pearson_correlations_reordered.values
-    pearson_pvalues = rsa_pearson_pvalues_reordered.values
-    
-    print("\nSuccessfully read RSA Pearson data:")
-    print("Reordered Pearson correlation matrix:")
-    print(rsa_pearson_correlations_reordered)
-    print("\nReordered Pearson p-value matrix:")
-    print(rsa_pearson_pvalues_reordered)
-    
-except FileNotFoundError:
-    print("Error: RSA Pearson CSV files not found!")
-    exit(1)
+# Same group order as the cached results: ["Human", "gpt35", "V3", "R1", "o3"]
+mantel_correlations = results["mantel_r"]
+mantel_pvalues = results["mantel_p"]
+pearson_correlations = results["pearson_r"]
+pearson_pvalues = results["pearson_p"]
 
 # Convert to DataFrame for display
 mantel_df = pd.DataFrame(mantel_correlations, index=groups, columns=groups)
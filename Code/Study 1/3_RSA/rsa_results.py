@@ -0,0 +1,165 @@
+"""
+RSA matrices, Mantel and Pearson results of the unfair-condition 7-variable analysis.
+
+Both RSA scripts of this folder get their results from load_or_compute_results, which
+keeps them in a content-hashed cache (rsa_cache/) keyed by the input file, the groups,
+the variables and the permutation settings. The first run computes and stores them; later
+runs of either script load them, and a changed input file or setting is recomputed.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy.stats import pearsonr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from rsa_analysis import mantel_matrix, mantel_matrix_sequential  # batched permutation engine shared with the other RSA scripts
+from rsa_analysis.cache import ResultCache, file_digest
+from rsa_analysis.rdm import wide_rdms
+
+DATA_FILE = "unfair_all_datasets_means_with_emotions_7_variables.xlsx"
+GROUPS = ['human', 'gpt35', 'V3', 'R1', 'o3']
+VARIABLES = ['choice', 'AA_valence', 'AA_arousal', 'AC_valence', 'AC_arousal', 'EmoFDBK_valence', 'EmoFDBK_arousal']
+N_PERM = 10000
+SEED = 42
+
+# Bump when a change to the computations below changes their results
+RESULTS_VERSION = 2
+
+RESULT_CACHE = ResultCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), "rsa_cache"))
+
+
+def compute_rsa_matrices_7var(data_df):
+    """
+    Calculate RSA correlation matrices for all groups (using 7 variables)
+    
+    Parameters:
+    data_df: original data DataFrame
+    
+    Returns:
+    rsa_matrices: dictionary containing RSA matrix for each group
+    """
+    # Columns "{group}_{variable}" of every group, z-scored and correlated in one batch
+    rsa_matrices = dict(zip(GROUPS, wide_rdms(data_df, GROUPS, VARIABLES, distance="similarity")))
+    
+    for group, rsa_matrix in rsa_matrices.items():
+        print(f"{group.upper()} RSA matrix: shape={rsa_matrix.shape}, range=[{rsa_matrix.min():.3f}, {rsa_matrix.max():.3f}]")
+        print(f"  Variables used: {len(VARIABLES)} ({', '.join([var.split('_')[-1] for var in VARIABLES])})")
+    
+    return rsa_matrices
+
+
+def rsa_mantel_analysis(rsa_matrices, analysis_name="", sequential=False):
+    """
+    Perform RSA Mantel analysis
+    
+    Parameters:
+    rsa_matrices: dictionary containing RSA matrices for all groups
+    analysis_name: analysis name
+    sequential: stop each pair once its significance at 0.05/0.01/0.001 is settled
+    
+    Returns:
+    mantel_matrix: Mantel correlation matrix
+    p_matrix: p-value matrix
+    """
+    groups = list(rsa_matrices.keys())
+    matrices = [rsa_matrices[group] for group in groups]
+    
+    # Each unordered pair is tested once, sharing one seeded permutation stream per target group;
+    # the permutation chunks run on all cores and give the same p-values for any core count
+    if sequential:
+        mantel_r_matrix, p_matrix, used_matrix = mantel_matrix_sequential(matrices, n_perm=N_PERM, rng=SEED)
+    else:
+        mantel_r_matrix, p_matrix = mantel_matrix(matrices, n_perm=N_PERM, rng=SEED)
+    
+    print(f"\n=== {analysis_name}RSA Mantel Test Results ===")
+    
+    for i, group1 in enumerate(groups):
+        for j, group2 in enumerate(groups):
+            if i != j:
+                line = f"{group1.upper()} vs {group2.upper()}: r = {mantel_r_matrix[i, j]:.3f}, p = {p_matrix[i, j]:.3f}"
+                if sequential:
+                    line += f" ({used_matrix[i, j]} permutations)"
+                print(line)
+    
+    return mantel_r_matrix, p_matrix
+
+def pearson_analysis(rsa_matrices, analysis_name=""):
+    """
+    Perform Pearson correlation analysis (flatten RSA matrices)
+    
+    Parameters:
+    rsa_matrices: dictionary containing RSA matrices for all groups
+    analysis_name: analysis name
+    
+    Returns:
+    pearson_matrix: Pearson correlation matrix
+    pearson_p_matrix: p-value matrix
+    """
+    groups = list(rsa_matrices.keys())
+    n_groups = len(groups)
+    
+    pearson_matrix = np.zeros((n_groups, n_groups))
+    pearson_p_matrix = np.zeros((n_groups, n_groups))
+    
+    print(f"\n=== {analysis_name}Pearson Correlation Test Results ===")
+    
+    for i, group1 in enumerate(groups):
+        for j, group2 in enumerate(groups):
+            if i != j:
+                rsa1 = rsa_matrices[group1]
+                rsa2 = rsa_matrices[group2]
+                
+                # Flatten RSA matrices for Pearson correlation
+                rsa1_flat = rsa1.flatten()
+                rsa2_flat = rsa2.flatten()
+                
+                pearson_r, pearson_p = pearsonr(rsa1_flat, rsa2_flat)
+                pearson_matrix[i, j] = pearson_r
+                pearson_p_matrix[i, j] = pearson_p
+                
+                print(f"{group1.upper()} vs {group2.upper()}: r = {pearson_r:.3f}, p = {pearson_p:.3f}")
+            else:
+                pearson_matrix[i, j] = 1.0  # Diagonal
+                pearson_p_matrix[i, j] = 0.0
+    
+    return pearson_matrix, pearson_p_matrix
+
+def load_or_compute_results(data_file=DATA_FILE, sequential=False, refresh=False):
+    """
+    Mantel and Pearson matrices of all groups, from the result cache or computed and cached
+    
+    Parameters:
+    data_file: Excel file of condition means
+    sequential: stop each Mantel pair once its significance is settled
+    refresh: recompute even if cached
+    
+    Returns:
+    results: dictionary with mantel_r, mantel_p, pearson_r, pearson_p and rsa_{group} arrays
+    hit: True if the results were loaded from the cache
+    """
+    parts = {
+        "data": file_digest(data_file),
+        "groups": GROUPS,
+        "variables": VARIABLES,
+        "mantel": {"n_perm": N_PERM, "seed": SEED, "metric": "pearson", "alternative": "two-sided",
+                   "sequential": sequential},
+        "pearson": "flattened matrices",
+        "version": RESULTS_VERSION,
+    }
+
+    def compute():
+        print(f"Computing RSA results from {data_file}...")
+        rsa_matrices = compute_rsa_matrices_7var(pd.read_excel(data_file))
+        mantel_r, mantel_p = rsa_mantel_analysis(rsa_matrices, "Unfair 7-variable ", sequential)
+        pearson_r, pearson_p = pearson_analysis(rsa_matrices, "Unfair 7-variable ")
+        results = {"mantel_r": mantel_r, "mantel_p": mantel_p, "pearson_r": pearson_r, "pearson_p": pearson_p}
+        results.update({f"rsa_{group}": matrix for group, matrix in rsa_matrices.items()})
+        return results
+
+    results, hit = RESULT_CACHE.fetch(parts, compute, refresh)
+    if hit:
+        print(f"Loaded cached RSA results for {data_file} ({RESULT_CACHE.key(parts)[:12]})")
+    return results, hit
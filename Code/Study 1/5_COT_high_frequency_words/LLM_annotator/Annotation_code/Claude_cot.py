@@ -1,15 +1,20 @@
+import os
+import sys
 import pandas as pd
 import json
 import time
-import httpx
 from tqdm import tqdm
-from openai import OpenAI
+
+# Circuit breaker / failover shared with the Section 1 experiment runner
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "Section 1_experiment of LLM", "prompt"))
+from gateway import Gateway
 
 # --------------------------------------------
 # 1. Global configuration
 # --------------------------------------------
 API_KEY = "#######################################"
 BASE_URL = "https://api.midsummer.work"
+BASE_URLS = [BASE_URL]  # append a secondary gateway root to enable failover
 MODEL_NAME = "claude-3-5-sonnet-20241022"
 TEMPERATURE = 0
 MAX_TOKENS = 2048
@@ -18,18 +23,12 @@ BATCH_SIZE = 30  # Maximum number of words per batch; Claude recommends ≤ 30
 # --------------------------------------------
 # 2. LLM request wrapper (Claude)
 # --------------------------------------------
-def llm_res(prompt):
-    client = OpenAI(
-        base_url=f"{BASE_URL}/v1",
-        api_key=API_KEY,
-        http_client=httpx.Client(
-            base_url=BASE_URL,
-            follow_redirects=True,
-            timeout=httpx.Timeout(600.0),
-        ),
-    )
+GATEWAY = Gateway(api_key=API_KEY, timeout=600.0)
 
-    response = client.chat.completions.create(
+
+def llm_res(prompt):
+    response = GATEWAY.chat(
+        BASE_URLS,
         model=MODEL_NAME,
         messages=[
             {"role": "system", "content": ""},
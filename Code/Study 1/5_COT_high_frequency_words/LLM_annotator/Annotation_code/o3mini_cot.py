@@ -1,9 +1,12 @@
 import os
+import sys
 import pandas as pd
 from tqdm import tqdm
 import time
-import httpx
-from openai import OpenAI
+
+# Circuit breaker / failover shared with the Section 1 experiment runner
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "Section 1_experiment of LLM", "prompt"))
+from gateway import Gateway
 
 # ---------------------
 # 1. Global Configuration
@@ -13,22 +16,18 @@ from openai import OpenAI
 #    export API_KEY="your_api_key_here"
 API_KEY = os.getenv("API_KEY") or "YOUR_API_KEY_HERE"
 BASE_URL = "https://api.midsummer.work"
+BASE_URLS = [BASE_URL]  # append a secondary gateway root to enable failover
 TEMPERATURE = 0
 
 # ---------------------
 # 2. LLM Request Function (Midsummer API compatible)
 # ---------------------
+GATEWAY = Gateway(api_key=API_KEY, timeout=600.0)
+
+
 def llm_res(prompt, model_name="o3-mini"):
-    client = OpenAI(
-        base_url=f"{BASE_URL}/v1",
-        api_key=API_KEY,
-        http_client=httpx.Client(
-            base_url=BASE_URL,
-            follow_redirects=True,
-            timeout=httpx.Timeout(600.0),
-        ),
-    )
-    response = client.chat.completions.create(
+    response = GATEWAY.chat(
+        BASE_URLS,
         model=model_name,
         messages=[
             {"role": "system", "content": ""},
@@ -0,0 +1,34 @@
+"""
+Shared RSA routines for the Study 1 and Section 6/7 Mantel analyses.
+
+Scripts add the Code folder to sys.path and import from here, e.g.
+
+    from rsa_analysis import mantel_test
+
+Whole analyses can be described by a JSON spec and run with python -m rsa_analysis spec.json.
+"""
+
+from .bootstrap import bootstrap_similarity
+from .condensed import CondensedRDM, mantel_condensed
+from .mantel import PermutedTriangles, mantel_matrix, mantel_matrix_sequential, mantel_test, upper_triangle
+from .rdm import RDMBuilder, cache_info, compute_multivariable_rdm, model_rdms, safe_zscore, wide_rdms
+from .spec import load_spec, run_spec
+
+__all__ = [
+    "CondensedRDM",
+    "PermutedTriangles",
+    "RDMBuilder",
+    "bootstrap_similarity",
+    "cache_info",
+    "compute_multivariable_rdm",
+    "load_spec",
+    "mantel_condensed",
+    "mantel_matrix",
+    "mantel_matrix_sequential",
+    "mantel_test",
+    "model_rdms",
+    "run_spec",
+    "safe_zscore",
+    "upper_triangle",
+    "wide_rdms",
+]
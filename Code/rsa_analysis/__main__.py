@@ -0,0 +1,31 @@
+"""
+Run RSA specs from the command line.
+
+Usage (from the Code folder):
+    python -m rsa_analysis "Study 1/3_RSA/rsa_spec.json"
+    python -m rsa_analysis "Section 6_Nopersona/rsa_spec.json" --perms 100000 --sequential
+"""
+
+import argparse
+
+from .spec import load_spec, print_results, run_spec
+
+parser = argparse.ArgumentParser(description="Run RSA specs: RDMs, all-pairs Mantel tests and figures")
+parser.add_argument("specs", nargs="+", help="spec JSON files")
+parser.add_argument("--perms", type=int, default=None, help="override the spec's number of permutations")
+parser.add_argument("--sequential", action="store_true", help="stop each pair once its significance is settled")
+parser.add_argument("--no-figures", action="store_true")
+parser.add_argument("--refresh", action="store_true", help="recompute cached Mantel results")
+args = parser.parse_args()
+
+for path in args.specs:
+    spec = load_spec(path)
+    if args.perms is not None:
+        spec["mantel"]["n_perm"] = args.perms
+    if args.sequential:
+        spec["mantel"]["sequential"] = True
+    labels, rdms, results, timings = run_spec(spec, figures=not args.no_figures, refresh=args.refresh)
+    print(f"=== {spec['name']}: {len(labels)} RDMs of size {rdms.shape[1]}, {spec['distance']} ===")
+    print_results(labels, results)
+    print("Timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    print(f"Outputs written to {spec['output']}")
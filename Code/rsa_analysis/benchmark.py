@@ -0,0 +1,160 @@
+"""
+Scaling benchmark of the all-pairs Mantel test over 1..N worker processes.
+
+Synthetic correlation-distance RDMs of the Section 6/7 size (60 conditions) are tested
+with mantel_matrix for every worker count; the p-values of every run are checked against
+the single-process run, which they must match exactly.
+
+--condensed N times instead a subject-level test of two N x N condensed float32 RDMs,
+memory-mapped to a temporary folder, and reports the peak memory of the test.
+
+--spec PATH times the stages of an RSA spec (load, RDMs, all-pairs Mantel) without the
+result cache, against testing every pair on its own with mantel_test.
+
+Usage (from the Code folder):
+    python -m rsa_analysis.benchmark --rdms 10 --perms 100000 --workers 1 2 4 8
+    python -m rsa_analysis.benchmark --condensed 1017 --perms 1000
+    python -m rsa_analysis.benchmark --spec "Study 1/3_RSA/rsa_spec.json"
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from scipy.spatial.distance import pdist, squareform
+
+from .condensed import CondensedRDM, mantel_condensed
+from .mantel import mantel_matrix, mantel_test
+from .spec import load_data, load_spec, spec_mantel, spec_models, spec_rdms
+
+
+def synthetic_rdms(k, n_conditions=60, n_subjects=40, seed=0):
+    """k RDMs sharing a common structure plus noise, like group x condition RDMs."""
+    rng = np.random.default_rng(seed)
+    shared = rng.normal(size=(n_conditions, n_subjects))
+    return [
+        squareform(pdist(shared + rng.uniform(0.5, 3) * rng.normal(size=shared.shape), metric="correlation"))
+        for _ in range(k)
+    ]
+
+
+def run_benchmark(k=10, n_perm=100000, workers=None, n_conditions=60, seed=42, chunk_size=2500):
+    """
+    Time mantel_matrix for each worker count
+
+    Returns:
+    rows: [(workers, seconds, speedup, identical p-values)]
+    """
+    workers = workers or [1, os.cpu_count()]
+    rdms = synthetic_rdms(k, n_conditions)
+    rows = []
+    baseline = None
+    for n_workers in workers:
+        start = time.perf_counter()
+        _, p_matrix = mantel_matrix(rdms, n_perm=n_perm, rng=seed, workers=n_workers, chunk_size=chunk_size)
+        seconds = time.perf_counter() - start
+        if baseline is None:
+            baseline = (seconds, p_matrix)
+        identical = np.array_equal(p_matrix, baseline[1], equal_nan=True)
+        rows.append((n_workers, seconds, baseline[0] / seconds, identical))
+    return rows
+
+
+def run_condensed_benchmark(n_items=1017, n_perm=1000, n_features=60, seed=42):
+    """
+    Time the condensed, memory-mapped Mantel test of two n_items x n_items RDMs
+
+    Returns:
+    build_seconds, test_seconds, rdm_megabytes, peak_megabytes, (r, p)
+    """
+    rng = np.random.default_rng(seed)
+    shared = rng.normal(size=(n_items, n_features))
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        for name in ("x", "y"):
+            CondensedRDM.from_data(shared + 3 * rng.normal(size=shared.shape), path=os.path.join(folder, f"{name}.npy"))
+        build_seconds = time.perf_counter() - start
+        x, y = (CondensedRDM.load(os.path.join(folder, f"{name}.npy")) for name in ("x", "y"))
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = mantel_condensed(x, y, n_perm, rng=seed)
+        test_seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rdm_megabytes = x.nbytes / 1e6
+        del x, y
+    return build_seconds, test_seconds, rdm_megabytes, peak / 1e6, result
+
+
+def run_spec_benchmark(path, n_perm=None):
+    """
+    Time the stages of an RSA spec and the same tests run pair by pair
+
+    Returns:
+    timings: {stage: seconds}
+    pairs: number of RDM pairs
+    max_difference: largest |p| difference between the all-pairs and the pair-by-pair runs
+    """
+    spec = load_spec(path)
+    if n_perm is not None:
+        spec["mantel"]["n_perm"] = n_perm
+    settings = spec["mantel"]
+    timings = {}
+    start = time.perf_counter()
+    df = load_data(spec)
+    timings["load"] = time.perf_counter() - start
+    start = time.perf_counter()
+    labels, rdms = spec_rdms(spec, df)
+    timings["rdms"] = time.perf_counter() - start
+    start = time.perf_counter()
+    results, _ = spec_mantel(spec, df, rdms)
+    timings["mantel_matrix"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    models = spec_models(spec, df)
+    max_difference = 0.0
+    for i in range(len(labels)):
+        for j in range(i + 1, len(labels)):
+            _, p = mantel_test(rdms[i], rdms[j], settings["n_perm"], settings["metric"], rng=settings["seed"],
+                               alternative=settings["alternative"], plus_one=settings["plus_one"], models=models)
+            max_difference = max(max_difference, abs(p - results["p"][i, j]))
+    timings["pair by pair"] = time.perf_counter() - start
+    return timings, len(labels) * (len(labels) - 1) // 2, max_difference
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the all-pairs Mantel test")
+    parser.add_argument("--rdms", type=int, default=10, help="number of RDMs (pairs = k * (k - 1) / 2)")
+    parser.add_argument("--conditions", type=int, default=60, help="RDM size")
+    parser.add_argument("--perms", type=int, default=None, help="default: 100000, or the spec's for --spec")
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help=f"default: 1 {os.cpu_count()}")
+    parser.add_argument("--chunk-size", type=int, default=2500)
+    parser.add_argument("--condensed", type=int, default=None, metavar="N", help="time one N x N condensed test instead")
+    parser.add_argument("--spec", default=None, metavar="PATH", help="time the stages of an RSA spec instead")
+    args = parser.parse_args()
+
+    if args.spec:
+        timings, pairs, max_difference = run_spec_benchmark(args.spec, args.perms)
+        print(f"{args.spec}: {pairs} pairs")
+        for stage, seconds in timings.items():
+            print(f"{stage:>14} {seconds:>9.2f}s")
+        print(f"largest p-value difference (separate seed streams): {max_difference:.4f}")
+    elif args.condensed:
+        args.perms = args.perms or 100000
+        build_seconds, test_seconds, rdm_megabytes, peak_megabytes, (r, p) = run_condensed_benchmark(
+            args.condensed, args.perms
+        )
+        print(f"{args.condensed} x {args.condensed} condensed float32 RDMs: {rdm_megabytes:.1f} MB each, built in {build_seconds:.2f}s")
+        print(f"{args.perms} permutations in {test_seconds:.2f}s, peak memory {peak_megabytes:.0f} MB, r = {r:.3f}, p = {p:.4f}")
+    else:
+        args.perms = args.perms or 100000
+        pairs = args.rdms * (args.rdms - 1) // 2
+        print(f"{pairs} pairs x {args.perms} permutations, {args.conditions} conditions, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'seconds':>9} {'speedup':>8} {'same p':>7}")
+        for n_workers, seconds, speedup, identical in run_benchmark(
+            args.rdms, args.perms, args.workers, args.conditions, chunk_size=args.chunk_size
+        ):
+            print(f"{n_workers:>8} {seconds:>9.2f} {speedup:>8.2f} {str(identical):>7}")
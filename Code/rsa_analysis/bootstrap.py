@@ -0,0 +1,244 @@
+"""
+Subject-bootstrap confidence intervals for the similarity of multivariable RDMs.
+
+Subjects are resampled with replacement within each group. RDMs of the same group under
+different conditions share the resampled subjects (the personas are the same), so their
+comparison is a paired bootstrap. The trial table is pivoted once per (group, condition)
+by RDMBuilder.cube; a resample only indexes the cached (conditions, subjects, variables)
+cube, and a batch of resamples is turned into RDMs with array operations:
+
+    cube[subjects]                      (batch, subjects, conditions, variables)
+    safe_zscore over subjects           as RDMBuilder.rdm
+    rows centered and scaled            -> correlation distances by one einsum
+    upper triangles                     -> all-pairs Pearson r by one einsum
+
+Intervals are percentile or BCa (bias-corrected and accelerated); the acceleration of a
+pair comes from leaving out, one at a time, each subject of the groups it compares.
+"""
+
+import numpy as np
+from scipy.stats import norm
+
+from .mantel import masked_correlations, standardize
+from .rdm import safe_zscore
+
+CI_METHODS = ("percentile", "bca")
+
+
+def batch_rdms(selected, subject_index, complete=False):
+    """
+    Correlation-distance RDMs for a batch of subject selections
+
+    Parameters:
+    selected: (subjects + 1, conditions, variables) cube, subjects first; the last subject
+              row is all NaN and stands for subjects missing from this cube
+    subject_index: (batch, size) rows of selected to use, repeats allowed
+    complete: the selected rows have no missing values (skips the NaN-aware path)
+
+    Returns:
+    rdms: (batch, conditions, conditions) arrays, as RDMBuilder.rdm on the selected subjects
+    """
+    values = selected[subject_index]
+    if complete:
+        # z-scored blocks have zero mean, so every row is centered already; scaling each
+        # (condition, variable) block to norm 1 / sqrt(variables) gives unit rows
+        values -= values.mean(axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values /= np.sqrt(np.einsum("bscv,bscv->bcv", values, values) * values.shape[3])[:, None]
+        features = values.transpose(0, 2, 1, 3).reshape(values.shape[0], values.shape[2], -1)
+        return 1 - features @ features.transpose(0, 2, 1)
+
+    values = safe_zscore(values, axis=1, ddof=1)
+    features = values.transpose(0, 2, 1, 3).reshape(values.shape[0], values.shape[2], -1)
+    # Subjects absent from the cube are left out, as RDMBuilder.rdm never sees them;
+    # a subject missing only some conditions still makes those rows NaN, as in pdist
+    absent = np.isnan(features).all(axis=1, keepdims=True)
+    features = np.where(absent, 0.0, features)
+    count = features.shape[2] - absent.sum(axis=2, keepdims=True)
+    features -= features.sum(axis=2, keepdims=True) / count
+    features[np.broadcast_to(absent, features.shape)] = 0.0
+    features /= np.linalg.norm(features, axis=2, keepdims=True)
+    return 1 - features @ features.transpose(0, 2, 1)
+
+
+def triangle_correlations(triangles):
+    """(batch, k, k) Pearson r between the (batch, k, m) upper triangles, pairwise complete."""
+    if not np.isnan(triangles).any():
+        units = standardize(triangles, axis=2)
+        return np.einsum("bkm,blm->bkl", units, units)
+    result = np.empty(triangles.shape[:1] + (triangles.shape[1],) * 2)
+    for b, flats in enumerate(triangles):
+        valid = ~np.isnan(flats)
+        values = np.where(valid, flats, 0.0)
+        result[b] = masked_correlations(values, valid, values.T, valid.T)
+    return result
+
+
+class SubjectBootstrap:
+    """
+    Resamples subjects of each group and rebuilds the RDMs of several (group, condition)s
+
+    Parameters:
+    builder: RDMBuilder of the trial table
+    specs: [(group, condition)] of the RDMs to compare (condition None: all rows of the group)
+    variables: variables of the RDMs, as for RDMBuilder.rdm
+    """
+
+    def __init__(self, builder, specs, variables):
+        self.specs = [tuple(spec) for spec in specs]
+        self.subjects = {}
+        cubes = []
+        for group, condition in self.specs:
+            cube, _, subjects, names = builder.cube(group, condition)
+            cubes.append((cube, subjects, names))
+            self.subjects.setdefault(group, set()).update(subjects)
+        self.subjects = {group: sorted(subjects) for group, subjects in self.subjects.items()}
+
+        # Cube rows of every subject of the group; subjects missing from a cube map to the NaN row
+        self.selected = []
+        self.columns = []
+        self.complete = []
+        for (group, _), (cube, subjects, names) in zip(self.specs, cubes):
+            position = {subject: i for i, subject in enumerate(subjects)}
+            selected = np.moveaxis(cube[:, :, [names.index(var) for var in variables]], 1, 0)
+            columns = np.array([position.get(subject, len(subjects)) for subject in self.subjects[group]])
+            self.complete.append(not np.isnan(selected).any() and len(subjects) == len(columns))
+            self.selected.append(np.concatenate([selected, np.full((1,) + selected.shape[1:], np.nan)]))
+            self.columns.append(columns)
+        self.rows, self.cols = np.triu_indices(cubes[0][0].shape[0], k=1)
+
+    def triangles(self, draws):
+        """
+        (batch, k, m) upper triangles of the RDMs for per-group subject draws
+
+        Parameters:
+        draws: {group: (batch, size) positions into self.subjects[group]}
+        """
+        return np.stack([
+            batch_rdms(selected, columns[draws[group]], complete)[:, self.rows, self.cols]
+            for (group, _), selected, columns, complete in zip(self.specs, self.selected, self.columns, self.complete)
+        ], axis=1)
+
+    def observed(self):
+        """(k, k) similarity of the RDMs of all subjects."""
+        draws = {group: np.arange(len(subjects))[None] for group, subjects in self.subjects.items()}
+        return triangle_correlations(self.triangles(draws))[0]
+
+    def resample(self, n_boot, rng=None, batch_size=100):
+        """(n_boot, k, k) similarities of bootstrap resamples of the subjects of every group."""
+        rng = np.random.default_rng(rng)
+        boot = np.empty((n_boot, len(self.specs), len(self.specs)))
+        for start in range(0, n_boot, batch_size):
+            size = min(batch_size, n_boot - start)
+            draws = {
+                group: rng.integers(0, len(subjects), size=(size, len(subjects)))
+                for group, subjects in self.subjects.items()
+            }
+            boot[start:start + size] = triangle_correlations(self.triangles(draws))
+        return boot
+
+    def jackknife(self, batch_size=100):
+        """
+        Leave-one-subject-out similarities
+
+        Returns:
+        jack: {group: (n_subjects, k, k)}; only pairs involving the group change
+        """
+        jack = {}
+        for group, subjects in self.subjects.items():
+            n = len(subjects)
+            leave_out = np.array([np.delete(np.arange(n), i) for i in range(n)])
+            values = []
+            for start in range(0, n, batch_size):
+                size = len(leave_out[start:start + batch_size])
+                draws = {
+                    other: np.broadcast_to(np.arange(len(other_subjects)), (size, len(other_subjects)))
+                    for other, other_subjects in self.subjects.items()
+                }
+                draws[group] = leave_out[start:start + batch_size]
+                values.append(triangle_correlations(self.triangles(draws)))
+            jack[group] = np.concatenate(values)
+        return jack
+
+
+def acceleration(bootstrap, jack):
+    """(k, k) BCa acceleration of every pair from the jackknife values of the groups it compares."""
+    k = len(bootstrap.specs)
+    accel = np.zeros((k, k))
+    spec_groups = [group for group, _ in bootstrap.specs]
+    for i in range(k):
+        for j in range(k):
+            if i == j:
+                continue
+            values = np.concatenate([jack[group][:, i, j] for group in dict.fromkeys((spec_groups[i], spec_groups[j]))])
+            d = np.nanmean(values) - values
+            with np.errstate(divide="ignore", invalid="ignore"):
+                accel[i, j] = np.nansum(d ** 3) / (6 * np.nansum(d ** 2) ** 1.5)
+    return np.nan_to_num(accel)
+
+
+def confidence_intervals(observed, boot, level=0.95, method="bca", accel=None):
+    """
+    Percentile or BCa intervals of every entry
+
+    Parameters:
+    observed: (k, k) point estimates
+    boot: (n_boot, k, k) bootstrap estimates
+    level: coverage
+    method: 'percentile' or 'bca'
+    accel: (k, k) BCa acceleration (default: 0, bias correction only)
+
+    Returns:
+    low, high: (k, k) interval bounds
+    """
+    if method not in CI_METHODS:
+        raise ValueError(f"Unknown interval method: {method}")
+    tail = (1 - level) / 2
+    if method == "percentile":
+        return np.nanquantile(boot, tail, axis=0), np.nanquantile(boot, 1 - tail, axis=0)
+
+    accel = np.zeros_like(observed) if accel is None else accel
+    valid = ~np.isnan(boot)
+    below = np.sum(boot < observed, axis=0) + 0.5 * np.sum(boot == observed, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bias = norm.ppf(below / valid.sum(axis=0))
+    # All resamples on one side of the estimate: no usable bias correction
+    bias = np.where(np.isfinite(bias), bias, 0.0)
+    low = np.full(observed.shape, np.nan)
+    high = np.full(observed.shape, np.nan)
+    for index in zip(*np.nonzero(valid.any(axis=0) & ~np.isnan(observed))):
+        quantiles = [
+            norm.cdf(bias[index] + (bias[index] + z) / (1 - accel[index] * (bias[index] + z)))
+            for z in (norm.ppf(tail), norm.ppf(1 - tail))
+        ]
+        low[index], high[index] = np.nanquantile(boot[(slice(None),) + index], quantiles)
+    return low, high
+
+
+def bootstrap_similarity(builder, specs, variables, n_boot=2000, rng=None, method="bca", level=0.95, batch_size=100):
+    """
+    Subject-bootstrap confidence intervals of the all-pairs RDM similarity (Mantel r)
+
+    Parameters:
+    builder: RDMBuilder of the trial table
+    specs: [(group, condition)] of the RDMs to compare (condition None: all rows of the group)
+    variables: variables of the RDMs, as for RDMBuilder.rdm
+    n_boot: number of resamples
+    rng: numpy Generator or seed (default: fresh entropy)
+    method: 'bca' or 'percentile'
+    level: coverage of the intervals
+    batch_size: resamples turned into RDMs at once
+
+    Returns:
+    r_matrix: (k, k) similarity of the full-sample RDMs
+    low_matrix, high_matrix: (k, k) interval bounds, NaN on the diagonal
+    boot: (n_boot, k, k) bootstrap similarities
+    """
+    bootstrap = SubjectBootstrap(builder, specs, variables)
+    r_matrix = bootstrap.observed()
+    boot = bootstrap.resample(n_boot, rng, batch_size)
+    accel = acceleration(bootstrap, bootstrap.jackknife(batch_size)) if method == "bca" else None
+    low_matrix, high_matrix = confidence_intervals(r_matrix, boot, level, method, accel)
+    np.fill_diagonal(low_matrix, np.nan)
+    np.fill_diagonal(high_matrix, np.nan)
+    return r_matrix, low_matrix, high_matrix, boot
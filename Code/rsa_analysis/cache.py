@@ -0,0 +1,107 @@
+"""
+Content-hashed cache of analysis results.
+
+A result is stored under the sha1 of its key parts: the content hash of the input file or
+table, the variables and groups, and every setting that changes the numbers (permutations,
+seed, metric, ...). Each entry is a pair of files in the cache folder:
+
+    {key}.npz     the result arrays
+    {key}.json    the key parts, checked again on every read
+
+A changed input file, variable list or setting gives a different key, so a result is never
+served for inputs it was not computed from; an unchanged one is loaded instead of being
+recomputed.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .rdm import data_hash
+
+
+def file_digest(path):
+    """sha1 of a file's content."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def canonical(parts):
+    """JSON text of the key parts with sorted keys; DataFrames and arrays by content hash."""
+    def default(value):
+        if hasattr(value, "columns"):
+            return {"dataframe": data_hash(value)}
+        if isinstance(value, np.ndarray):
+            return {"array": hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest(), "shape": value.shape}
+        if isinstance(value, np.generic):
+            return value.item()
+        raise TypeError(f"Cannot hash {type(value).__name__} in a cache key")
+
+    return json.dumps(parts, sort_keys=True, default=default)
+
+
+class ResultCache:
+    """
+    Folder of results keyed by a hash of their inputs and settings
+
+    Parameters:
+    folder: cache folder, created on the first write
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def key(self, parts):
+        return hashlib.sha1(canonical(parts).encode("utf-8")).hexdigest()
+
+    def paths(self, key):
+        return os.path.join(self.folder, f"{key}.npz"), os.path.join(self.folder, f"{key}.json")
+
+    def load(self, parts):
+        """Arrays stored for these key parts, or None."""
+        data_path, parts_path = self.paths(self.key(parts))
+        if not (os.path.exists(data_path) and os.path.exists(parts_path)):
+            return None
+        with open(parts_path, "r", encoding="utf-8") as f:
+            if json.load(f) != json.loads(canonical(parts)):
+                return None
+        with np.load(data_path, allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    def save(self, parts, arrays):
+        """Store arrays under these key parts; files are replaced atomically."""
+        os.makedirs(self.folder, exist_ok=True)
+        data_path, parts_path = self.paths(self.key(parts))
+        tmp_path = data_path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, data_path)
+        tmp_path = parts_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(json.loads(canonical(parts)), f, indent=1, sort_keys=True)
+        os.replace(tmp_path, parts_path)
+
+    def fetch(self, parts, compute, refresh=False):
+        """
+        Stored arrays for these key parts, computed and stored on a miss
+
+        Parameters:
+        parts: JSON-serializable key parts (DataFrames and arrays are hashed by content)
+        compute: function returning {name: array}
+        refresh: recompute and overwrite even if stored
+
+        Returns:
+        arrays: {name: array}
+        hit: True if the arrays were loaded from the cache
+        """
+        if not refresh:
+            arrays = self.load(parts)
+            if arrays is not None:
+                return arrays, True
+        arrays = {name: np.asarray(value) for name, value in compute().items()}
+        self.save(parts, arrays)
+        return arrays, False
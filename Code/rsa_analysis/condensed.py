@@ -0,0 +1,238 @@
+"""
+Condensed (upper-triangle) RDMs for subject- or trial-level RSA.
+
+A full float64 square of n items takes 8 * n^2 bytes; the condensed form keeps only the
+m = n (n - 1) / 2 entries above the diagonal, in the order of scipy's squareform and
+np.triu_indices(n, k=1), optionally as float32 and as a memory-mapped .npy file:
+
+    n = 1,017 subjects    square 8.3 MB    condensed float32 2.1 MB
+    n = 30,000 trials     square 7.2 GB    condensed float32 1.8 GB (memory-mapped)
+
+CondensedRDM.from_data computes correlation distances (or correlations) in row blocks, so
+only one block of the n x n product is in memory. mantel_condensed permutes directly in
+condensed index space: entry (i, j) of the permuted matrix is entry
+(min(p_i, p_j), max(p_i, p_j)) of y, whose condensed index is computed on the fly, chunk
+by chunk, instead of indexing a square matrix. Memory is bounded by chunk_size *
+block_size values whatever n is.
+"""
+
+import numpy as np
+from scipy.stats import rankdata
+
+from .mantel import ALTERNATIVES, exceedances, p_values, permutation_block
+
+
+def condensed_size(n):
+    """Number of entries above the diagonal of an n x n matrix."""
+    return n * (n - 1) // 2
+
+
+def matrix_size(m):
+    """n of a condensed array with m entries."""
+    n = int(round((1 + np.sqrt(1 + 8 * m)) / 2))
+    if condensed_size(n) != m:
+        raise ValueError(f"{m} entries is not the upper triangle of a square matrix")
+    return n
+
+
+def condensed_index(i, j, n):
+    """Condensed index of entry (i, j), i != j, of an n x n symmetric matrix."""
+    i, j = np.asarray(i, dtype=np.int64), np.asarray(j, dtype=np.int64)
+    low, high = np.minimum(i, j), np.maximum(i, j)
+    return low * (2 * n - low - 3) // 2 + high - 1
+
+
+def row_starts(n):
+    """Condensed index of the first entry of every row, plus m at the end."""
+    rows = np.arange(n + 1, dtype=np.int64)
+    return np.minimum(rows * (2 * n - rows - 1) // 2, condensed_size(n))
+
+
+def row_blocks(n, chunk_size):
+    """(first row, last row + 1) blocks whose entries number about chunk_size each."""
+    starts = row_starts(n)
+    blocks = []
+    first = 0
+    while first < n - 1:
+        last = int(np.searchsorted(starts, starts[first] + chunk_size, side='right')) - 1
+        last = min(max(last, first + 1), n - 1)
+        blocks.append((first, last))
+        first = last
+    return blocks
+
+
+def block_pairs(first, last, n):
+    """Row and column indices of the condensed entries of rows first..last - 1."""
+    rows = np.arange(first, last)
+    lengths = n - 1 - rows
+    row_index = np.repeat(rows, lengths)
+    col_index = np.arange(len(row_index)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + row_index + 1
+    return row_index, col_index
+
+
+class CondensedRDM:
+    """
+    Upper triangle of a symmetric matrix
+
+    Parameters:
+    values: (m,) entries in np.triu_indices order (array or np.memmap)
+    diagonal: value of the diagonal in square() (0 for distances, 1 for correlations)
+    """
+
+    def __init__(self, values, diagonal=0.0):
+        self.values = values
+        self.n = matrix_size(len(values))
+        self.diagonal = diagonal
+
+    @classmethod
+    def from_square(cls, matrix, dtype=np.float64, diagonal=None):
+        matrix = np.asarray(matrix)
+        values = matrix[np.triu_indices(matrix.shape[0], k=1)].astype(dtype)
+        return cls(values, matrix[0, 0] if diagonal is None else diagonal)
+
+    @classmethod
+    def from_data(cls, data, similarity=False, dtype=np.float32, path=None, chunk_size=2 ** 22):
+        """
+        Correlation distances (1 - r) or correlations between the rows of data, by row block
+
+        Parameters:
+        data: (n, p) array, one row per item (subject, trial or condition)
+        similarity: store r instead of 1 - r (as np.corrcoef in the Study 1 scripts)
+        dtype: storage type
+        path: .npy file to memory-map the values to (default: in memory)
+        chunk_size: entries of the n x n product computed at once
+
+        Returns:
+        rdm: CondensedRDM; rows without variance give NaN entries
+        """
+        data = np.asarray(data, dtype=float)
+        n = data.shape[0]
+        centered = data - data.mean(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            units = centered / np.linalg.norm(centered, axis=1, keepdims=True)
+
+        m = condensed_size(n)
+        if path is None:
+            values = np.empty(m, dtype=dtype)
+        else:
+            values = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(m,))
+        starts = row_starts(n)
+        for first, last in row_blocks(n, chunk_size):
+            block = units[first:last] @ units[first + 1:].T
+            if not similarity:
+                block = 1 - block
+            for i in range(first, last):
+                values[starts[i]:starts[i + 1]] = block[i - first, i - first:]
+        if path is not None:
+            values.flush()
+        return cls(values, 1.0 if similarity else 0.0)
+
+    @classmethod
+    def load(cls, path, diagonal=0.0, mmap_mode='r'):
+        """Condensed RDM saved by from_data(path=...) or save, memory-mapped by default."""
+        return cls(np.load(path, mmap_mode=mmap_mode), diagonal)
+
+    def save(self, path):
+        np.save(path, np.asarray(self.values))
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def square(self):
+        """Full (n, n) float64 matrix; only for small n."""
+        matrix = np.full((self.n, self.n), self.diagonal, dtype=float)
+        rows, cols = np.triu_indices(self.n, k=1)
+        matrix[rows, cols] = matrix[cols, rows] = self.values
+        return matrix
+
+
+def as_condensed(rdm):
+    """CondensedRDM of a CondensedRDM, a condensed array or a square matrix."""
+    if isinstance(rdm, CondensedRDM):
+        return rdm
+    rdm = np.asarray(rdm)
+    return CondensedRDM(rdm) if rdm.ndim == 1 else CondensedRDM.from_square(rdm)
+
+
+def chunk_moments(values, chunk_size):
+    """Mean and centered norm of a (possibly memory-mapped) array, read chunk by chunk."""
+    total = 0.0
+    has_nan = False
+    for start in range(0, len(values), chunk_size):
+        chunk = np.asarray(values[start:start + chunk_size], dtype=float)
+        has_nan |= bool(np.isnan(chunk).any())
+        total += chunk.sum()
+    if has_nan:
+        raise ValueError("Condensed Mantel tests need RDMs without missing entries")
+    mean = total / len(values)
+    squares = 0.0
+    for start in range(0, len(values), chunk_size):
+        chunk = np.asarray(values[start:start + chunk_size], dtype=float) - mean
+        squares += chunk @ chunk
+    return mean, np.sqrt(squares)
+
+
+def mantel_condensed(x, y, n_perm=10000, metric='pearson', block_size=64, rng=None, alternative='two-sided',
+                     plus_one=False, chunk_size=2 ** 16):
+    """
+    Mantel test of two condensed RDMs, permuting rows and columns of y in condensed space
+
+    A simultaneous row/column permutation of a symmetric matrix only reorders its upper
+    triangle, so the mean and norm of y (and its ranks, for spearman) are computed once and
+    every permuted correlation is one pass of x against the gathered entries of y.
+
+    Parameters:
+    x, y: CondensedRDM, condensed arrays or square matrices of the same size
+    n_perm: number of permutations
+    metric: correlation measure ('pearson' or 'spearman'; spearman ranks in memory)
+    block_size: permutations evaluated per pass
+    rng: numpy Generator or seed (default: fresh entropy)
+    alternative: 'two-sided' (|r|), 'greater' or 'less'
+    plus_one: count the observed arrangement as one permutation, (k + 1) / (n_perm + 1)
+    chunk_size: condensed entries gathered at once per permutation
+
+    Returns:
+    observed_r: observed correlation
+    p_value: permutation p-value
+    """
+    if metric not in ('pearson', 'spearman'):
+        raise ValueError(f"Unknown metric: {metric}")
+    if alternative not in ALTERNATIVES:
+        raise ValueError(f"Unknown alternative: {alternative}")
+    x, y = as_condensed(x), as_condensed(y)
+    if x.n != y.n:
+        raise ValueError(f"RDM sizes differ: {x.n} and {y.n}")
+    n = y.n
+    x_values, y_values = x.values, y.values
+    if metric == 'spearman':
+        # Missing entries rank as NaN and are rejected by chunk_moments
+        x_values, y_values = rankdata(x_values), rankdata(y_values)
+    x_mean, x_norm = chunk_moments(x_values, chunk_size)
+    y_mean, y_norm = chunk_moments(y_values, chunk_size)
+
+    blocks = row_blocks(n, chunk_size)
+    starts = row_starts(n)
+    offsets = starts[:n] - np.arange(n) - 1
+    observed = 0.0
+    for first, last in blocks:
+        x_chunk = np.asarray(x_values[starts[first]:starts[last]], dtype=float) - x_mean
+        observed += x_chunk @ (np.asarray(y_values[starts[first]:starts[last]], dtype=float) - y_mean)
+    observed_r = np.array([observed / (x_norm * y_norm)])
+
+    rng = np.random.default_rng(rng)
+    exceed = 0
+    for start in range(0, n_perm, block_size):
+        perms = permutation_block(n, min(block_size, n_perm - start), rng)
+        # Centered x sums to zero, so the mean of y drops out of the permuted products
+        products = np.zeros(perms.shape[1])
+        for first, last in blocks:
+            rows, cols = block_pairs(first, last, n)
+            permuted_rows, permuted_cols = perms[rows], perms[cols]
+            index = np.minimum(permuted_rows, permuted_cols)
+            # condensed index of (low, high) = starts[low] - low - 1 + high
+            index = np.take(offsets, index) + np.maximum(permuted_rows, permuted_cols, out=permuted_rows)
+            x_chunk = np.asarray(x_values[starts[first]:starts[last]], dtype=float) - x_mean
+            products += x_chunk @ np.asarray(y_values[index], dtype=float)
+        exceed += exceedances((products / (x_norm * y_norm))[None], observed_r, alternative)[0]
+    return float(observed_r[0]), float(p_values(observed_r, exceed, n_perm, plus_one)[0])
@@ -0,0 +1,719 @@
+"""
+Batched Mantel permutation test for representational (dis)similarity matrices.
+
+Instead of one pearsonr call per permutation, permutations are drawn in blocks of
+block_size. For every block the permuted upper triangles of y are gathered into an
+(m, block_size) matrix, one column per permutation, and all permuted correlations come
+from one product with the pre-centered, unit-norm upper triangle of x. Memory is bounded
+by block_size * m values, independent of n_perm.
+
+mantel_matrix tests all pairs of a stack of matrices: every gathered block of one target
+is scored against all of its partners in the same product. Its permutations come in
+fixed-size chunks with SeedSequence-spawned streams, spread over a process pool; the
+p-values are the same for any number of workers. mantel_matrix_sequential follows the
+same streams but stops every pair once its significance at 0.05 / 0.01 / 0.001 is settled.
+
+Matrices with missing entries (e.g. RDM rows of conditions without variance) are handled
+pairwise: the missing entries move with the permutation and each permuted correlation
+uses the entries valid in both matrices.
+
+For a symmetric y, a simultaneous row/column permutation only reorders the entries of its
+upper triangle, so their mean and norm are the same for every permutation and are
+computed once.
+
+Partial Mantel tests (models=...) control for model RDMs such as the Unfairness and Cost
+distances of the condition grid. The orthonormal basis Q of [1, models] is computed once;
+x is residualized once, and since its residual is orthogonal to Q, a permuted y needs no
+explicit residualization: its partial correlation is (e_x . y_p) / |y_p - Q Q^T y_p|, one
+extra (c, m) product per block for the norms. Pairs with missing entries are residualized
+per permutation over their jointly valid entries instead.
+
+Spearman tests rank the upper triangles once. A permutation only reorders the entries of
+a symmetric y, so the ranks move with them: y is replaced by the matrix of its triangle
+ranks and every permuted statistic is a Pearson correlation of ranks, from the same
+product as above. Pairs with missing entries are ranked over their jointly valid entries,
+per permutation. Matrices of up to EXACT_MAX_N conditions are tested on all n!
+permutations instead of random ones (40,320 for n = 8), which gives the exact p-value.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import permutations
+
+import numpy as np
+from scipy.linalg import orth
+from scipy.stats import beta, rankdata
+
+
+def upper_triangle(matrix):
+    """Entries above the diagonal, row by row (the order of np.triu_indices(n, k=1))."""
+    matrix = np.asarray(matrix, dtype=float)
+    return matrix[np.triu_indices(matrix.shape[0], k=1)]
+
+
+def standardize(values, axis=-1):
+    """Center values along axis and scale them to unit norm."""
+    values = np.asarray(values, dtype=float)
+    centered = values - values.mean(axis=axis, keepdims=True)
+    return centered / np.linalg.norm(centered, axis=axis, keepdims=True)
+
+
+def permutation_block(n, size, rng):
+    """(n, size) array whose columns are independent permutations of range(n)."""
+    return np.argsort(rng.random((n, size)), axis=0).astype(np.int32)
+
+
+def rank_matrix(matrix):
+    """Symmetric matrix of the ranks of the upper triangle (average ranks for ties, 0 on the diagonal)."""
+    matrix = np.asarray(matrix, dtype=float)
+    ranked = np.zeros_like(matrix)
+    rows, cols = np.triu_indices(matrix.shape[0], k=1)
+    ranked[rows, cols] = ranked[cols, rows] = rankdata(matrix[rows, cols])
+    return ranked
+
+
+class PermutedTriangles:
+    """
+    Gathers the upper triangles of y[np.ix_(p, p)] for a block of permutations p
+
+    The flat indices into y are built in preallocated int32 buffers, so a block costs
+    three gathers of m * block_size values and no large temporary arrays.
+
+    Parameters:
+    n: matrix size
+    block_size: largest number of permutations per block
+    """
+
+    def __init__(self, n, block_size):
+        self.n = n
+        self.rows, self.cols = np.triu_indices(n, k=1)
+        m = len(self.rows)
+        self._index = np.empty((m, block_size), dtype=np.int32)
+        self._cols = np.empty((m, block_size), dtype=np.int32)
+        self._values = np.empty((m, block_size))
+
+    def index(self, perms):
+        """(m, b) flat indices into y.ravel() for the (n, b) permutations perms."""
+        size = perms.shape[1]
+        index, cols = self._index[:, :size], self._cols[:, :size]
+        np.take(perms * np.int32(self.n), self.rows, axis=0, out=index)
+        np.take(perms, self.cols, axis=0, out=cols)
+        index += cols
+        return index
+
+    def gather(self, y, perms):
+        """(m, b) permuted upper triangles of y; the buffer is reused by the next call."""
+        index = self.index(perms)
+        values = self._values[:, :index.shape[1]]
+        np.take(np.asarray(y, dtype=float).ravel(), index, out=values, mode='clip')
+        return values
+
+
+ALTERNATIVES = ('two-sided', 'greater', 'less')
+
+# Tolerance so that permutations tying the observed value count as reaching it
+TIE_TOLERANCE = 1e-12
+
+
+def masked_correlations(x_values, x_mask, y_values, y_mask):
+    """
+    Pearson correlations over jointly valid entries, for every x row and y column
+
+    Parameters:
+    x_values, x_mask: (q, m) values (invalid entries set to 0) and validity
+    y_values, y_mask: (m, b) values (invalid entries set to 0) and validity
+
+    Returns:
+    r: (q, b) correlations, NaN where fewer than two entries are valid
+    """
+    x_mask = x_mask.astype(float)
+    y_mask = y_mask.astype(float)
+    count = x_mask @ y_mask
+    sum_x = x_values @ y_mask
+    sum_y = x_mask @ y_values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = x_values @ y_values - sum_x * sum_y / count
+        var_x = (x_values ** 2) @ y_mask - sum_x ** 2 / count
+        var_y = x_mask @ (y_values ** 2) - sum_y ** 2 / count
+        return cov / np.sqrt(var_x * var_y)
+
+
+def joint_ranks(x_values, y_values, valid):
+    """Ranks of x and y among the valid entries of each column of valid (invalid entries 0)."""
+    x_ranks = rankdata(np.where(valid, x_values, np.nan), axis=0, nan_policy='omit')
+    y_ranks = rankdata(np.where(valid, y_values, np.nan), axis=0, nan_policy='omit')
+    return np.where(valid, x_ranks, 0.0), np.where(valid, y_ranks, 0.0)
+
+
+def masked_partial_correlations(x_values, y_values, valid, basis):
+    """
+    Partial correlations given the models, each over its own jointly valid entries
+
+    The residuals of x and y are taken over the valid entries only, by least squares on the
+    basis columns restricted to them (there they span the same space as [1, models]).
+
+    Parameters:
+    x_values, y_values: (m, b) values, invalid entries set to 0 (x may be (m, 1))
+    valid: (m, b) entries valid in both
+    basis: (m, d) orthonormal_basis of the models
+
+    Returns:
+    r: (b,) partial correlations, NaN where a residual vanishes
+    """
+    weights = valid.astype(float)
+    x_values = x_values * weights
+    y_values = y_values * weights
+    inverse = np.linalg.pinv(np.einsum('mi,mj,mb->bij', basis, basis, weights), hermitian=True)
+    x_basis = (basis.T @ x_values).T
+    y_basis = (basis.T @ y_values).T
+    x_squares = (x_values ** 2).sum(axis=0)
+    y_squares = (y_values ** 2).sum(axis=0)
+    xx = x_squares - np.einsum('bi,bij,bj->b', x_basis, inverse, x_basis)
+    yy = y_squares - np.einsum('bi,bij,bj->b', y_basis, inverse, y_basis)
+    xy = (x_values * y_values).sum(axis=0) - np.einsum('bi,bij,bj->b', x_basis, inverse, y_basis)
+    # Residuals at rounding level (e.g. x constant on the valid entries) leave r undefined
+    defined = (xx > TIE_TOLERANCE * x_squares) & (yy > TIE_TOLERANCE * y_squares)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(defined, xy / np.sqrt(xx * yy), np.nan)
+
+
+def exceedances(permuted_rs, observed_r, alternative):
+    """(q,) permutations at least as extreme as observed_r, per row of the (q, b) permuted_rs."""
+    observed_r = observed_r[:, None]
+    if alternative == 'two-sided':
+        extreme = np.abs(permuted_rs) >= np.abs(observed_r) - TIE_TOLERANCE
+    elif alternative == 'greater':
+        extreme = permuted_rs >= observed_r - TIE_TOLERANCE
+    else:
+        extreme = permuted_rs <= observed_r + TIE_TOLERANCE
+    return np.count_nonzero(extreme, axis=1)
+
+
+def orthonormal_basis(model_flats):
+    """
+    Orthonormal basis of the intercept and the model RDMs
+
+    Parameters:
+    model_flats: (c, m) upper triangles of the model matrices (ranked for spearman)
+
+    Returns:
+    basis: (m, d) orthonormal columns spanning [1, models]; collinear models are dropped
+    """
+    model_flats = np.atleast_2d(np.asarray(model_flats, dtype=float))
+    if np.isnan(model_flats).any():
+        raise ValueError("Model matrices must not have missing entries")
+    return orth(np.column_stack([np.ones(model_flats.shape[1]), model_flats.T]))
+
+
+def residualize(flats, basis):
+    """Residuals of the (q, m) flats after projecting out the columns of basis."""
+    return flats - (flats @ basis) @ basis.T
+
+
+class PermutationScorer:
+    """
+    Observed correlations of several x against one y, and their exceedances per block of
+    permutations of y
+
+    Missing (NaN) entries are left out pairwise; they move with the rows and columns of y,
+    so each permutation is scored over its own jointly valid entries. With a model basis
+    the correlations are partial correlations given the models; pairs with missing entries
+    are then residualized over their jointly valid entries (masked_partial_correlations).
+
+    Parameters:
+    x_flats: (q, m) upper triangles of the x matrices (ranked for spearman)
+    y: (n, n) matrix whose rows and columns are permuted
+    metric: 'pearson' or 'spearman'
+    alternative: 'two-sided', 'greater' or 'less'
+    block_size: largest number of permutations per block
+    basis: orthonormal_basis of the model matrices for partial tests (default: plain test)
+    """
+
+    def __init__(self, x_flats, y, metric='pearson', alternative='two-sided', block_size=64, basis=None):
+        if metric not in ('pearson', 'spearman'):
+            raise ValueError(f"Unknown metric: {metric}")
+        if alternative not in ALTERNATIVES:
+            raise ValueError(f"Unknown alternative: {alternative}")
+        self.metric = metric
+        self.alternative = alternative
+        self.y = np.asarray(y, dtype=float)
+        self.n = self.y.shape[0]
+        x_flats = np.atleast_2d(x_flats)
+        y_flat = upper_triangle(self.y)
+
+        # Pairs with missing entries take the slower masked path; complete pairs the fast one
+        self.y_complete = not np.isnan(y_flat).any()
+        self.fast = ~np.isnan(x_flats).any(axis=1) & self.y_complete
+        self.masked = ~self.fast
+        symmetric = np.allclose(self.y, self.y.T, equal_nan=True)
+        # Ranks of a complete symmetric y are taken once; an asymmetric y is ranked per permuted
+        # block, and pairs with missing entries are ranked over their jointly valid entries
+        self.y_raw = self.y
+        self.rank_blocks = metric == 'spearman' and not symmetric
+        if metric == 'spearman' and self.y_complete:
+            y_flat = rankdata(y_flat)
+            if symmetric:
+                self.y = rank_matrix(self.y)
+
+        self.basis = basis
+        # Masked plain tests use the same least squares as partial ones, on the intercept alone
+        m = len(y_flat)
+        self.masked_basis = basis if basis is not None else np.full((m, 1), 1 / np.sqrt(max(m, 1)))
+        self.triangles = PermutedTriangles(self.n, block_size)
+        self.observed_r = np.empty(len(x_flats))
+        self.x_mask = ~np.isnan(x_flats[self.masked])
+        self.x_values = np.where(self.x_mask, x_flats[self.masked], 0.0)
+        if basis is not None:
+            # Residuals of x are orthogonal to the models, so y only needs its residual norm
+            self.x_units = standardize(residualize(x_flats[self.fast], basis), axis=1)
+            if self.fast.any():
+                self.observed_r[self.fast] = self.x_units @ standardize(residualize(y_flat, basis))
+            # Centered values keep the residual norm below from cancelling against the mean
+            self.center = y_flat.mean()
+            self.y_centered = self.y - self.center
+            if self.masked.any():
+                self.observed_r[self.masked] = self.masked_scores(upper_triangle(self.y_raw)[:, None])[:, 0]
+            return
+
+        self.x_units = standardize(x_flats[self.fast], axis=1)
+        if self.fast.any():
+            self.observed_r[self.fast] = self.x_units @ standardize(y_flat)
+        # Symmetric y: every permuted triangle has the same mean and norm
+        self.fixed_moments = self.y_complete and symmetric
+        if self.fixed_moments:
+            self.y_centered = (self.y - y_flat.mean()) / np.linalg.norm(y_flat - y_flat.mean())
+
+        if self.masked.any() and metric == 'spearman':
+            self.observed_r[self.masked] = self.masked_scores(upper_triangle(self.y_raw)[:, None])[:, 0]
+        elif self.masked.any():
+            y_mask = ~np.isnan(y_flat)
+            self.observed_r[self.masked] = masked_correlations(
+                self.x_values, self.x_mask, np.where(y_mask, y_flat, 0.0)[:, None], y_mask[:, None]
+            )[:, 0]
+            self.x_mask_float = self.x_mask.astype(float)
+            self.x_stack = np.vstack([self.x_values, self.x_mask_float])
+            self.x_count = self.x_mask.sum(axis=1)[:, None]
+            self.x_sum = self.x_values.sum(axis=1)[:, None]
+            self.x_var = (self.x_values ** 2).sum(axis=1)[:, None] - self.x_sum ** 2 / self.x_count
+
+    def masked_scores(self, values):
+        """
+        (masked x, b) correlations of the x with missing entries against the (m, b) raw values
+        of y, over the jointly valid entries of each column (ranked within them for spearman)
+        """
+        y_valid = ~np.isnan(values)
+        y_values = np.where(y_valid, values, 0.0)
+        scores = []
+        for x_values, x_mask in zip(self.x_values, self.x_mask):
+            valid = x_mask[:, None] & y_valid
+            x_joint, y_joint = x_values[:, None], y_values
+            if self.metric == 'spearman':
+                x_joint, y_joint = joint_ranks(x_joint, y_joint, valid)
+            scores.append(masked_partial_correlations(x_joint, y_joint, valid, self.masked_basis))
+        return np.array(scores)
+
+    def count_partial(self, perms):
+        """Exceedances of the partial correlations for the (n, b) perms."""
+        exceed = np.zeros(len(self.observed_r), dtype=np.int64)
+        if self.masked.any():
+            permuted_rs = self.masked_scores(self.triangles.gather(self.y_raw, perms))
+            exceed[self.masked] = exceedances(permuted_rs, self.observed_r[self.masked], self.alternative)
+        if self.fast.any():
+            if self.rank_blocks:
+                values = rankdata(self.triangles.gather(self.y, perms), axis=0) - self.center
+            else:
+                values = self.triangles.gather(self.y_centered, perms)
+            residual_norm = np.sqrt(np.einsum('ij,ij->j', values, values) - ((self.basis.T @ values) ** 2).sum(axis=0))
+            permuted_rs = (self.x_units @ values) / residual_norm
+            exceed[self.fast] = exceedances(permuted_rs, self.observed_r[self.fast], self.alternative)
+        return exceed
+
+    def count(self, perms):
+        """(q,) permutations among the (n, b) perms at least as extreme as the observed correlation."""
+        if self.basis is not None:
+            return self.count_partial(perms)
+        exceed = np.zeros(len(self.observed_r), dtype=np.int64)
+        if self.masked.any():
+            values = self.triangles.gather(self.y_raw, perms)
+            if self.metric == 'spearman':
+                permuted_rs = self.masked_scores(values)
+            elif self.y_complete:
+                # Only x has gaps: its count, sum and sum of squares are the same for every permutation
+                products = self.x_stack @ values
+                sum_y = products[len(self.x_values):]
+                cov = products[:len(self.x_values)] - self.x_sum * sum_y / self.x_count
+                var_y = self.x_mask_float @ (values ** 2) - sum_y ** 2 / self.x_count
+                permuted_rs = cov / np.sqrt(self.x_var * var_y)
+            else:
+                valid = ~np.isnan(values)
+                permuted_rs = masked_correlations(self.x_values, self.x_mask, np.where(valid, values, 0.0), valid)
+            exceed[self.masked] = exceedances(permuted_rs, self.observed_r[self.masked], self.alternative)
+        if self.fast.any():
+            if self.fixed_moments:
+                values = self.triangles.gather(self.y_centered, perms)
+            else:
+                values = self.triangles.gather(self.y, perms)
+                if self.rank_blocks:
+                    values = rankdata(values, axis=0)
+                values = standardize(values, axis=0)
+            # One product scores the whole block against every x
+            permuted_rs = self.x_units @ values
+            exceed[self.fast] = exceedances(permuted_rs, self.observed_r[self.fast], self.alternative)
+        return exceed
+
+
+def permutation_counts(x_flats, y, n_perm, metric='pearson', block_size=64, rng=None, alternative='two-sided',
+                       basis=None):
+    """
+    Observed correlations and permutation exceedances of several x against one y
+
+    Parameters:
+    x_flats: (q, m) upper triangles of the x matrices (ranked for spearman)
+    y: (n, n) matrix whose rows and columns are permuted
+    n_perm: number of permutations
+    metric: 'pearson' or 'spearman'
+    block_size: permutations evaluated per block
+    rng: numpy Generator or seed (default: fresh entropy)
+    alternative: 'two-sided', 'greater' or 'less'
+    basis: orthonormal_basis of the models for partial correlations (default: plain correlations)
+
+    Returns:
+    observed_r: (q,) observed correlations
+    exceed: (q,) permutations at least as extreme as the observed correlation
+    """
+    rng = np.random.default_rng(rng)
+    scorer = PermutationScorer(x_flats, y, metric, alternative, min(block_size, n_perm), basis)
+    exceed = np.zeros(len(scorer.observed_r), dtype=np.int64)
+    for start in range(0, n_perm, block_size):
+        exceed += scorer.count(permutation_block(scorer.n, min(block_size, n_perm - start), rng))
+    return scorer.observed_r, exceed
+
+
+# Matrices up to this size are tested on all n! permutations
+EXACT_MAX_N = 8
+
+# n <= EXACT_MAX_N gives at most 28 triangle entries, so whole blocks of permutations are cheap
+EXACT_BLOCK_SIZE = 4096
+
+
+def use_exact(n, exact=None):
+    """Whether n x n matrices are tested on all permutations (exact=None: when n <= EXACT_MAX_N)."""
+    return n <= EXACT_MAX_N if exact is None else bool(exact)
+
+
+def all_permutations(n):
+    """(n, n!) array whose columns are all permutations of range(n), the identity first."""
+    return np.array(list(permutations(range(n))), dtype=np.int32).T
+
+
+def exact_counts(x_flats, y, metric='pearson', alternative='two-sided', basis=None):
+    """
+    Observed correlations and exceedances of several x against one y over all n! permutations
+
+    Returns:
+    observed_r: (q,) observed correlations
+    exceed: (q,) permutations at least as extreme as the observed correlation, the identity included
+    n_total: n!
+    """
+    perms = all_permutations(np.asarray(y).shape[0])
+    n_total = perms.shape[1]
+    scorer = PermutationScorer(x_flats, y, metric, alternative, min(EXACT_BLOCK_SIZE, n_total), basis)
+    exceed = np.zeros(len(scorer.observed_r), dtype=np.int64)
+    for start in range(0, n_total, EXACT_BLOCK_SIZE):
+        exceed += scorer.count(perms[:, start:start + EXACT_BLOCK_SIZE])
+    return scorer.observed_r, exceed, n_total
+
+
+def flat_triangles(matrices, metric='pearson'):
+    """(k, m) upper triangles of k matrices, ranked for spearman (missing entries stay NaN)."""
+    flats = np.array([upper_triangle(matrix) for matrix in matrices])
+    if metric == 'spearman':
+        flats = rankdata(flats, axis=1, nan_policy='omit')
+    return flats
+
+
+def model_basis(models, metric='pearson'):
+    """orthonormal_basis of a model matrix or a sequence of model matrices; None without models."""
+    if models is None:
+        return None
+    models = np.asarray(models, dtype=float)
+    return orthonormal_basis(flat_triangles(models[None] if models.ndim == 2 else models, metric))
+
+
+def p_values(observed_r, exceed, n_perm, plus_one=False):
+    """
+    exceed / n_perm, or (exceed + 1) / (n_perm + 1) counting the observed arrangement;
+    NaN where the observed correlation is undefined
+    """
+    p = (exceed + int(plus_one)) / (n_perm + int(plus_one))
+    return np.where(np.isnan(observed_r), np.nan, p)
+
+
+def mantel_test(x, y, n_perm=10000, metric='pearson', block_size=64, rng=None, alternative='two-sided', plus_one=False,
+                models=None, exact=None):
+    """
+    Mantel test function - compare similarity of two matrices
+
+    Rows and columns of y are permuted together; entries missing in either matrix are
+    left out pairwise. With models, the partial Mantel test of x and y given the model
+    matrices (Smouse et al., 1986): the raw y is permuted and residualized every time.
+    Small matrices are tested on all n! permutations; the p-value is then exact and
+    n_perm, rng and plus_one are not used.
+
+    Parameters:
+    x, y: (n, n) matrices to compare
+    n_perm: number of permutations
+    metric: correlation measure ('pearson' or 'spearman')
+    block_size: permutations evaluated per block
+    rng: numpy Generator or seed (default: fresh entropy)
+    alternative: 'two-sided' (|r|), 'greater' or 'less'
+    plus_one: count the observed arrangement as one permutation, (k + 1) / (n_perm + 1)
+    models: model matrix or sequence of model matrices to partial out (default: none)
+    exact: enumerate all permutations (default None: when n <= EXACT_MAX_N)
+
+    Returns:
+    observed_r: observed (partial) correlation
+    p_value: permutation p-value
+    """
+    if use_exact(np.asarray(y).shape[0], exact):
+        observed_r, exceed, n_total = exact_counts(
+            flat_triangles([x], metric), y, metric, alternative, model_basis(models, metric)
+        )
+        return float(observed_r[0]), float(p_values(observed_r, exceed, n_total)[0])
+    observed_r, exceed = permutation_counts(
+        flat_triangles([x], metric), y, n_perm, metric, block_size, rng, alternative, model_basis(models, metric)
+    )
+    return float(observed_r[0]), float(p_values(observed_r, exceed, n_perm, plus_one)[0])
+
+
+def seed_sequence(rng=None):
+    """SeedSequence from a seed, an existing SeedSequence or a Generator (default: fresh entropy)."""
+    if isinstance(rng, np.random.SeedSequence):
+        return rng
+    if isinstance(rng, np.random.Generator):
+        return np.random.SeedSequence(int(rng.integers(2 ** 63)))
+    return np.random.SeedSequence(rng)
+
+
+def pair_tasks(flats, matrices, n_perm, seed_seq, chunk_size):
+    """
+    Split the all-pairs test into (target, chunk) tasks with their own spawned streams
+
+    Target j gets child j - 1 of seed_seq and chunk c of target j gets child c of that, so
+    the permutations of every chunk are fixed by the seed and chunk_size alone.
+
+    Returns:
+    tasks: [(j, x_flats, y, size, chunk seed)]
+    """
+    n_chunks = -(-n_perm // chunk_size)
+    tasks = []
+    for j, target_seq in enumerate(seed_seq.spawn(len(matrices) - 1), start=1):
+        for c, chunk_seq in enumerate(target_seq.spawn(n_chunks)):
+            size = min(chunk_size, n_perm - c * chunk_size)
+            tasks.append((j, flats[:j], matrices[j], size, chunk_seq))
+    return tasks
+
+
+def run_pair_task(task, metric, block_size, alternative, basis=None):
+    j, x_flats, y, size, chunk_seq = task
+    observed_r, exceed = permutation_counts(
+        x_flats, y, size, metric, block_size, np.random.default_rng(chunk_seq), alternative, basis
+    )
+    return j, observed_r, exceed
+
+
+def exact_matrix(matrices, metric='pearson', alternative='two-sided', models=None):
+    """
+    All-pairs Mantel tests over all n! permutations
+
+    Returns:
+    r_matrix, p_matrix: as mantel_matrix, with exact p-values
+    n_total: n!
+    """
+    k = len(matrices)
+    flats = flat_triangles(matrices, metric)
+    basis = model_basis(models, metric)
+    r_matrix = np.eye(k)
+    p_matrix = np.zeros((k, k))
+    n_total = 1
+    for j in range(1, k):
+        observed_r, exceed, n_total = exact_counts(flats[:j], matrices[j], metric, alternative, basis)
+        r_matrix[:j, j] = r_matrix[j, :j] = observed_r
+        p_matrix[:j, j] = p_matrix[j, :j] = p_values(observed_r, exceed, n_total)
+    return r_matrix, p_matrix, n_total
+
+
+def mantel_matrix(matrices, n_perm=10000, metric='pearson', block_size=64, rng=None, alternative='two-sided',
+                  plus_one=False, workers=None, chunk_size=2500, models=None, exact=None):
+    """
+    Mantel tests between all pairs of a stack of matrices
+
+    Each unordered pair is tested once. Matrix j is the permuted side of its pairs with
+    every earlier matrix, so one permutation stream per target is shared by all its
+    partners and k matrices cost k - 1 streams. The streams are cut into chunks of
+    chunk_size permutations, each with its own SeedSequence child, and the chunks run in a
+    process pool; the p-values depend on rng and chunk_size only, not on workers.
+
+    Parameters:
+    matrices: sequence or (k, n, n) array of matrices
+    n_perm: number of permutations per pair
+    metric: correlation measure ('pearson' or 'spearman')
+    block_size: permutations evaluated per block
+    rng: seed, SeedSequence or Generator (default: fresh entropy)
+    alternative: 'two-sided' (|r|), 'greater' or 'less'
+    plus_one: count the observed arrangement as one permutation, (k + 1) / (n_perm + 1)
+    workers: processes (default: CPU count; 1 runs in this process)
+    chunk_size: permutations per task
+    models: model matrices to partial out of every pair (default: none), see mantel_test
+    exact: enumerate all permutations in this process (default None: when n <= EXACT_MAX_N)
+
+    Returns:
+    r_matrix: (k, k) symmetric Mantel correlations, 1 on the diagonal
+    p_matrix: (k, k) symmetric p-values, 0 on the diagonal
+    """
+    matrices = [np.asarray(matrix, dtype=float) for matrix in matrices]
+    if use_exact(matrices[0].shape[0], exact):
+        return exact_matrix(matrices, metric, alternative, models)[:2]
+    k = len(matrices)
+    flats = flat_triangles(matrices, metric)
+    tasks = pair_tasks(flats, matrices, n_perm, seed_sequence(rng), chunk_size)
+    run = partial(run_pair_task, metric=metric, block_size=block_size, alternative=alternative,
+                  basis=model_basis(models, metric))
+
+    workers = min(workers or os.cpu_count(), len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, tasks))
+    else:
+        results = [run(task) for task in tasks]
+
+    r_matrix = np.eye(k)
+    p_matrix = np.zeros((k, k))
+    exceed = {}
+    for j, observed_r, chunk_exceed in results:
+        r_matrix[:j, j] = r_matrix[j, :j] = observed_r
+        exceed[j] = exceed.get(j, 0) + chunk_exceed
+    for j, target_exceed in exceed.items():
+        p_matrix[:j, j] = p_matrix[j, :j] = p_values(r_matrix[:j, j], target_exceed, n_perm, plus_one)
+    return r_matrix, p_matrix
+
+
+# Significance levels of the plots and tables (*, **, ***)
+SIGNIFICANCE_LEVELS = (0.05, 0.01, 0.001)
+
+
+def clopper_pearson(exceed, used, error):
+    """Two-sided exact (1 - error) confidence bounds for the p-value after used permutations."""
+    exceed = np.asarray(exceed, dtype=float)
+    used = np.asarray(used, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        low = np.where(exceed > 0, beta.ppf(error / 2, exceed, used - exceed + 1), 0.0)
+        high = np.where(exceed < used, beta.ppf(1 - error / 2, exceed + 1, used - exceed), 1.0)
+    return low, high
+
+
+def classification_settled(exceed, used, alphas, error, plus_one=False):
+    """
+    True where the p-value estimate and its confidence interval lie on the same side of
+    every alpha, so more permutations would not change the significance stars
+    """
+    p = (exceed + int(plus_one)) / (used + int(plus_one))
+    low, high = clopper_pearson(exceed, used, error)
+    settled = used > 0
+    for alpha in alphas:
+        settled &= ((p < alpha) & (high < alpha)) | ((p >= alpha) & (low >= alpha))
+    return settled
+
+
+def run_sequential_task(task, metric, block_size, alternative, alphas, error, plus_one, basis=None):
+    """
+    Permutations of one target, chunk by chunk, until the classification of every partner
+    is settled; checks happen whenever the permutations used double
+
+    Returns:
+    j, observed_r, exceed, used: target index and per-partner results
+    """
+    j, x_flats, y, sizes, seqs = task
+    scorer = PermutationScorer(x_flats, y, metric, alternative, min(block_size, max(sizes)), basis)
+    exceed = np.zeros(len(scorer.observed_r), dtype=np.int64)
+    used = np.zeros(len(scorer.observed_r), dtype=np.int64)
+    active = ~np.isnan(scorer.observed_r)
+
+    # Bonferroni over the looks at block_size, 2 * block_size, 4 * block_size, ...
+    n_looks = int(np.log2(max(sum(sizes) / block_size, 1))) + 1
+    next_look, done = block_size, 0
+    for size, seq in zip(sizes, seqs):
+        rng = np.random.default_rng(seq)
+        for start in range(0, size, block_size):
+            b = min(block_size, size - start)
+            counts = scorer.count(permutation_block(scorer.n, b, rng))
+            exceed[active] += counts[active]
+            used[active] += b
+            done += b
+            if done >= next_look:
+                active &= ~classification_settled(exceed, used, alphas, error / n_looks, plus_one)
+                next_look *= 2
+                if not active.any():
+                    return j, scorer.observed_r, exceed, used
+    return j, scorer.observed_r, exceed, used
+
+
+def mantel_matrix_sequential(matrices, n_perm=100000, alphas=SIGNIFICANCE_LEVELS, error=1e-3, metric='pearson',
+                             block_size=64, rng=None, alternative='two-sided', plus_one=False, workers=None,
+                             chunk_size=2500, models=None, exact=None):
+    """
+    All-pairs Mantel tests that stop each pair once its significance is settled
+
+    Every target follows the same seeded chunks as mantel_matrix, but after 64, 128,
+    256, ... permutations each pair is checked: once the p-value estimate and its
+    Clopper-Pearson interval (error split over the looks) fall on the same side of every
+    alpha, the pair stops. Clearly non-significant pairs stop after a few blocks; pairs
+    with no exceedance need about ln(1 / error) / alpha permutations to be settled at
+    alpha. A pair that never settles uses n_perm permutations and gets the mantel_matrix
+    p-value. Targets run in a process pool.
+
+    Parameters:
+    matrices: sequence or (k, n, n) array of matrices
+    n_perm: largest number of permutations per pair
+    alphas: significance levels to settle
+    error: allowed probability of a classification that differs from the exact p-value
+    metric, block_size, rng, alternative, plus_one, workers, chunk_size, models, exact: as mantel_matrix
+
+    Returns:
+    r_matrix: (k, k) symmetric Mantel correlations, 1 on the diagonal
+    p_matrix: (k, k) symmetric p-values over the permutations used, 0 on the diagonal
+    used_matrix: (k, k) permutations used per pair, 0 on the diagonal
+    """
+    matrices = [np.asarray(matrix, dtype=float) for matrix in matrices]
+    k = len(matrices)
+    if use_exact(matrices[0].shape[0], exact):
+        # At most 40,320 permutations: the exact p-value is cheaper than settling it sequentially
+        r_matrix, p_matrix, n_total = exact_matrix(matrices, metric, alternative, models)
+        return r_matrix, p_matrix, np.full((k, k), n_total, dtype=np.int64) * (1 - np.eye(k, dtype=np.int64))
+    flats = flat_triangles(matrices, metric)
+    targets = {}
+    for j, x_flats, y, size, chunk_seq in pair_tasks(flats, matrices, n_perm, seed_sequence(rng), chunk_size):
+        targets.setdefault(j, (j, x_flats, y, [], []))
+        targets[j][3].append(size)
+        targets[j][4].append(chunk_seq)
+    tasks = list(targets.values())
+    run = partial(run_sequential_task, metric=metric, block_size=block_size, alternative=alternative,
+                  alphas=tuple(alphas), error=error, plus_one=plus_one, basis=model_basis(models, metric))
+
+    workers = min(workers or os.cpu_count(), len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, tasks))
+    else:
+        results = [run(task) for task in tasks]
+
+    r_matrix = np.eye(k)
+    p_matrix = np.zeros((k, k))
+    used_matrix = np.zeros((k, k), dtype=np.int64)
+    for j, observed_r, exceed, used in results:
+        r_matrix[:j, j] = r_matrix[j, :j] = observed_r
+        # Pairs with an undefined r use no permutations and get a NaN p-value
+        p_matrix[:j, j] = p_matrix[j, :j] = p_values(observed_r, exceed, np.maximum(used, 1), plus_one)
+        used_matrix[:j, j] = used_matrix[j, :j] = used
+    return r_matrix, p_matrix, used_matrix
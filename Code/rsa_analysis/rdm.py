@@ -0,0 +1,238 @@
+"""
+Cached condition x subject x variable arrays and multivariable RDMs.
+
+compute_multivariable_rdm in the Section 6/7 notebooks pivots the trial table once per
+variable and again for every variable set. Here the rows of one (group, condition) are
+averaged into a dense cube of shape (conditions, subjects, variables) in a single groupby,
+and every RDM is computed from slices of it:
+
+    cube[:, :, v]  -> z-scored across subjects (safe_zscore)
+    concatenated over the requested variables -> correlation distance between conditions
+
+Cubes and RDMs are kept in LRU caches keyed by (group, condition, variables, data hash), so
+re-running a notebook cell or asking for another variable set of the same data reuses the
+earlier work.
+
+model_rdms gives the design RDMs of the same conditions (absolute Unfairness and Cost
+differences), the models partialled out by the partial Mantel tests.
+
+wide_rdms covers the Study 1 layout instead, one row per condition and one
+"{group}_{variable}" column per group and variable: the columns of every group are z-scored
+and the (groups, conditions, conditions) matrices are computed by one batched product.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import pdist, squareform
+
+FACTORS = ("Unfairness", "Cost")
+DISTANCES = ("correlation", "similarity")
+
+
+def safe_zscore(arr, axis=0, ddof=1):
+    """z-score ignoring NaN; constant slices become NaN instead of dividing by zero."""
+    mean = np.nanmean(arr, axis=axis, keepdims=True)
+    std = np.nanstd(arr, axis=axis, ddof=ddof, keepdims=True)
+    std[std == 0] = np.nan
+    return (arr - mean) / std
+
+
+def data_hash(df):
+    """Content hash of a DataFrame (values and column names, not the index)."""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    digest.update("\t".join(map(str, df.columns)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Small least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.items:
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+        self.hits = self.misses = 0
+
+
+CUBE_CACHE = LRUCache(maxsize=32)
+RDM_CACHE = LRUCache(maxsize=256)
+
+
+def cache_info():
+    """Hits, misses and sizes of the cube and RDM caches."""
+    return {
+        name: {"hits": cache.hits, "misses": cache.misses, "size": len(cache.items)}
+        for name, cache in (("cubes", CUBE_CACHE), ("rdms", RDM_CACHE))
+    }
+
+
+def build_cube(df, factors=FACTORS, subject="id"):
+    """
+    Average trials into a dense condition x subject x variable array
+
+    Parameters:
+    df: trial table of one group (and condition)
+    factors: columns defining a condition, sorted as in pivot_table
+    subject: subject id column
+
+    Returns:
+    cube: (n_conditions, n_subjects, n_variables) means, NaN where a subject has no trial
+    conditions: condition tuples along axis 0
+    subjects: sorted subject ids along axis 1
+    variables: numeric variable names along axis 2
+    """
+    factors = list(factors)
+    variables = [col for col in df.select_dtypes("number").columns if col not in factors + [subject]]
+    means = df.groupby(factors + [subject], sort=True)[variables].mean()
+
+    condition_index = means.index.droplevel(subject).unique()
+    subjects = np.sort(df[subject].unique())
+    cond_codes = condition_index.get_indexer(means.index.droplevel(subject))
+    subj_codes = np.searchsorted(subjects, means.index.get_level_values(subject))
+
+    cube = np.full((len(condition_index), len(subjects), len(variables)), np.nan)
+    cube[cond_codes, subj_codes] = means.values
+    return cube, list(condition_index), list(subjects), variables
+
+
+def model_rdms(conditions, factors=FACTORS):
+    """
+    Design RDMs of the condition grid: absolute differences of each factor
+
+    Parameters:
+    conditions: condition tuples, one value per factor (as returned by build_cube)
+    factors: factor names, in the order of the tuples
+
+    Returns:
+    models: {factor: (n_conditions, n_conditions) array}
+    """
+    levels = np.asarray(conditions, dtype=float).reshape(len(conditions), len(factors))
+    return {factor: np.abs(levels[:, i, None] - levels[None, :, i]) for i, factor in enumerate(factors)}
+
+
+def group_columns(group, variables, template="{group}_{variable}"):
+    """Column names of one group's variables in a wide table."""
+    return [template.format(group=group, variable=variable) for variable in variables]
+
+
+def wide_rdms(df, groups, variables, distance="similarity", template="{group}_{variable}"):
+    """
+    Condition x condition matrices of every group of a wide table (one row per condition)
+
+    Parameters:
+    df: table with one column per group and variable, named by template
+    groups: groups to compute
+    variables: variables of every group
+    distance: 'similarity' (r, as np.corrcoef in the Study 1 scripts) or 'correlation' (1 - r)
+    template: column name pattern
+
+    Returns:
+    rdms: (n_groups, n_conditions, n_conditions) array; rows without variance give NaN
+    """
+    if distance not in DISTANCES:
+        raise ValueError(f"Unknown distance: {distance}")
+    missing = [col for group in groups for col in group_columns(group, variables, template) if col not in df.columns]
+    if missing:
+        raise KeyError(f"Columns not in the table: {', '.join(missing)}")
+    values = np.stack([df[group_columns(group, variables, template)].to_numpy(dtype=float) for group in groups])
+    values = safe_zscore(values, axis=1, ddof=0)
+    values -= values.mean(axis=2, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values /= np.linalg.norm(values, axis=2, keepdims=True)
+    similarity = np.clip(values @ values.transpose(0, 2, 1), -1, 1)
+    return similarity if distance == "similarity" else 1 - similarity
+
+
+class RDMBuilder:
+    """
+    Multivariable RDMs of one trial table, built from cached cubes
+
+    Parameters:
+    df: trial table with group, condition, subject, factor and variable columns
+    group_col, condition_col, subject_col: column names
+    factors: columns defining a condition
+    """
+
+    def __init__(self, df, group_col="group", condition_col="condition", subject_col="id", factors=FACTORS):
+        self.df = df
+        self.group_col = group_col
+        self.condition_col = condition_col
+        self.subject_col = subject_col
+        self.factors = tuple(factors)
+        self.digest = data_hash(df)
+
+    def subset(self, group=None, condition=None):
+        mask = np.ones(len(self.df), dtype=bool)
+        if group is not None:
+            mask &= (self.df[self.group_col] == group).values
+        if condition is not None:
+            mask &= (self.df[self.condition_col] == condition).values
+        return self.df[mask]
+
+    def cube(self, group=None, condition=None):
+        """(cube, conditions, subjects, variables) of one group and condition (None: all rows)."""
+        key = (group, condition, self.factors, self.subject_col, self.digest)
+        cached = CUBE_CACHE.get(key)
+        if cached is None:
+            cached = build_cube(self.subset(group, condition), self.factors, self.subject_col)
+            CUBE_CACHE.put(key, cached)
+        return cached
+
+    def model_rdms(self, group=None, condition=None):
+        """{factor: design RDM} over the conditions of one group and condition (None: all rows)."""
+        return model_rdms(self.cube(group, condition)[1], self.factors)
+
+    def rdm(self, variables, group=None, condition=None, subject_order=None):
+        """
+        Correlation-distance RDM between conditions, as compute_multivariable_rdm
+
+        Parameters:
+        variables: variables whose z-scored subject vectors are concatenated (repeats allowed)
+        group, condition: rows to use (None: all)
+        subject_order: subject ids to align the columns to (default: sorted ids present)
+
+        Returns:
+        rdm: (n_conditions, n_conditions) array; treat it as read-only, it is shared by the cache
+        """
+        variables = tuple(variables)
+        order = None if subject_order is None else tuple(subject_order)
+        key = (group, condition, variables, order, self.factors, self.subject_col, self.digest)
+        rdm = RDM_CACHE.get(key)
+        if rdm is not None:
+            return rdm
+
+        cube, conditions, subjects, names = self.cube(group, condition)
+        if order is not None:
+            position = {subject: i for i, subject in enumerate(subjects)}
+            columns = [position.get(subject, -1) for subject in order]
+            cube = np.concatenate([cube, np.full(cube.shape[:1] + (1,) + cube.shape[2:], np.nan)], axis=1)[:, columns]
+        blocks = [safe_zscore(cube[:, :, names.index(var)], axis=1, ddof=1) for var in variables]
+        rdm = squareform(pdist(np.concatenate(blocks, axis=1), metric="correlation"))
+        RDM_CACHE.put(key, rdm)
+        return rdm
+
+
+def compute_multivariable_rdm(df_subset, variables, subject_order=None):
+    """Drop-in replacement of the notebooks' function, backed by the caches."""
+    return RDMBuilder(df_subset).rdm(variables, subject_order=subject_order)
@@ -0,0 +1,272 @@
+"""
+RSA runs described by a JSON spec: data, groups, conditions, variables, distance and Mantel
+settings in one file, for the Study 1 and the Section 6/7 analyses alike.
+
+Two table layouts are read:
+
+    wide    one row per condition, one "{group}_{variable}" column per group and variable
+            (Study 1); one RDM per group, by wide_rdms
+    long    one row per trial with group, condition, subject and factor columns
+            (Sections 6/7); one RDM per (group, condition), by RDMBuilder
+
+All RDMs of a spec are compared by mantel_matrix (or mantel_matrix_sequential), and the
+RDMs, Mantel r and p-values and two figures are written to the output folder. Mantel
+results are kept in a ResultCache there, keyed by the RDMs and the test settings.
+
+Example (Study 1):
+
+    {
+        "name": "unfair_7var",
+        "layout": "wide",
+        "data": "unfair_all_datasets_means_with_emotions_7_variables.xlsx",
+        "groups": ["human", "gpt35", "V3", "R1", "o3"],
+        "variables": ["choice", "AA_valence", "AA_arousal", "AC_valence", "AC_arousal",
+                      "EmoFDBK_valence", "EmoFDBK_arousal"],
+        "distance": "similarity",
+        "mantel": {"n_perm": 10000, "seed": 42}
+    }
+
+A long spec gives "data" as {condition: file}, optional "derive" columns ({name: pandas
+expression}), a "query" keeping the valid rows, "conditions", and "pooled" groups whose RDM
+uses all of their rows. Relative paths are relative to the spec file.
+"""
+
+import json
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .cache import ResultCache
+from .mantel import mantel_matrix, mantel_matrix_sequential, use_exact
+from .rdm import DISTANCES, RDMBuilder, wide_rdms
+
+LAYOUTS = ("wide", "long")
+MANTEL_DEFAULTS = {
+    "n_perm": 10000,
+    "seed": 42,
+    "metric": "pearson",
+    "alternative": "two-sided",
+    "plus_one": False,
+    "sequential": False,
+    "models": [],
+    "exact": None,
+}
+
+
+def load_spec(path):
+    """
+    Read and check a spec file
+
+    Returns:
+    spec: dict with defaults filled in and paths made absolute
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    folder = os.path.dirname(os.path.abspath(path))
+    spec.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    spec.setdefault("layout", "wide")
+    spec.setdefault("distance", "similarity" if spec["layout"] == "wide" else "correlation")
+    spec.setdefault("template", "{group}_{variable}")
+    spec.setdefault("output", "rsa_output")
+    spec["mantel"] = {**MANTEL_DEFAULTS, **spec.get("mantel", {})}
+
+    if spec["layout"] not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {spec['layout']}")
+    if spec["distance"] not in DISTANCES:
+        raise ValueError(f"Unknown distance: {spec['distance']}")
+    for key in ("data", "groups", "variables"):
+        if key not in spec:
+            raise ValueError(f"Spec {path} has no {key!r}")
+    if spec["layout"] == "wide" and spec["mantel"]["models"]:
+        raise ValueError("Model RDMs need the long layout (conditions are rows of the trial table)")
+
+    if isinstance(spec["data"], dict):
+        spec["data"] = {label: os.path.join(folder, file) for label, file in spec["data"].items()}
+    else:
+        spec["data"] = os.path.join(folder, spec["data"])
+    spec["output"] = os.path.join(folder, spec["output"])
+    return spec
+
+
+def read_table(path):
+    return pd.read_excel(path) if path.endswith((".xlsx", ".xls")) else pd.read_csv(path)
+
+
+def load_data(spec):
+    """Table of a spec; long data files are stacked with their label as the condition column."""
+    if isinstance(spec["data"], dict):
+        frames = []
+        for label, path in spec["data"].items():
+            frame = read_table(path)
+            frame[spec.get("condition_col", "condition")] = label
+            frames.append(frame)
+        df = pd.concat(frames, ignore_index=True)
+    else:
+        df = read_table(spec["data"])
+    for name, expression in spec.get("derive", {}).items():
+        df[name] = df.eval(expression)
+    if "query" in spec:
+        df = df.query(spec["query"]).reset_index(drop=True)
+    return df
+
+
+def spec_rdms(spec, df):
+    """
+    RDMs of a spec
+
+    Returns:
+    labels: one label per RDM ("group" or "group, condition")
+    rdms: (k, n, n) array in the spec's distance
+    """
+    if spec["layout"] == "wide":
+        return list(spec["groups"]), wide_rdms(df, spec["groups"], spec["variables"], spec["distance"], spec["template"])
+
+    builder = rdm_builder(spec, df)
+    pooled = spec.get("pooled", [])
+    specs = [(group, None) for group in pooled]
+    specs += [(group, condition) for condition in spec.get("conditions", [None])
+              for group in spec["groups"] if group not in pooled]
+    labels = [group if condition is None else f"{group}, {condition}" for group, condition in specs]
+    rdms = np.stack([builder.rdm(spec["variables"], group=group, condition=condition) for group, condition in specs])
+    return labels, (rdms if spec["distance"] == "correlation" else 1 - rdms)
+
+
+def rdm_builder(spec, df):
+    return RDMBuilder(df, group_col=spec.get("group_col", "group"), condition_col=spec.get("condition_col", "condition"),
+                      subject_col=spec.get("subject_col", "id"), factors=spec.get("factors", ("Unfairness", "Cost")))
+
+
+def spec_models(spec, df):
+    """Design RDMs of the spec's mantel models (over the conditions of the first pooled group), or None."""
+    if not spec["mantel"]["models"]:
+        return None
+    pooled = spec.get("pooled", [])
+    design = rdm_builder(spec, df).model_rdms(group=pooled[0] if pooled else None)
+    return [design[factor] for factor in spec["mantel"]["models"]]
+
+
+def spec_mantel(spec, df, rdms, cache=None, refresh=False):
+    """
+    All-pairs Mantel tests of the spec's RDMs, through the result cache when one is given
+
+    Returns:
+    results: {'r': (k, k), 'p': (k, k), 'used': (k, k) permutations per pair}
+    hit: True if loaded from the cache
+    """
+    settings = spec["mantel"]
+    options = dict(n_perm=settings["n_perm"], metric=settings["metric"], rng=settings["seed"],
+                   alternative=settings["alternative"], plus_one=settings["plus_one"], models=spec_models(spec, df),
+                   exact=settings["exact"])
+
+    def compute():
+        if settings["sequential"]:
+            r_matrix, p_matrix, used_matrix = mantel_matrix_sequential(rdms, **options)
+        else:
+            r_matrix, p_matrix = mantel_matrix(rdms, **options)
+            n = rdms.shape[1]
+            used = math.factorial(n) if use_exact(n, settings["exact"]) else settings["n_perm"]
+            used_matrix = np.full(r_matrix.shape, used) * (1 - np.eye(len(rdms), dtype=int))
+        return {"r": r_matrix, "p": p_matrix, "used": used_matrix}
+
+    if cache is None:
+        return compute(), False
+    return cache.fetch({"rdms": rdms, "mantel": settings}, compute, refresh)
+
+
+def significance_stars(p):
+    return "***" if p < 0.001 else "**" if p < 0.01 else "*" if p < 0.05 else ""
+
+
+def plot_rdms(labels, rdms, distance, path):
+    """Grid of the RDMs, one panel per label."""
+    import matplotlib.pyplot as plt
+
+    columns = min(len(labels), 5)
+    rows = -(-len(labels) // columns)
+    fig, axes = plt.subplots(rows, columns, figsize=(3.2 * columns, 3.2 * rows), squeeze=False)
+    limits = (-1, 1) if distance == "similarity" else (0, 2)
+    for ax, label, rdm in zip(axes.flat, labels, rdms):
+        im = ax.imshow(rdm, cmap="viridis", vmin=limits[0], vmax=limits[1])
+        ax.invert_yaxis()
+        ax.set_title(label, fontsize=11)
+        ax.tick_params(labelsize=7)
+    for ax in axes.flat[len(labels):]:
+        ax.axis("off")
+    cbar = fig.colorbar(im, ax=axes, shrink=0.8)
+    cbar.set_label("correlation (r)" if distance == "similarity" else "correlation distance (1 - r)")
+    fig.savefig(path, dpi=200, bbox_inches="tight", facecolor="white")
+    plt.close(fig)
+
+
+def plot_mantel(labels, r_matrix, p_matrix, path):
+    """Mantel r heatmap annotated with r and significance stars."""
+    import matplotlib.pyplot as plt
+
+    size = max(4, 0.9 * len(labels) + 2)
+    fig, ax = plt.subplots(figsize=(size + 1, size))
+    im = ax.imshow(r_matrix, cmap="RdBu_r", vmin=-1, vmax=1)
+    for i in range(len(labels)):
+        for j in range(len(labels)):
+            if i != j:
+                text = f"{r_matrix[i, j]:.2f}\n{significance_stars(p_matrix[i, j])}"
+                ax.text(j, i, text, ha="center", va="center", fontsize=8)
+    ax.set_xticks(range(len(labels)))
+    ax.set_yticks(range(len(labels)))
+    ax.set_xticklabels(labels, rotation=45, ha="right")
+    ax.set_yticklabels(labels)
+    ax.set_title("RSA Mantel correlations")
+    fig.colorbar(im, ax=ax, label="Mantel r")
+    fig.savefig(path, dpi=200, bbox_inches="tight", facecolor="white")
+    plt.close(fig)
+
+
+def run_spec(spec, figures=True, cache=True, refresh=False):
+    """
+    Run a spec and write its outputs to spec['output']
+
+    Files ({name} from the spec):
+    {name}_rdms.npz             one array per label, plus 'labels'
+    {name}_mantel_r.csv         Mantel correlations
+    {name}_mantel_p.csv         p-values
+    {name}_rdms.png, {name}_mantel.png
+
+    Returns:
+    labels, rdms, results ({'r', 'p', 'used'}), timings ({stage: seconds})
+    """
+    timings = {}
+    start = time.perf_counter()
+    df = load_data(spec)
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels, rdms = spec_rdms(spec, df)
+    timings["rdms"] = time.perf_counter() - start
+
+    os.makedirs(spec["output"], exist_ok=True)
+    start = time.perf_counter()
+    result_cache = ResultCache(os.path.join(spec["output"], "rsa_cache")) if cache else None
+    results, hit = spec_mantel(spec, df, rdms, result_cache, refresh)
+    timings["mantel (cached)" if hit else "mantel"] = time.perf_counter() - start
+
+    prefix = os.path.join(spec["output"], spec["name"])
+    np.savez(f"{prefix}_rdms.npz", labels=np.array(labels), **{label: rdm for label, rdm in zip(labels, rdms)})
+    pd.DataFrame(results["r"], index=labels, columns=labels).to_csv(f"{prefix}_mantel_r.csv")
+    pd.DataFrame(results["p"], index=labels, columns=labels).to_csv(f"{prefix}_mantel_p.csv")
+    if figures:
+        start = time.perf_counter()
+        plot_rdms(labels, rdms, spec["distance"], f"{prefix}_rdms.png")
+        plot_mantel(labels, results["r"], results["p"], f"{prefix}_mantel.png")
+        timings["figures"] = time.perf_counter() - start
+    return labels, rdms, results, timings
+
+
+def print_results(labels, results):
+    """Mantel r and p of every pair, as the Study 1 scripts print them."""
+    for i, label1 in enumerate(labels):
+        for j in range(i + 1, len(labels)):
+            p = results["p"][i, j]
+            print(f"{label1} vs {labels[j]}: r = {results['r'][i, j]:.3f}, p = {p:.4f} "
+                  f"{significance_stars(p)} ({results['used'][i, j]} permutations)")